@@ -13,6 +13,8 @@ M_S = 1.99e30                         # mass of the sun in kilograms
 M_J = 1.90e27                         # mass of Jupiter in kilograms
 M_E = 5.98e24                         # mass of Earth in kilograms
 R_S = 6.96e8                          # radius of the sun in meters
+R_J = 6.99e7                          # radius of Jupiter in meters
+R_E = 6.37e6                          # radius of Earth in meters
 C = 299792458                         # speed of light meters per second
 AU = 1.496e11                         # astronomical unit in meters
 JUPITER_R = 5 * AU                    # approximate Jupiter's distance from sun in meters (5AU)
@@ -0,0 +1,300 @@
+# batch.py
+#
+# vectorized flight time engine. Runs the same burn and coast
+# approximation as the Spacecraft class for an array of flight
+# profiles at once
+#
+# Table of contents
+# state_field - property exposing one field of the batch's states
+# SpacecraftBatch - array version of the Spacecraft class; every
+#                   attribute holds one value per flight profile
+#                   (coast_checkpoints records states at many distances)
+# flight_time_batch - array version of flight_time(); returns a
+#                     structured array with one row per profile
+#
+# The batch engine performs the same floating point operations as the
+# scalar Spacecraft class but sums the Simpson's rule terms in a different
+# order. Results agree with flight_time() to a relative tolerance of
+# BATCH_RTOL (checked by test_flight_time_batch in ft_test.py).
+
+from astro_constants import *     # astronomical constants
+from orbit import *               # helper functions for orbital calculations
+import numpy as np                # arrays for holding many profiles
+import state                      # compact spacecraft states
+import kepler                     # closed form hyperbolic coast
+from spacecraft import CHECKPOINT_DTYPE   # states at checkpoint distances
+
+
+BATCH_RTOL = 1e-9                 # documented agreement with flight_time()
+BATCH_CHUNK = 2 ** 20             # max array elements evaluated at once by
+                                  # coast_distance; bounds memory use
+
+# structured array returned by flight_time_batch - inputs use the same units
+# as flight_time(), spacecraft states are in MKS
+RESULT_DTYPE = np.dtype([
+    ("v0", "f8"),                 # starting velocity (m/s)
+    ("r0", "f8"),                 # periapsis (AU)
+    ("dv", "f8"),                 # delta-v of the periapsis burn (m/s)
+    ("burn_time", "f8"),          # length of the periapsis burn (days)
+    ("burn_steps", "i8"),         # discrete burns the burn is split into
+    ("coast_steps", "i8"),        # segments used for Simpson's rule
+    ("parent_m", "f8"),           # mass of the parent body (kg)
+    ("r_final", "f8"),            # final distance from periapsis (AU)
+    ("burn_v", "f8"),             # post burn velocity (m/s)
+    ("burn_r", "f8"),             # post burn distance from parent (m)
+    ("burn_dis_travel", "f8"),    # post burn distance traveled (m)
+    ("burn_elapse_t", "f8"),      # post burn elapsed time (s)
+    ("final_v", "f8"),            # final velocity (m/s)
+    ("final_r", "f8"),            # final distance from parent (m)
+    ("final_dis_travel", "f8"),   # final distance traveled (m)
+    ("final_elapse_t", "f8"),     # final elapsed time (s)
+])
+
+
+def state_field(name):
+    '''property exposing one field of SpacecraftBatch.states as an array'''
+    def get(self):
+        return self.states[name]
+
+    def set(self, value):
+        self.states[name] = value
+
+    return property(get, set, doc = "%s of every profile" %name)
+
+
+class SpacecraftBatch():
+    '''array version of the Spacecraft class. The profiles are held in one
+    array of state.STATE_DTYPE and each attribute is a view of one field,
+    holding one value per flight profile. Every method advances all of the
+    profiles at once using the same straight line approximation as
+    Spacecraft. Internally all units are MKS.'''
+    def __init__(self, v0, r0, parent_m):
+        self.states = state.new_states(v0, r0, parent_m)  # one record per profile
+
+    v = state_field("v")                  # velocity (m/s)
+    r = state_field("r")                  # distance from parent (m)
+    r0 = state_field("r0")                # periapsis (m)
+    parent_m = state_field("parent_m")    # parent mass (kg)
+    elapse_t = state_field("elapse_t")    # time elapsed (s)
+    dis_travel = state_field("dis_travel")  # distance traveled (m)
+
+    def __len__(self):
+        '''number of flight profiles in the batch'''
+        return self.states.size
+
+    def clone(self):
+        '''copy the states to a new SpacecraftBatch
+        outputs: new - new batch w/ identical attributes'''
+        new = SpacecraftBatch.__new__(SpacecraftBatch)
+        new.states = self.states.copy()
+
+        return new
+
+    def long_burn(self, dv, time, steps):
+        '''execute a burn that takes a non zero amount of time for every
+        profile; see Spacecraft.long_burn
+        inputs: dv - total delta-v (m/s) of each burn
+                time - length of time (days) of each burn
+                steps - number of discrete burns for each profile; profiles
+                        with fewer steps stop burning once they are done'''
+
+        dv, time, steps = np.broadcast_arrays(dv, time, steps)
+        steps = steps.astype(int)
+        # calculate dv for each burn in m/s
+        dv_per_burn = dv / steps
+        # calculate coast time between burns in seconds
+        coast_period = time * SEC_PER_DAY / steps
+
+        for step in range(int(steps.max(initial = 0))):
+            # profiles that still have burns left
+            active = step < steps
+            if active.all():
+                active = None
+            self.burn(dv_per_burn, active)
+            self.coast_time(coast_period, active = active)
+
+        return
+
+    def burn(self, dv, active = None):
+        '''execute an instantaneous burn on every profile (or only on the
+        profiles where active is True)'''
+        state.burn(self.states, dv, active)
+
+        return
+
+    def coast_time(self, coast_period, delta = 1e8, active = None):
+        '''coast every profile for a period of time; see
+        Spacecraft.coast_time
+        inputs: coast_period - time to coast for (s)
+                delta - coast distance used as delta (m)
+                active - optional boolean mask of profiles to update'''
+        state.coast_time(self.states, coast_period, delta, active)
+
+        return
+
+    def coast_distance(self, n, x_final, method = "simpson"):
+        '''calculate the time needed for every profile to coast to its final
+        position with Simpson's rule; see Spacecraft.coast_distance. The
+        sum is evaluated in chunks so memory use is bounded by BATCH_CHUNK.
+
+        inputs:  n       - number of Simpson's segments for each profile
+                 x_final - final distance to coast to (AU)
+                 method  - "simpson" or "kepler" for the closed form coast
+                           on the hyperbola through each state (n is
+                           ignored; bound profiles get nan times)'''
+
+        if method == "kepler":
+            x_final = np.broadcast_to(x_final, self.v.shape) * AU
+            new_r = np.sqrt(x_final ** 2 + self.r0 ** 2)
+            self.elapse_t = self.elapse_t + kepler.time_of_flight(
+                self.v, self.r, self.r0 * self.v, self.r, new_r, self.parent_m)
+            self.v = calc_v_2(self.v, self.r, new_r, self.parent_m)
+            self.r = new_r
+            self.dis_travel = x_final
+            return
+        elif method != "simpson":
+            raise ValueError("coast_distance: unknown method %s" %method)
+
+        n, x_final = np.broadcast_arrays(n, x_final)
+        n = np.broadcast_to(n, self.v.shape).astype(int)
+        x_final = np.broadcast_to(x_final, self.v.shape) * AU
+        # n is even and at least 6; matches quadrature.simpson
+        n = np.maximum(n + n % 2, 6)
+
+        step_size = (x_final - self.dis_travel) / n
+        total = np.zeros(self.v.shape)
+
+        # evaluate the sum over point indices k in chunks of columns
+        n_max = int(n.max(initial = 0))
+        chunk = max(1, BATCH_CHUNK // max(self.v.size, 1))
+        for k0 in range(0, n_max + 1, chunk):
+            k = np.arange(k0, min(k0 + chunk, n_max + 1))
+            # Simpson's coefficients; zero past the end of a profile
+            coefs = np.where(k % 2 == 0, 2.0, 4.0) * np.ones((n.size, 1))
+            coefs = np.where((k == 0) | (k == n[:, None]), 1.0, coefs)
+            coefs = np.where(k > n[:, None], 0.0, coefs)
+            # evaluate 1/v at each point
+            x_values = self.dis_travel[:, None] + k * step_size[:, None]
+            r_values = np.sqrt(x_values ** 2 + self.r0[:, None] ** 2)
+            f_values = 1 / calc_v_2(self.v[:, None], self.r[:, None],
+                                    r_values, self.parent_m[:, None])
+            total += (f_values * coefs).sum(axis = 1)
+
+        # update elapsed time, position and velocity
+        self.elapse_t = self.elapse_t + step_size / 3 * total
+        new_r = np.sqrt(x_final ** 2 + self.r0 ** 2)
+        self.v = calc_v_2(self.v, self.r, new_r, self.parent_m)
+        self.r = new_r
+        self.dis_travel = x_final.copy()
+
+        return
+
+    def coast_checkpoints(self, n, checkpoints, method = "simpson"):
+        '''coast every profile once to the furthest of several checkpoint
+        distances and record the states at each; see
+        Spacecraft.coast_checkpoints
+
+        inputs:  n           - number of Simpson's segments for each profile's
+                               whole coast
+                 checkpoints - sorted distances to record (AU), shared by
+                               every profile
+                 method      - "simpson" or "kepler"
+        outputs: table       - array of CHECKPOINT_DTYPE of shape
+                               (profiles, checkpoints); Simpson's rule
+                               gives no error estimate (nan) and the
+                               kepler coast is exact (0)'''
+
+        checkpoints = np.atleast_1d(np.asarray(checkpoints, dtype = float))
+        x_start = self.dis_travel / AU
+        if np.any(np.diff(checkpoints) < 0) or \
+           (checkpoints.size and np.any(x_start > checkpoints[0])):
+            raise ValueError("coast_checkpoints: checkpoints must be sorted and ahead of every profile")
+
+        table = np.zeros((len(self), checkpoints.size), dtype = CHECKPOINT_DTYPE)
+        table["x_final"] = checkpoints
+        if method == "kepler":
+            # every checkpoint on the one hyperbola through each state
+            v, r, r0, m = [x[:, None] for x in (self.v, self.r, self.r0, self.parent_m)]
+            radii = np.sqrt((checkpoints * AU) ** 2 + r0 ** 2)
+            table["elapse_t"] = self.elapse_t[:, None] + kepler.time_of_flight(
+                v, r, r0 * v, r, radii, m)
+            table["v"] = calc_v_2(v, r, radii, m)
+            table["r"] = radii
+            if checkpoints.size:
+                self.elapse_t = table["elapse_t"][:, -1]
+                self.v = table["v"][:, -1]
+                self.r = table["r"][:, -1]
+                self.dis_travel = checkpoints[-1] * AU
+            return table
+
+        n = np.broadcast_to(n, self.v.shape)
+        total = checkpoints[-1] - x_start if checkpoints.size else 0
+        previous = x_start
+        for i, x_final in enumerate(checkpoints):
+            # each piece keeps the step size of n segments over the whole coast
+            n_piece = np.maximum(1, np.ceil(n * (x_final - previous) / np.maximum(total, 1e-300)))
+            self.coast_distance(n_piece, x_final, method)
+            previous = x_final
+            table["elapse_t"][:, i] = self.elapse_t
+            table["v"][:, i] = self.v
+            table["r"][:, i] = self.r
+        table["error"] = np.nan
+
+        return table
+
+    def __str__(self):
+        '''Print a one line summary of the batch'''
+        return "SpacecraftBatch of %d profiles, mean velocity %.2fkm/s" \
+               %(len(self), np.mean(self.v)/1000)
+
+
+def flight_time_batch(v0, r0, dv, burn_time, burn_steps, coast_steps, parent_m, r_final,
+                      coast_method = "simpson"):
+    '''array version of flight_time(). Arguments are broadcast against
+    each other so any of them may be a scalar or an array of profiles.
+    Units match flight_time().
+
+    inputs: v0 - starting velocity (m/s)
+            r0 - periapsis (AU)
+            dv - delta-v of the periapsis burn (m/s)
+            burn_time - length of the periapsis burn (days)
+            burn_steps - number of discrete burns
+            coast_steps - number of segments for Simpson's rule
+            parent_m - mass of the parent body (kg)
+            r_final - final distance from the periapsis (AU)
+            coast_method - "simpson" or "kepler"; see
+                           SpacecraftBatch.coast_distance
+    outputs: result - structured array of RESULT_DTYPE with one row
+                      per profile'''
+
+    inputs = np.broadcast_arrays(v0, r0, dv, burn_time, burn_steps,
+                                 coast_steps, parent_m, r_final)
+    v0, r0, dv, burn_time, burn_steps, coast_steps, parent_m, r_final = \
+        [np.ravel(x) for x in inputs]
+
+    result = np.zeros(v0.size, dtype = RESULT_DTYPE)
+    result["v0"] = v0
+    result["r0"] = r0
+    result["dv"] = dv
+    result["burn_time"] = burn_time
+    result["burn_steps"] = burn_steps
+    result["coast_steps"] = coast_steps
+    result["parent_m"] = parent_m
+    result["r_final"] = r_final
+
+    # run the burn for every profile
+    ships = SpacecraftBatch(v0, r0 * AU, parent_m)
+    ships.long_burn(dv, burn_time, burn_steps)
+    result["burn_v"] = ships.v
+    result["burn_r"] = ships.r
+    result["burn_dis_travel"] = ships.dis_travel
+    result["burn_elapse_t"] = ships.elapse_t
+
+    # coast every profile to its final distance
+    ships.coast_distance(coast_steps, r_final, coast_method)
+    result["final_v"] = ships.v
+    result["final_r"] = ships.r
+    result["final_dis_travel"] = ships.dis_travel
+    result["final_elapse_t"] = ships.elapse_t
+
+    return result
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# benchmark.py
+#
+# benchmark suite for the simulation hot paths. Times each workload,
+# saves the results as a json baseline and flags workloads that have
+# become slower than the baseline by more than a threshold
+#
+# Table of contents
+# BENCHMARKS - list of (name, setup) pairs; setup returns the function
+#              that is timed
+# run_benchmarks - times every benchmark
+# compare - finds benchmarks slower than a baseline
+# save_baseline / load_baseline - json baseline files
+# main - command line interface
+#
+# Usage (from the source folder)
+# ./benchmark.py --save                 # record a new baseline
+# ./benchmark.py --threshold 0.2        # compare against the baseline;
+#                                       # exits with 1 on a regression
+# ./benchmark.py --filter long_burn     # run only matching benchmarks
+
+import argparse                   # command line parsing
+import contextlib                 # silencing prints during timing
+import datetime as dt             # baseline timestamp
+import io
+import json                       # baseline files
+import os
+import platform                   # machine description
+import sys
+import time                       # timers
+
+from astro_constants import *     # astronomical constants
+from orbit import *               # helper functions for orbital calculations
+from spacecraft import *          # spacecraft class
+
+
+BASELINE = "../benchmarks/baseline.json"   # default baseline file
+THRESHOLD = 0.25                           # default allowed slow down
+REPEAT = 5                                 # default timing repeats
+
+
+def einstein_550():
+    '''arguments of flight_time() from config/einstein_550.xlsx'''
+    import profile_io
+    path = os.path.join("../config", "einstein_550.xlsx")
+    p = profile_io.validate_row(next(profile_io.iter_rows(path)))
+    return [p["v0"], p["r0"], p["dv"], p["burn_time"], p["burn_steps"],
+            p["coast_steps"], p["parent_m"], p["r_final"]]
+
+
+def post_burn_craft():
+    '''spacecraft after the einstein_550 burn'''
+    v0, r0, dv, burn_time, burn_steps = einstein_550()[:5]
+    craft = Spacecraft(v0, r0 * AU, M_S)
+    craft.long_burn(dv, burn_time, burn_steps)
+    return craft
+
+
+def bench_calc_v_2():
+    '''100 000 energy conservation velocity calculations'''
+    def run():
+        for i in range(100000):
+            calc_v_2(150000, 0.1 * AU, AU + i)
+    return run
+
+
+def bench_coast_time():
+    '''10 000 coast_time steps of the einstein_550 burn'''
+    def run():
+        craft = Spacecraft(132000, 0.1 * AU, M_S)
+        for i in range(10000):
+            craft.coast_time(86.4)
+    return run
+
+
+def bench_coast_distance(n):
+    '''coast from the einstein_550 post burn state to 550 AU with n
+    Simpson's segments'''
+    craft = post_burn_craft()
+    def run():
+        craft.clone().coast_distance(n, 550)
+    return run
+
+
+def bench_long_burn(steps):
+    '''einstein_550 burn split into steps instantaneous burns'''
+    def run():
+        Spacecraft(132000, 0.1 * AU, M_S).long_burn(100000, 10, steps)
+    return run
+
+
+def bench_calc_vi():
+    '''10 000 scalar two burn v_infinity calculations'''
+    import oberth
+    def run():
+        for i in range(10000):
+            oberth.calc_vi(-i, 20000, JUPITER_R, JUPITER_V)
+    return run
+
+
+def bench_two_burns():
+    '''full two_burns grid for a 25 km/s second burn at DV_STEP'''
+    import oberth
+    def run():
+        oberth.two_burns(25000, plot = False)
+    return run
+
+
+def bench_flight_time():
+    '''end to end flight_time() for einstein_550 (1000/1000 steps)'''
+    import flight_time
+    args = einstein_550()
+    def run():
+        flight_time.flight_time(*args)
+    return run
+
+
+def bench_flight_time_batch(profiles):
+    '''einstein_550 at several delta-v values through flight_time_batch'''
+    import batch
+    import numpy as np
+    args = einstein_550()
+    args[2] = np.linspace(50000, 150000, profiles)
+    def run():
+        batch.flight_time_batch(*args)
+    return run
+
+
+# (name, setup) - setup is called once, the function it returns is timed
+BENCHMARKS = [("calc_v_2", bench_calc_v_2),
+              ("coast_time", bench_coast_time),
+              ("coast_distance_1000", lambda: bench_coast_distance(1000)),
+              ("coast_distance_100000", lambda: bench_coast_distance(100000)),
+              ("long_burn_100", lambda: bench_long_burn(100)),
+              ("long_burn_1000", lambda: bench_long_burn(1000)),
+              ("long_burn_10000", lambda: bench_long_burn(10000)),
+              ("calc_vi", bench_calc_vi),
+              ("two_burns", bench_two_burns),
+              ("flight_time_einstein_550", bench_flight_time),
+              ("flight_time_batch_1000", lambda: bench_flight_time_batch(1000))]
+
+
+def run_benchmarks(repeat = REPEAT, name_filter = None):
+    '''times every benchmark whose name contains name_filter. Each is run
+    repeat times and the fastest time is kept; prints are silenced.
+    outputs: results - dictionary of benchmark name to seconds'''
+
+    results = {}
+    for name, setup in BENCHMARKS:
+        if name_filter and name_filter not in name:
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            run = setup()
+            times = []
+            for i in range(repeat):
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+        results[name] = min(times)
+        print("%-28s %10.3f ms" %(name, 1000 * results[name]))
+
+    return results
+
+
+def compare(results, baseline, threshold = THRESHOLD):
+    '''finds benchmarks slower than the baseline by more than threshold
+    inputs: results - dictionary of benchmark name to seconds
+            baseline - dictionary of benchmark name to seconds
+            threshold - allowed fractional slow down (0.25 = 25%)
+    outputs: regressions - list of (name, baseline s, current s, ratio)'''
+
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        if name in baseline and seconds > baseline[name] * (1 + threshold):
+            regressions.append((name, baseline[name], seconds, seconds / baseline[name]))
+
+    return regressions
+
+
+def save_baseline(results, path = BASELINE):
+    '''saves results with a description of the machine as a json file'''
+    os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path, "w") as f:
+        json.dump({"created": dt.datetime.now().isoformat(timespec = "seconds"),
+                   "machine": platform.platform(),
+                   "python": platform.python_version(),
+                   "results": results}, f, indent = 2, sort_keys = True)
+
+    return
+
+
+def load_baseline(path = BASELINE):
+    '''loads the results saved by save_baseline'''
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def main(argv = None):
+    '''runs the benchmarks and saves or compares against a baseline'''
+    parser = argparse.ArgumentParser(description = "Flybys and Foci benchmarks")
+    parser.add_argument("--save", action = "store_true", help = "save results as the baseline")
+    parser.add_argument("--baseline", default = BASELINE, help = "baseline json file")
+    parser.add_argument("--threshold", type = float, default = THRESHOLD,
+                        help = "allowed fractional slow down")
+    parser.add_argument("--repeat", type = int, default = REPEAT)
+    parser.add_argument("--filter", help = "only run benchmarks containing this")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.repeat, args.filter)
+
+    if args.save:
+        save_baseline(results, args.baseline)
+        print("Baseline saved to %s" %args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline at %s; run with --save first" %args.baseline)
+        return 0
+
+    regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    for name, base, now, ratio in regressions:
+        print("REGRESSION %s: %.3f ms -> %.3f ms (%.2fx)" %(name, 1000 * base, 1000 * now, ratio))
+    if not regressions:
+        print("No regressions above %.0f%%" %(100 * args.threshold))
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# bodies.py
+#
+# registry of parent bodies and patched conic departure chains. A chain
+# escapes a planet with one burn, and the excess velocity it leaves with
+# becomes the first burn of the two burn Oberth manuever around the sun
+# (see oberth.py). Every argument of a chain may be an array, so whole
+# families of departure strategies are evaluated in one call
+#
+# Table of contents
+# Body - name, mass, radius and orbit of a parent body
+# BODIES - registry of the known bodies by name
+# get_body - looks up a body by name
+# parent_mass - mass of a parent body by name
+# departure_chain - planet escape burn followed by a solar periapsis burn
+#
+# Example - Jupiter escape from a low periapsis, then an Oberth burn
+# >>> import bodies, numpy as np
+# >>> chain = bodies.departure_chain("Jupiter", np.linspace(0, 20000, 5),
+# ...                                20000, r_park = 7.56e7)
+# >>> chain["v_infinity"]
+
+import collections                # named tuple for bodies
+import numpy as np                # arrays of burns
+
+from astro_constants import *     # astronomical constants
+from orbit import *               # helper functions for orbital calculations
+import oberth                     # two burn v_infinity
+
+
+# a parent body; orbit_r is the distance from the body it orbits (m) and
+# orbits is the name of that body (None for the sun)
+Body = collections.namedtuple("Body", ["name", "mass", "radius", "orbit_r", "orbits"])
+
+# known parent bodies by name
+BODIES = {"Sun": Body("Sun", M_S, R_S, 0.0, None),
+          "Jupiter": Body("Jupiter", M_J, R_J, JUPITER_R, "Sun"),
+          "Earth": Body("Earth", M_E, R_E, AU, "Sun")}
+
+# structured array returned by departure_chain
+CHAIN_DTYPE = np.dtype([
+    ("dv_escape", "f8"),          # planet escape burn (m/s)
+    ("dv_oberth", "f8"),          # burn at solar periapsis (m/s)
+    ("planet_vi", "f8"),          # excess velocity leaving the planet (m/s)
+    ("perihelion", "f8"),         # solar periapsis after leaving (m)
+    ("v_perihelion", "f8"),       # velocity at solar periapsis (m/s)
+    ("v_infinity", "f8"),         # solar excess velocity (m/s); nan if trapped
+    ("total_dv", "f8"),           # dv_escape + dv_oberth (m/s)
+    ("safe", "?"),                # perihelion no closer than oberth.MIN_R
+])
+
+
+def get_body(name):
+    '''looks up a parent body by name
+    outputs: body - Body from BODIES'''
+    try:
+        return BODIES[name]
+    except KeyError:
+        raise ValueError("unknown parent body %r; known bodies: %s"
+                         %(name, ", ".join(sorted(BODIES)))) from None
+
+
+def parent_mass(name):
+    '''mass (kg) of a parent body by name'''
+    return get_body(name).mass
+
+
+def departure_chain(planet, dv_escape, dv_oberth, r_park, v_park = None,
+                    retrograde = True):
+    '''patched conic departure: a prograde burn at periapsis r_park around
+    a planet escapes it, the excess velocity is added to (or, when
+    retrograde, taken from) the planet's circular orbital velocity around
+    the sun, and a second burn is made at the resulting solar periapsis.
+    Arguments are broadcast against each other.
+    inputs: planet - name of a body in BODIES that orbits the sun
+            dv_escape - burn at the planet periapsis (m/s)
+            dv_oberth - burn at the solar periapsis (m/s)
+            r_park - periapsis distance from the planet's center (m)
+            v_park - velocity at r_park before the burn (m/s); defaults
+                     to the circular orbit velocity
+            retrograde - leave the planet against its orbital motion to
+                         drop the solar periapsis
+    outputs: chain - structured array of CHAIN_DTYPE with the broadcast
+                     shape; a craft that does not escape the planet gives
+                     nan, and one that does not escape the sun has a nan
+                     v_infinity'''
+
+    body = get_body(planet)
+    if body.orbits != "Sun":
+        raise ValueError("departure_chain: %s does not orbit the sun" %planet)
+    mu = G * body.mass
+    if v_park is None:
+        v_park = np.sqrt(mu / np.asarray(r_park, dtype = float))
+    dv_escape, dv_oberth, r_park, v_park = np.broadcast_arrays(
+        np.asarray(dv_escape, dtype = float), dv_oberth, r_park, v_park)
+
+    # stage 1 - hyperbolic excess velocity leaving the planet
+    with np.errstate(invalid = "ignore"):
+        c3_planet = (v_park + dv_escape) ** 2 - 2 * mu / r_park
+        planet_vi = np.where(c3_planet >= 0, np.sqrt(c3_planet), np.nan)
+
+    # stage 2 - the excess velocity changes the heliocentric velocity at the
+    # planet's orbit, which is an apsis of the new solar orbit
+    mu_sun = G * M_S
+    v_planet = calc_v_1(body.orbit_r, body.orbit_r)      # circular velocity
+    dv1 = -planet_vi if retrograde else planet_vi
+    # only the heliocentric speed matters; leaving faster than the planet
+    # moves reverses the direction of the orbit but not its shape
+    v_helio = np.abs(v_planet + np.nan_to_num(dv1))
+    r_op, v_op = oberth.calc_orbital_height_array(v_helio - v_planet, body.orbit_r, v_planet)
+    # the solar periapsis is the lower apsis; the planet's orbit when the
+    # craft leaves faster than circular (or escapes the sun outright)
+    lower = (r_op > 0) & (r_op < body.orbit_r)
+    r_peri = np.where(lower, r_op, body.orbit_r)
+    v_peri = np.where(lower, v_op, v_helio)
+
+    # stage 3 - burn at the solar periapsis
+    with np.errstate(invalid = "ignore"):
+        c3_sun = (v_peri + dv_oberth) ** 2 - 2 * mu_sun / r_peri
+        v_inf = np.where(c3_sun >= 0, np.sqrt(c3_sun), np.nan)
+
+    escaped = ~np.isnan(planet_vi)
+    chain = np.zeros(dv_escape.shape, dtype = CHAIN_DTYPE)
+    chain["dv_escape"] = dv_escape
+    chain["dv_oberth"] = dv_oberth
+    chain["planet_vi"] = planet_vi
+    chain["perihelion"] = np.where(escaped, r_peri, np.nan)
+    chain["v_perihelion"] = np.where(escaped, v_peri, np.nan)
+    chain["v_infinity"] = np.where(escaped, v_inf, np.nan)
+    chain["total_dv"] = dv_escape + dv_oberth
+    chain["safe"] = chain["perihelion"] >= oberth.MIN_R
+
+    return chain
@@ -0,0 +1,217 @@
+# flight_cache.py
+#
+# persistent cache of flight_time() results. Results are stored on disk
+# under a hash of the flight_time() arguments and the model version so
+# repeated queries skip the simulation. The run's metrics are stored with
+# the result and handed to the metrics argument again on a hit
+#
+# Table of contents
+# FlightCache - size bounded, least recently used cache of flight_time()
+#               results kept in memory and on disk
+#
+# Example
+# >>> import flight_cache
+# >>> cache = flight_cache.FlightCache()
+# >>> post_burn, ship, comp_time = cache.flight_time(132000, 0.1, 100000,
+# ...                                   10, 1000, 1000, flight_cache.M_S, 550)
+# >>> cache.stats()
+
+import collections                # ordered dict for the memory cache
+import hashlib                    # hashing the cache key
+import inspect                    # normalizing flight_time() arguments
+import json                       # serializing the cache key
+import os
+import pickle                     # saving results to disk
+
+from flight_time import *         # flight time program
+
+
+CACHE_DIR = "../output/cache"     # default folder for cached results
+CACHE_BYTES = 100 * 2 ** 20       # default maximum size of the disk cache
+MEMORY_ENTRIES = 1024             # results also kept in memory
+EVICT_TARGET = 0.9                # eviction shrinks the disk cache to this
+                                  # fraction of max_bytes, so it runs rarely
+
+
+class FlightCache():
+    '''cache of flight_time() results. A result is keyed on a hash of every
+    flight_time() argument except metrics, with defaults filled in, plus
+    MODEL_VERSION, so changing the model invalidates old results. Results are kept in memory and in one file
+    per key on disk. The size of the disk cache is kept as a running total;
+    when it grows past max_bytes the folder is scanned and the least
+    recently used files are deleted down to EVICT_TARGET of max_bytes.'''
+    def __init__(self, directory = CACHE_DIR, max_bytes = CACHE_BYTES,
+                 version = MODEL_VERSION):
+        self.directory = directory    # folder holding cached results
+        self.max_bytes = max_bytes    # maximum size of the disk cache
+        self.version = version        # model version tag in every key
+        self.memory = collections.OrderedDict()  # recently used results
+        self.hits = 0                 # queries answered from the cache
+        self.misses = 0               # queries that ran the simulation
+        os.makedirs(directory, exist_ok = True)
+        # running size of the disk cache; rescanned when evicting
+        self.bytes = sum(size for mtime, size, name in self._scan())
+
+    def key(self, *args, **kwargs):
+        '''hash of the flight_time() arguments and the model version
+        outputs: key - hex digest'''
+        # positional and keyword calls bind to the same arguments; metrics
+        # only asks for a report, so it does not change the result
+        bound = inspect.signature(flight_time).bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        del arguments["metrics"]
+        # numpy scalars and ints are normalized so equal inputs hash equal
+        arguments = {k: (float(v) if isinstance(v, (int, float)) or hasattr(v, "dtype")
+                         else v) for k, v in arguments.items()}
+        text = json.dumps([self.version, arguments], sort_keys = True)
+
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def path(self, key):
+        '''path of the file holding a cached result'''
+        return os.path.join(self.directory, key + ".pkl")
+
+    def get(self, key):
+        '''looks up a cached result
+        outputs: result - (post_burn, ship, comp_time, metrics) or None;
+                          metrics is None if the run did not record them'''
+
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            result = self.memory[key]
+        else:
+            try:
+                with open(self.path(key), "rb") as f:
+                    result = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError,
+                    AttributeError, TypeError):
+                # missing, partly written or from an older Spacecraft layout
+                return None
+            if len(result) != 4:
+                # stored before metrics were kept with the result
+                return None
+            # mark the file as recently used
+            os.utime(self.path(key))
+            self.remember(key, result)
+
+        # hand out copies so callers cannot modify the cached results
+        post_burn, ship, comp_time, metrics = result
+        return (post_burn.clone(), ship.clone(), comp_time,
+                None if metrics is None else dict(metrics))
+
+    def put(self, key, result):
+        '''stores a result in memory and on disk, then evicts the least
+        recently used files if the disk cache is too large'''
+
+        self.remember(key, result)
+        # write to a temporary file first so readers never see half a file
+        tmp = self.path(key) + ".%d.tmp" %os.getpid()
+        with open(tmp, "wb") as f:
+            pickle.dump(result, f)
+        try:
+            replaced = os.path.getsize(self.path(key))
+        except FileNotFoundError:
+            replaced = 0
+        self.bytes += os.path.getsize(tmp) - replaced
+        os.replace(tmp, self.path(key))
+        if self.bytes > self.max_bytes:
+            self.evict()
+
+        return
+
+    def remember(self, key, result):
+        '''adds a result to the memory cache'''
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > MEMORY_ENTRIES:
+            self.memory.popitem(last = False)
+
+        return
+
+    def _scan(self):
+        '''(mtime, size, name) of every cached result file'''
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                try:
+                    st = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    # removed by another process
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+
+        return entries
+
+    def evict(self):
+        '''deletes the least recently used files until the disk cache is
+        no larger than EVICT_TARGET of max_bytes. The folder is scanned,
+        so files written by other processes are counted too.'''
+
+        entries = self._scan()
+        total = sum(e[1] for e in entries)
+
+        # oldest first
+        for mtime, size, name in sorted(entries):
+            if total <= EVICT_TARGET * self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                # already removed by another process
+                pass
+            self.memory.pop(name[:-len(".pkl")], None)
+            total -= size
+        self.bytes = total
+
+        return
+
+    def flight_time(self, *args, **kwargs):
+        '''cached version of flight_time(); takes the same arguments. A
+        metrics dictionary or function gets the metrics of the original
+        run; a result cached without metrics is run again when they are
+        asked for.
+        outputs: post_burn - Spacecraft after the burn
+                 ship - Spacecraft at the final position
+                 comp_time - seconds the original computation took'''
+
+        key = self.key(*args, **kwargs)
+        bound = inspect.signature(flight_time).bind(*args, **kwargs)
+        wanted = bound.arguments.pop("metrics", None)
+        result = self.get(key)
+        if result is not None and (wanted is None or result[3] is not None):
+            self.hits += 1
+        else:
+            self.misses += 1
+            metrics = {} if wanted is not None else None
+            post_burn, ship, comp_time = flight_time(*bound.args, metrics = metrics,
+                                                     **bound.kwargs)
+            self.put(key, (post_burn, ship, comp_time, metrics))
+            result = (post_burn.clone(), ship.clone(), comp_time, metrics)
+
+        # replay the metrics the way flight_time() reports them
+        if wanted is not None:
+            if callable(wanted):
+                wanted(dict(result[3]))
+            else:
+                wanted.update(result[3])
+
+        return result[:3]
+
+    def clear(self):
+        '''deletes every cached result'''
+        self.memory.clear()
+        for name in os.listdir(self.directory):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, name))
+        self.bytes = 0
+
+        return
+
+    def stats(self):
+        '''returns the hit and miss counts and the size of the disk cache'''
+        files = [os.path.join(self.directory, name)
+                 for name in os.listdir(self.directory) if name.endswith(".pkl")]
+        return {"hits": self.hits, "misses": self.misses,
+                "entries": len(files),
+                "bytes": sum(os.path.getsize(f) for f in files)}
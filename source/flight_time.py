@@ -3,13 +3,25 @@
 # program for calculating the flight time to the focal point
 #
 # Table of contents
+# read_flight_profile - parses an xlsx spreadsheet with saved
+#                       flight parameters
 # open_flight_profile - opens an xlsx spreadsheet with saved
 #                       flight parameters then calls flight_time
+# write_log - saves a flight log without overwriting older logs
+#             (optional; results go to the result store)
 #
 # flight_time - calculates the approximate flight time of a 
 #               spacecraft from the periapsis to a given distance
 #               in space              
 #
+# arrival_times - flight times to several distances from one coast
+#
+# richardson - error estimate and extrapolation from a sequence of
+#              approximations with doubling step counts
+#
+# converge_steps - chooses the smallest burn and coast step counts that
+#                  meet a tolerance by a convergence study
+#
 # Revision history
 # 03/19/19    Tim Liu    created file and wrote calc_exhaust_velocity 
 # 03/20/19    Tim Liu    wrote skeleton of spacecraft class
@@ -26,39 +38,97 @@ from orbit import *               # helper functions for orbital calculations
 from spacecraft import *          # spacecraft class
 import math                       # math library
 import time                       # time library
-import pandas as pd               # pandas libray for reading excel
 import datetime as dt             # datetime library
 import os
+import contextlib                 # optional call counting
+import spacecraft                 # patched when counting calc_v_2 calls
+import propagator                 # planar two body engine
+from bodies import parent_mass    # registry of parent bodies
+from instrument import *          # phase timers, counters and logging
+import result_store               # columnar store of results
+
+CONFIG_DIR = "../config/"        # folder holding flight profiles
+OUTPUT_DIR = "../output"         # folder flight logs are saved to
+AUTO_RTOL = 1e-4                 # default tolerance for "auto" step counts
+MAX_AUTO_STEPS = 2 ** 22         # largest step count tried by converge_steps
+
+log = get_logger("flight_time")  # messages of this module
 
-def open_flight_profile(f_in_name):
-    '''opens a .xlsx file with the conditions describing a 
-    flight profile. Parses file and calls flight_time() to
-    calculate the flight time to a given point in space. Saves a
-    text file as a log of the mission. Records the ship status both
-    after the burn and after the cruise phase in the log'''
 
-    # build path to the config folder
-    f_in = os.path.join("../config/", f_in_name)
+def read_flight_profile(f_in_name):
+    '''opens a .xlsx file with the conditions describing a flight
+    profile and parses it. The file MUST follow flight_profile_template.xlsx
+    inputs: f_in_name - name of the file in the config folder (or a path)
+    outputs: profile - dictionary of the flight_time() arguments'''
+
+    # pandas is only imported when a workbook is actually opened
+    import pandas as pd               # pandas libray for reading excel
+
+    # build path to the config folder; paths that exist or name a folder
+    # (e.g. from run_profiles.find_profiles) are used as given
+    if os.path.exists(f_in_name) or os.path.dirname(f_in_name):
+        f_in = f_in_name
+    else:
+        f_in = os.path.join(CONFIG_DIR, f_in_name)
     # open .xlsx file with flight profile - MUST follow flight_profile_template.xlsx
     f_profile = pd.read_excel(f_in, usecols = "B")
 
     # parse arguments
-    v0 = f_profile['Value'][0]
-    r0 = f_profile['Value'][1]
-    dv = f_profile['Value'][2]
-    if f_profile['Value'][3] == "Sun":
-        # generalize to other parent bodies
-        parent_m = M_S
-    else:
-        print("Not recognized parent mass!")
-    r_final = f_profile['Value'][4]
-    burn_time = f_profile['Value'][5]
-    burn_steps = f_profile['Value'][6]
-    coast_steps = f_profile['Value'][7]
+    profile = {}
+    profile["v0"] = f_profile['Value'][0]
+    profile["r0"] = f_profile['Value'][1]
+    profile["dv"] = f_profile['Value'][2]
+    # parent body from the registry; unknown names raise ValueError
+    profile["parent_m"] = parent_mass(f_profile['Value'][3])
+    profile["r_final"] = f_profile['Value'][4]
+    profile["burn_time"] = f_profile['Value'][5]
+    profile["burn_steps"] = f_profile['Value'][6]
+    profile["coast_steps"] = f_profile['Value'][7]
+
+    return profile
+
+
+def open_flight_profile(f_in_name, store = None, text_log = False):
+    '''opens a .xlsx file with the conditions describing a 
+    flight profile. Parses file and calls flight_time() to
+    calculate the flight time to a given point in space. Appends the
+    inputs, the ship status both after the burn and after the cruise
+    phase, the step counts and the timings to the result store, and
+    optionally saves a text file as a log of the mission
+    inputs: f_in_name - name of the file in the config folder (or a path)
+            store - ResultStore to append to; defaults to the store in
+                    result_store.STORE_DIR
+            text_log - also write a text flight log
+    outputs: post_burn - Spacecraft after the burn
+             post_cruise - Spacecraft after the cruise
+             calc_time - seconds needed to finish computation
+             out_file - path of the saved log; None without text_log'''
+
+    # parse arguments
+    profile = read_flight_profile(f_in_name)
+    v0 = profile["v0"]
+    r0 = profile["r0"]
+    dv = profile["dv"]
+    parent_m = profile["parent_m"]
+    r_final = profile["r_final"]
+    burn_time = profile["burn_time"]
+    burn_steps = profile["burn_steps"]
+    coast_steps = profile["coast_steps"]
 
     # call flight_time to run simulation
-    post_burn, post_cruise, calc_time = flight_time(v0, r0, dv, burn_time, burn_steps, coast_steps, parent_m, r_final)
+    metrics = {}
+    post_burn, post_cruise, calc_time = flight_time(v0, r0, dv, burn_time, burn_steps, coast_steps, parent_m, r_final,
+                                                    metrics = metrics)
 
+    # append the run to the result store
+    if store is None:
+        store = result_store.ResultStore()
+    name = os.path.splitext(os.path.basename(f_in_name))[0]
+    row = result_store.flight_row(profile, post_burn, post_cruise, calc_time, metrics, name)
+    index = store.append(row)
+    log.info("Stored as row %d of %s", index, store.directory)
+    if not text_log:
+        return post_burn, post_cruise, calc_time, None
 
     # log string to save flight profile and results in text file
     log_str = ""
@@ -80,18 +150,45 @@ def open_flight_profile(f_in_name):
     log_str += "\n*** Final craft parameters: ***\n"
     log_str += str(post_cruise)
 
-    print("Printing flight log...")
-    # write information to log
+    log.info("Printing flight log...")
+    # write information to log; name includes the profile and seconds
+    # so runs finishing in the same minute do not overwrite each other
     currentDT = dt.datetime.now()
-    f_out = "flight_log_%s.txt" %currentDT.strftime("%m-%d_%H-%M")
-    out_file = os.path.join("../output", f_out)
-    f = open(out_file, "w")
-    f.write(log_str)
-    f.close()
-    return
+    f_out = "flight_log_%s_%s" %(name, currentDT.strftime("%m-%d_%H-%M-%S"))
+    out_file = write_log(f_out, log_str)
+
+    return post_burn, post_cruise, calc_time, out_file
 
 
-def flight_time(v0, r0, dv, burn_time, burn_steps, coast_steps, parent_m, r_final):
+def write_log(f_out, log_str, ext = ".txt"):
+    '''writes a log to the output folder without overwriting an existing
+    log. The file is created exclusively so parallel runs that pick the
+    same name fall through to the next free suffix.
+    inputs: f_out - log name without extension
+            log_str - text to write
+            ext - file extension
+    outputs: out_file - path of the written log'''
+
+    suffix = ""
+    count = 0
+    while True:
+        out_file = os.path.join(OUTPUT_DIR, f_out + suffix + ext)
+        try:
+            f = open(out_file, "x")
+        except FileExistsError:
+            # name taken - try the next suffix
+            count += 1
+            suffix = "_%d" %count
+            continue
+        f.write(log_str)
+        f.close()
+        return out_file
+
+
+def flight_time(v0, r0, dv, burn_time, burn_steps, coast_steps, parent_m, r_final,
+                coast_method = "simpson", coast_rtol = None, burn_rtol = None,
+                auto_rtol = AUTO_RTOL, metrics = None, engine = "straight",
+                planar_rtol = None):
     '''Calculates the time required to fly a given distance from
     the periapsis using numerical approximation. Creates an
     instance of the spacecraft class and calls methods to calculate
@@ -103,48 +200,234 @@ def flight_time(v0, r0, dv, burn_time, burn_steps, coast_steps, parent_m, r_fina
             time - length of the periapsis burn (days)
             steps - number of discrete burns the periapsis burn is
                     separated into; higher number is more accurate
-                    but requires more computation time
+                    but requires more computation time. Either step count
+                    may be "auto" to choose it with converge_steps()
             parent_m - mass of the parent body (kg)
             r_final - final distance from the periapsis (AU)
+            coast_method - quadrature used for the cruise phase; see
+                           Spacecraft.coast_distance
+            coast_rtol - requested relative tolerance of the cruise time;
+                         coast_steps is ignored when given
+            burn_rtol - requested relative tolerance of the post burn
+                        velocity and position; when given the burn uses
+                        Spacecraft.long_burn_adaptive and burn_steps is ignored
+            auto_rtol - relative tolerance of the flight time used when a
+                        step count is "auto"
+            metrics - dictionary filled with the run's metrics, or a
+                      function called with them: burn, coast and logging
+                      time (burn_time_s, ...), calc_v_2 evaluations in
+                      total and per phase, and the steps of each phase
+            engine - "straight" for the straight line Spacecraft model or
+                     "planar" for the planar two body propagator in
+                     propagator.py; the planar engine ignores the step
+                     counts and the coast and burn options
+            planar_rtol - relative tolerance of the planar engine's steps;
+                          defaults to propagator.PLANAR_RTOL
     outptus: ship - Spacecraft object created
-             comp_time - seconds needed to finish computation'''
+             comp_time - seconds needed to finish computation, including
+                         the convergence study of "auto" step counts'''
 
+    inst = Instrument()
+    # record start time; the calculation time includes any convergence study
+    start_time = time.time()
 
-    print("***** Flight parameters *****")
-    print("Initial velocity: %.2f m/s" %(v0))
-    print("Periapsis:        %.2f AU" %(r0))
-    print("Delta-v:          %.2f m/s" %(dv))
-    print("Parent mass:      %.0f kg" %(parent_m))
-    print("Flight distance:  %.0f AU\n" %(r_final))
+    if "auto" in (burn_steps, coast_steps):
+        # choose the step counts by a convergence study
+        with inst.phase("convergence"):
+            study = converge_steps(v0, r0, dv, burn_time, parent_m, r_final, auto_rtol)
+        if burn_steps == "auto":
+            burn_steps = study["burn_steps"]
+        if coast_steps == "auto":
+            coast_steps = study["coast_steps"]
+        with inst.phase("logging"):
+            log.info("Convergence study: %d burn steps, %d coast steps", burn_steps, coast_steps)
+            log.info("Extrapolated flight time: %.6f years (estimated error %.3g years)\n",
+                     study["flight_time"]/SEC_PER_YEAR,
+                     (study["burn_error"] + study["coast_error"])/SEC_PER_YEAR)
 
-    print("***** Approximation parameters ***** ")
-    print("Burn time:        %.2f days" %(burn_time))
-    print("Burn steps:       %d steps\n" %(burn_steps))
-    print("Coast steps:      %d steps\n" %(coast_steps))
+    with inst.phase("logging"):
+        log.info("***** Flight parameters *****")
+        log.info("Initial velocity: %.2f m/s", v0)
+        log.info("Periapsis:        %.2f AU", r0)
+        log.info("Delta-v:          %.2f m/s", dv)
+        log.info("Parent mass:      %.0f kg", parent_m)
+        log.info("Flight distance:  %.0f AU\n", r_final)
 
-    # record start time
-    start_time = time.time()
+        log.info("***** Approximation parameters ***** ")
+        log.info("Burn time:        %.2f days", burn_time)
+        log.info("Burn steps:       %s steps\n", burn_steps)
+        log.info("Coast steps:      %s steps\n", coast_steps)
 
-    # create instance of spacecraft
-    print("Creating instance of spacecraft class...")
-    ship = Spacecraft(v0, r0*AU, parent_m)
-    print(ship, "\n")
+    if engine == "planar":
+        # integrate the planar equations of motion instead
+        with inst.phase("burn"):
+            traj = propagator.propagate(v0, r0, dv, burn_time, r_final, parent_m,
+                                        planar_rtol or propagator.PLANAR_RTOL)
+        post_burn = propagator.spacecraft_at(traj, traj.t_burn, r0, parent_m)
+        ship = propagator.spacecraft_at(traj, traj.t_event, r0, parent_m)
+        coast_error = None
+        inst.counts["planar_evals"] = traj.nfev
+        burn_steps = coast_steps = traj.steps
+        with inst.phase("logging"):
+            log.info("Planar propagator used %d steps and %d evaluations\n",
+                     traj.steps, traj.nfev)
+    elif engine != "straight":
+        raise ValueError("flight_time: unknown engine %s" %engine)
+    else:
+        # count energy conservation evaluations only when they are wanted
+        counting = inst.count_calls("calc_v_2", [spacecraft]) if metrics is not None \
+                   else contextlib.nullcontext()
+        with counting:
+            # create instance of spacecraft
+            with inst.phase("logging"):
+                log.info("Creating instance of spacecraft class...")
+            ship = Spacecraft(v0, r0*AU, parent_m)
+            with inst.phase("logging"):
+                log.info("%s \n", ship)
 
-    # call long_burn method and execute approximated continuous burn
-    print("Approximating continuous burn...\n")
-    ship.long_burn(dv, burn_time, burn_steps)
-    # clone the ship class to save post burn parameters
-    post_burn = ship.clone()
+            # call long_burn method and execute approximated continuous burn
+            with inst.phase("logging"):
+                log.info("Approximating continuous burn...\n")
+            with inst.phase("burn"):
+                if burn_rtol is None:
+                    ship.long_burn(dv, burn_time, burn_steps)
+                else:
+                    burn_steps = ship.long_burn_adaptive(dv, burn_time, burn_rtol)
+            burn_evals = inst.counts.get("calc_v_2", 0)
+            if burn_rtol is not None:
+                with inst.phase("logging"):
+                    log.info("Adaptive burn used %d steps\n", burn_steps)
+            # clone the ship class to save post burn parameters
+            post_burn = ship.clone()
 
-    # call coast functions to calculate cruise distance to r_f
-    print("Approximating coast period...\n")
-    ship.coast_distance(coast_steps, r_final)
+            # call coast functions to calculate cruise distance to r_f
+            with inst.phase("logging"):
+                log.info("Approximating coast period...\n")
+            with inst.phase("coast"):
+                coast_error = ship.coast_distance(coast_steps, r_final, coast_method, coast_rtol)
 
     # print final results
     comp_time = time.time()-start_time
-    print("Flight time: %.2f years" %(ship.get_elapse_t(units = "years")))
-    print("Calculation completed in %.3f seconds" %comp_time)
+    with inst.phase("logging"):
+        log.info("Flight time: %.2f years", ship.get_elapse_t(units = "years"))
+        if coast_error is not None:
+            log.info("Estimated coast error: %.3g seconds", coast_error)
+        log.info("Calculation completed in %.3f seconds", comp_time)
 
+    if metrics is not None:
+        if engine == "straight":
+            inst.counts["burn_calc_v_2"] = burn_evals
+            inst.counts["coast_calc_v_2"] = inst.counts["calc_v_2"] - burn_evals
+        inst.counts["burn_steps"] = burn_steps
+        inst.counts["coast_steps"] = coast_steps
+        if callable(metrics):
+            metrics(inst.metrics())
+        else:
+            metrics.update(inst.metrics())
 
     return post_burn, ship, comp_time
 
+
+def arrival_times(v0, r0, dv, burn_time, burn_steps, coast_steps, parent_m, checkpoints,
+                  coast_method = "simpson", coast_rtol = None):
+    '''flight times to several distances from the periapsis. The burn is
+    run once and the coast is integrated once to the furthest checkpoint
+    with Spacecraft.coast_checkpoints, recording the state at the others
+    on the way.
+    inputs: v0, r0, dv, burn_time, burn_steps, coast_steps, parent_m - see
+                   flight_time(); step counts must be numbers
+            checkpoints - sorted final distances from the periapsis (AU)
+            coast_method, coast_rtol - see flight_time()
+    outputs: post_burn - Spacecraft after the burn
+             table - array of CHECKPOINT_DTYPE, one row per checkpoint
+             comp_time - seconds needed to finish computation'''
+
+    start_time = time.time()
+    ship = Spacecraft(v0, r0*AU, parent_m)
+    ship.long_burn(dv, burn_time, burn_steps)
+    post_burn = ship.clone()
+    table = ship.coast_checkpoints(coast_steps, checkpoints, coast_method, coast_rtol)
+    comp_time = time.time() - start_time
+    for row in table:
+        log.info("Flight time to %g AU: %.4f years", row["x_final"],
+                 row["elapse_t"] / SEC_PER_YEAR)
+
+    return post_burn, table, comp_time
+
+
+def richardson(values, ratio = 2):
+    '''estimates the error of the last of a sequence of approximations
+    whose step count grows by ratio each time, and extrapolates the limit.
+    The order of convergence is estimated from the last three values.
+    inputs: values - at least three approximations, coarsest first
+            ratio - step count ratio between successive approximations
+    outputs: extrapolated - estimate of the exact value
+             error - estimated absolute error of values[-1]
+             order - observed order of convergence'''
+
+    d_prev = values[-2] - values[-3]
+    d_last = values[-1] - values[-2]
+    if d_last == 0:
+        return values[-1], 0.0, float("inf")
+    if d_prev == 0:
+        # no information on the order; assume first order
+        order = 1.0
+    else:
+        # clamp noisy estimates to a sensible range
+        order = min(max(math.log(abs(d_prev / d_last), ratio), 0.5), 8.0)
+    error = abs(d_last) / (ratio ** order - 1)
+    extrapolated = values[-1] + d_last / (ratio ** order - 1)
+
+    return extrapolated, error, order
+
+
+def converge_steps(v0, r0, dv, burn_time, parent_m, r_final, rtol = AUTO_RTOL,
+                   start_steps = 8, max_steps = MAX_AUTO_STEPS):
+    '''chooses the smallest burn and coast step counts that meet a
+    tolerance on the flight time. The coast is studied first on a coarse
+    burn: coast steps double until the Richardson error estimate of the
+    coast time meets half of rtol. The burn steps then double, coasting
+    with the chosen coast steps, until the estimate of the total flight
+    time meets the other half. Arguments are the same as flight_time().
+
+    inputs: rtol - tolerance relative to the flight time
+            start_steps - first step count of each study
+            max_steps - step count at which a study gives up
+    outputs: study - dictionary with burn_steps, coast_steps, the
+                     extrapolated flight_time (s), the estimated burn_error
+                     and coast_error (s) and the observed burn_order and
+                     coast_order'''
+
+    def run(burn_steps, coast_steps):
+        '''flight time (s) with the given step counts'''
+        ship = Spacecraft(v0, r0*AU, parent_m)
+        ship.long_burn(dv, burn_time, burn_steps)
+        ship.coast_distance(coast_steps, r_final)
+        return ship.get_elapse_t()
+
+    def study(flight, tol):
+        '''doubles the step count until the error estimate meets tol'''
+        steps = start_steps
+        values = []
+        while True:
+            values.append(flight(steps))
+            if len(values) >= 3:
+                extrapolated, error, order = richardson(values)
+                if error <= tol * abs(values[-1]):
+                    return steps, extrapolated, error, order
+            if steps >= max_steps:
+                raise RuntimeError("converge_steps: rtol %g not met with %d steps"
+                                   %(rtol, steps))
+            steps *= 2
+
+    # coast first, on a coarse burn
+    coast_steps, coast_t, coast_error, coast_order = \
+        study(lambda n: run(start_steps, n), rtol / 2)
+    # then the burn, coasting with the chosen coast steps
+    burn_steps, flight_t, burn_error, burn_order = \
+        study(lambda n: run(n, coast_steps), rtol / 2)
+
+    return {"burn_steps": burn_steps, "coast_steps": coast_steps,
+            "flight_time": flight_t, "burn_error": burn_error,
+            "coast_error": coast_error, "burn_order": burn_order,
+            "coast_order": coast_order}
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# flybys.py
+#
+# command line entry point for the flybys and foci calculations. Only the
+# modules a command needs are imported, and plotting and spreadsheet
+# libraries are only loaded when a command plots or opens a workbook, so
+# single calculations start quickly enough to call from scripts and cron
+#
+# Table of contents
+# steps_arg - parses a step count that may be "auto"
+# flight_time_cmd - runs flight_time() from arguments or a profile
+# vinf_cmd - calculates v_infinity for one two burn combination or a grid
+# focal_cmd - calculates the focal distance of the solar lens
+# main - parses the command line and runs a command
+#
+# Examples (run from the source folder)
+# ./flybys.py flight-time 132000 0.1 100000 10 550
+# ./flybys.py flight-time 132000 0.1 100000 10 550 --burn-steps auto
+# ./flybys.py flight-time 13000 0.005 10000 1 5 --parent Jupiter
+# ./flybys.py flight-time 132000 0.1 100000 10 1000 --checkpoints 120 550 600
+# ./flybys.py flight-time --profile einstein_550.xlsx
+# ./flybys.py vinf -- -5000 20000
+# ./flybys.py focal 1.5
+# ./flybys.py focal --impact 550 1000
+# ./flybys.py focal --plot 5
+
+import argparse                   # command line parsing
+import sys
+import time                       # start up timing
+
+START_TIME = time.perf_counter()  # time this module started loading
+
+# cold start budget (s) for each command when it does not plot or open a
+# workbook; measured from interpreter start by test_cold_start in ft_test.py
+COLD_START_BUDGET = {"flight-time": 1.0, "vinf": 1.0, "focal": 0.5}
+
+# libraries that must not be imported unless they are used
+HEAVY_MODULES = ("pandas", "matplotlib", "openpyxl")
+
+
+def steps_arg(text):
+    '''step count argument; an integer or "auto"'''
+    return text if text == "auto" else int(text)
+
+
+def flight_time_cmd(args):
+    '''runs flight_time() with the command line arguments, or
+    open_flight_profile() when a profile is given'''
+    import flight_time
+
+    if args.profile and args.parent:
+        raise SystemExit("flight-time: the profile sets the parent mass; drop --parent")
+    M = flight_time.M_S
+    if args.parent:
+        import bodies
+        try:
+            M = bodies.parent_mass(args.parent)
+        except ValueError as err:
+            raise SystemExit("flight-time: %s" %err)
+    if args.profile:
+        flight_time.open_flight_profile(args.profile, text_log = args.text_log)
+        return
+
+    if None in (args.v0, args.r0, args.dv, args.burn_time, args.r_final):
+        raise SystemExit("flight-time: give v0 r0 dv burn_time r_final or --profile")
+    if args.checkpoints:
+        # one coast to the furthest of r_final and the checkpoints
+        if "auto" in (args.burn_steps, args.coast_steps):
+            raise SystemExit("flight-time: --checkpoints needs numeric step counts")
+        checkpoints = sorted(set(args.checkpoints) | {args.r_final})
+        post_burn, table, comp_time = flight_time.arrival_times(
+            args.v0, args.r0, args.dv, args.burn_time, args.burn_steps,
+            args.coast_steps, M, checkpoints,
+            coast_method = args.coast_method, coast_rtol = args.coast_rtol)
+        print("%12s %14s %14s" %("distance AU", "time years", "velocity m/s"))
+        for row in table:
+            print("%12g %14.6f %14.2f" %(row["x_final"], row["elapse_t"] / flight_time.SEC_PER_YEAR,
+                                          row["v"]))
+        return
+
+    post_burn, ship, comp_time = flight_time.flight_time(
+        args.v0, args.r0, args.dv, args.burn_time, args.burn_steps,
+        args.coast_steps, M, args.r_final,
+        coast_method = args.coast_method, coast_rtol = args.coast_rtol,
+        burn_rtol = args.burn_rtol, auto_rtol = args.auto_rtol,
+        engine = args.engine, planar_rtol = args.planar_rtol)
+    print(ship)
+
+    return
+
+
+def vinf_cmd(args):
+    '''calculates v_infinity for one combination of burns or, with --grid,
+    for every combination up to a maximum second burn'''
+    import numpy as np
+    import oberth
+
+    if args.dv_step:
+        oberth.DV_STEP = args.dv_step
+    if args.grid:
+        v1_values, v2_values, v_infinities = oberth.two_burns(
+            args.grid, args.r0, args.v0, plot = args.plot, dpi = args.dpi,
+            fmt = args.format)
+        print("Maximum v_infinity: %.2f km/s" %(v_infinities.max()/1000))
+        return
+
+    if args.dv1 is None or args.dv2 is None:
+        raise SystemExit("vinf: give dv1 dv2 or --grid MAX_DV2")
+    v_inf = oberth.calc_vi_array(args.dv1, args.dv2, args.r0, args.v0)
+    rp, vp = oberth.calc_orbital_height_array(args.dv1, args.r0, args.v0)
+    if rp <= 0:
+        print("First burn escapes the sun; there is no perihelion for the second burn")
+    elif np.ma.is_masked(v_inf):
+        print("Does not escape the sun")
+    else:
+        print("v_infinity: %.2f km/s" %(v_inf/1000))
+
+    return
+
+
+def focal_cmd(args):
+    '''calculates the focal distance of light passing r solar radii from
+    the sun, plots it up to --plot solar radii, or with --impact finds the
+    impact parameter for focal distances'''
+    import focal
+
+    if args.plot:
+        path = focal.plot_foci(args.plot, dpi = args.dpi, fmt = args.format)
+        print("Chart saved to %s" %path)
+    if args.impact:
+        # arguments are focal distances; look up the impact parameters
+        for f_d, r in zip(args.r, focal.calc_impact(args.r)):
+            print("%.1f AU: %.4f solar radii" %(f_d, r))
+        return
+    for r in args.r:
+        print("%.3f solar radii: %.1f AU" %(r, focal.calc_foci(r * focal.R_S)))
+
+    return
+
+
+def main(argv = None):
+    '''parses the command line and runs the chosen command'''
+    from astro_constants import JUPITER_R, JUPITER_V
+
+    parser = argparse.ArgumentParser(prog = "flybys",
+        description = "Flybys and Foci orbital calculations")
+    parser.add_argument("--timing", action = "store_true",
+        help = "print start up and run time and the heavy libraries loaded")
+    parser.add_argument("--quiet", action = "store_true",
+        help = "only print results, not progress messages")
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    ft = commands.add_parser("flight-time", help = "flight time to a distance")
+    ft.add_argument("v0", type = float, nargs = "?", help = "starting velocity (m/s)")
+    ft.add_argument("r0", type = float, nargs = "?", help = "periapsis (AU)")
+    ft.add_argument("dv", type = float, nargs = "?", help = "delta-v of the burn (m/s)")
+    ft.add_argument("burn_time", type = float, nargs = "?", help = "length of burn (days)")
+    ft.add_argument("r_final", type = float, nargs = "?", help = "final distance (AU)")
+    ft.add_argument("--burn-steps", type = steps_arg, default = 1000,
+                    help = "number of burn steps or auto")
+    ft.add_argument("--coast-steps", type = steps_arg, default = 1000,
+                    help = "number of coast steps or auto")
+    ft.add_argument("--auto-rtol", type = float, default = 1e-4,
+                    help = "flight time tolerance of auto step counts")
+    ft.add_argument("--burn-rtol", type = float)
+    ft.add_argument("--coast-method", default = "simpson")
+    ft.add_argument("--coast-rtol", type = float)
+    ft.add_argument("--engine", choices = ["straight", "planar"], default = "straight",
+                    help = "straight line model or planar propagator")
+    ft.add_argument("--planar-rtol", type = float)
+    ft.add_argument("--parent",
+                    help = "body the ship orbits, by name from bodies.BODIES (default Sun)")
+    ft.add_argument("--checkpoints", type = float, nargs = "+",
+                    help = "more distances (AU) to report from the same coast")
+    ft.add_argument("--profile", help = "flight profile in the config folder")
+    ft.add_argument("--text-log", action = "store_true",
+                    help = "also save a text flight log of the profile")
+    ft.set_defaults(func = flight_time_cmd)
+
+    vi = commands.add_parser("vinf", help = "v_infinity of a two burn manuever")
+    vi.add_argument("dv1", type = float, nargs = "?", help = "retrograde burn (m/s)")
+    vi.add_argument("dv2", type = float, nargs = "?", help = "escape burn (m/s)")
+    vi.add_argument("--r0", type = float, default = JUPITER_R, help = "starting distance (m)")
+    vi.add_argument("--v0", type = float, default = JUPITER_V, help = "starting velocity (m/s)")
+    vi.add_argument("--grid", type = float, help = "maximum second burn of a full grid (m/s)")
+    vi.add_argument("--dv-step", type = float, help = "grid spacing (m/s)")
+    vi.add_argument("--plot", action = "store_true", help = "plot the grid")
+    vi.add_argument("--dpi", type = float, default = 200, help = "resolution of the chart")
+    vi.add_argument("--format", default = "png", help = "file format of the chart")
+    vi.set_defaults(func = vinf_cmd)
+
+    fo = commands.add_parser("focal", help = "focal distance of the solar lens")
+    fo.add_argument("r", type = float, nargs = "*", help = "distance of the light (solar radii)")
+    fo.add_argument("--plot", type = float, help = "plot up to this many solar radii")
+    fo.add_argument("--dpi", type = float, default = 200, help = "resolution of the chart")
+    fo.add_argument("--format", default = "png", help = "file format of the chart")
+    fo.add_argument("--impact", action = "store_true",
+                    help = "arguments are focal distances (AU); print impact parameters")
+    fo.set_defaults(func = focal_cmd)
+
+    args = parser.parse_args(argv)
+    if args.quiet:
+        import instrument
+        instrument.set_verbose(False)
+    args.func(args)
+
+    if args.timing:
+        heavy = sorted(m for m in HEAVY_MODULES if m in sys.modules)
+        print("%s finished in %.3f s (budget %.2f s); heavy libraries loaded: %s"
+              %(args.command, time.perf_counter() - START_TIME,
+                COLD_START_BUDGET[args.command], ", ".join(heavy) or "none"))
+
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,10 @@
 # as a function of how close light passes to the sun
 #
 # Table of contents
+# calc_foci - focal distance of light passing at distance(s) r
+# focal_table - monotonic table of focal distance against impact parameter
+# calc_impact - impact parameter that focuses at a given focal distance
+# plot_foci - plots the focal distance against the impact parameter
 #
 # Revision history
 # 03/18/19    Tim Liu    created file; began writing documentation
@@ -11,48 +15,100 @@
 # 03/18/19    Tim Liu 
 
 
+import functools                  # caching the lookup table
 import math
-import matplotlib.pyplot as plt
 import os
-import numpy as np
+import numpy as np                # arrays of impact parameters
 
 HOME = os.getcwd()
 
 # import astronomical constants
 from astro_constants import *
 
+FOCAL_TABLE_MAX = 100             # largest impact parameter in the table (solar radii)
+FOCAL_TABLE_POINTS = 2048         # points in the table
+
 def calc_foci(r):
     '''calculates the focal distance based on r, the distance
     light passes from the sun
-    inputs: r - distance from the sun of the passing light'''
+    inputs: r - distance from the sun of the passing light (m); may be
+                an array
+    outputs: f_d - focal distance (AU); an array if r is an array'''
 
+    r = np.asarray(r, dtype = float)
     theta = 4 * G * M_S/C**2/r    # angle of deflection
-    f_d = r * math.tan(math.pi/2-theta)     # focal distance in meters
+    f_d = r * np.tan(np.pi/2-theta)         # focal distance in meters
+
+    f_d = f_d/AU                  # focal distance in AU
+    return f_d if f_d.ndim else float(f_d)
+
+@functools.lru_cache(maxsize = None)
+def focal_table(r_max = FOCAL_TABLE_MAX, points = FOCAL_TABLE_POINTS):
+    '''table of focal distance against impact parameter from the solar
+    radius to r_max. Points are spaced geometrically; the focal distance
+    grows monotonically (close to r squared) so the table can be
+    interpolated either way. Tables are built once and cached.
+    inputs: r_max - largest impact parameter (solar radii)
+            points - number of points in the table
+    outputs: r_table - impact parameters (solar radii)
+             f_table - focal distances (AU)'''
+
+    r_table = np.geomspace(1, r_max, points)
+    f_table = calc_foci(r_table * R_S)
+    # both columns must increase for the inverse lookup
+    assert(np.all(np.diff(f_table) > 0))
 
-    return f_d/AU                 # return focal distance in AU
+    return r_table, f_table
 
-def plot_foci(r_max):
+def calc_impact(f_d, r_max = FOCAL_TABLE_MAX):
+    '''impact parameter of the light that focuses at focal distance f_d;
+    the inverse of calc_foci. Interpolates focal_table in log-log space,
+    where the relation is nearly a straight line.
+    inputs: f_d - focal distance (AU); may be an array
+            r_max - largest impact parameter of the table (solar radii)
+    outputs: r - impact parameter (solar radii); nan for focal distances
+                 closer than the grazing ray's or beyond the table'''
+
+    r_table, f_table = focal_table(r_max)
+    log_f = np.log(np.asarray(f_d, dtype = float))
+    r = np.exp(np.interp(log_f, np.log(f_table), np.log(r_table),
+                         left = np.nan, right = np.nan))
+
+    return r if r.ndim else float(r)
+
+def plot_foci(r_max, dpi = None, fmt = None, out_dir = None):
     '''plots the focal distance from the sun as a function
     of r. Plots from r = radius of sun to r_max
     inputs: r_max - maximum distance from the sun of the passing light
-                    in solar radii; must be greater than 1'''
+                    in solar radii; must be greater than 1
+            dpi - resolution of the saved chart; defaults to oberth.PLOT_DPI
+            fmt - file format of the saved chart ("png", "pdf", "svg", ...);
+                  defaults to oberth.PLOT_FORMAT
+            out_dir - folder the chart is saved to; defaults to
+                      oberth.GRAPH_DIR
+    outputs: path - path of the saved chart'''
+    # chart settings shared with the other plots; only needed to plot
+    import oberth
+    dpi = oberth.PLOT_DPI if dpi is None else dpi
+    fmt = oberth.PLOT_FORMAT if fmt is None else fmt
+    out_dir = oberth.GRAPH_DIR if out_dir is None else out_dir
+    plt = oberth.load_pyplot()
 
     assert(r_max > 1)
     r_array = np.linspace(1, r_max, num = 25)
-    f_d_array = [calc_foci(r * R_S) for r in r_array]
+    f_d_array = calc_foci(r_array * R_S)
 
     # set up graph
-    plt.xlabel("Distance between deflected light and sun (solar radii)")
-    plt.ylabel("Focal distance (AU)")
-    plt.title("Focal distance of light deflected by sun")
-    plt.grid(True)
-    plt.plot(r_array, f_d_array)
-
-    # go to graph directory and save
-    os.chdir(HOME + "/../graphs")
-    plt.savefig("fd_" + str(r_max) + "R_S.png", format="png", dpi = 800)
-    plt.close()
-    os.chdir(HOME)
+    fig, ax = plt.subplots()
+    ax.set_xlabel("Distance between deflected light and sun (solar radii)")
+    ax.set_ylabel("Focal distance (AU)")
+    ax.set_title("Focal distance of light deflected by sun")
+    ax.grid(True)
+    ax.plot(r_array, f_d_array)
 
+    # save to the graph directory
+    path = os.path.join(out_dir, "fd_" + str(r_max) + "R_S." + fmt)
+    fig.savefig(path, format = fmt, dpi = dpi)
+    plt.close(fig)
 
-    return
+    return path
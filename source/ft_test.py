@@ -18,7 +18,37 @@ from astro_constants import *     # astronomical constants
 from orbit import *               # helper functions for orbital calculations
 from spacecraft import *          # spacecraft class
 from flight_time import *         # flight time program
+from batch import *               # vectorized flight time engine
+import oberth                     # hyperbolic excess velocity
+import run_profiles               # parallel flight profile runner
+import flight_cache               # cache of flight_time results
+import tempfile                   # scratch folders
+import profile_io                 # bulk flight profile loader
+import flybys                     # command line entry point
+import inverse                    # inverse flight time solver
+import trajectory                 # streaming trajectory output
+import benchmark                  # benchmark suite
+import instrument                 # timers, counters and logging
+import state                      # compact spacecraft states
+import propagator                 # planar two body engine
+import kepler                     # closed form hyperbolic coast
+import focal                      # solar lens focal distance
+import bodies                     # parent bodies and departure chains
+import montecarlo                 # Monte Carlo dispersions
+import result_store               # columnar result store
+import surrogate                  # interpolated flight time tables
+import thrust                     # thrust schedules with mass depletion
+import evaluate                   # simple orbital calculations
+import spacecraft                 # module patched by the call counter
+import io
+import contextlib
+import concurrent.futures         # threads
+import subprocess                 # running the command line
+import sys
+import os
+import time                       # time library
 import math                       # math library
+import json                       # json lines tables
 
 
 # **** TEST ORBIT.PY LIBRARY *** #
@@ -232,4 +262,1060 @@ def test_long_burn():
 
     return
 
+def test_long_burn_adaptive():
+    '''runs the einstein_550 burn with long_burn_adaptive and checks the
+    post burn state against a long_burn with a very large step count, and
+    that a burn of no length is an impulse'''
 
+    # reference burn with 200 000 fixed steps
+    ref_craft = Spacecraft(132000, 0.1 * AU, M_S)
+    ref_craft.long_burn(100000, 10, 200000)
+
+    for rtol in [1e-4, 1e-6]:
+        test_craft = Spacecraft(132000, 0.1 * AU, M_S)
+        steps = test_craft.long_burn_adaptive(100000, 10, rtol)
+        print("rtol: ", rtol, " steps used: ", steps)
+        print("Final velocity: ", test_craft.get_v(units = "km/s"), " km/s")
+        print("Final position: ", test_craft.get_dis_travel(units = "AU"), " AU\n")
+        # fixed steps leave ~1e-5 relative error of their own
+        assert(math.isclose(test_craft.get_v(), ref_craft.get_v(),
+                            rel_tol = rtol + 1e-5))
+        assert(math.isclose(test_craft.get_dis_travel(), ref_craft.get_dis_travel(),
+                            rel_tol = 10 * rtol + 1e-5))
+        assert(math.isclose(test_craft.get_elapse_t(), 10 * SEC_PER_DAY))
+        # two accepted burns per step, rejected trials are not counted
+        assert(steps % 2 == 0)
+
+    # a burn of no length is an impulse, as in long_burn
+    test_craft = Spacecraft(132000, 0.1 * AU, M_S)
+    assert(test_craft.long_burn_adaptive(100000, 0) == 1)
+    ref_craft = Spacecraft(132000, 0.1 * AU, M_S)
+    ref_craft.long_burn(100000, 0, 1)
+    assert(test_craft.get_v() == ref_craft.get_v() == 232000)
+    assert(test_craft.get_elapse_t() == 0)
+
+    return
+
+def test_coast_distance_methods():
+    '''coasts the same post burn spacecraft to 550 AU with every
+    quadrature method and checks that the results agree with a fine
+    Simpson's rule to within the requested tolerance'''
+
+    # post burn state of the einstein_550 profile
+    base_craft = Spacecraft(132000, 0.1 * AU, M_S)
+    base_craft.long_burn(100000, 10, 1000)
+
+    # reference result from a fine Simpson's rule
+    ref_craft = base_craft.clone()
+    ref_craft.coast_distance(200000, 550)
+    ref_t = ref_craft.get_elapse_t()
+
+    for method in ["adaptive", "gauss", "analytic"]:
+        test_craft = base_craft.clone()
+        error = test_craft.coast_distance(None, 550, method = method, rtol = 1e-9)
+        print(method, ": ", test_craft.get_elapse_t(units = "years"), " years")
+        print("Estimated error: ", error, " s\n")
+        assert(math.isclose(test_craft.get_elapse_t(), ref_t, rel_tol = 1e-8))
+        assert(test_craft.get_dis_travel(units = "AU") == 550)
+
+    # Simpson's rule rounds n up to even with at least 6 segments, and the
+    # error estimate holds when n / 2 is odd
+    for n, evals in [(1, 7), (9, 11), (10, 11), (12, 13)]:
+        value, error, count = simpson(np.exp, 0, 1, n)
+        assert(count == evals)
+        assert(0.9 < error / abs(value - (math.e - 1)) < 4)
+    ships = SpacecraftBatch([250000, 250000], 0.1 * AU, M_S)
+    ships.coast_distance([9, 10], 550)
+    test_craft = Spacecraft(250000, 0.1 * AU, M_S)
+    test_craft.coast_distance(10, 550)
+    assert(ships.elapse_t[0] == ships.elapse_t[1])
+    assert(math.isclose(ships.elapse_t[0], test_craft.get_elapse_t(), rel_tol = 1e-12))
+
+    return
+
+def test_converge_steps():
+    '''chooses step counts for the einstein_550 profile by a convergence
+    study and checks the extrapolated flight time against a fine run'''
+
+    # reference flight time from many burn and coast steps
+    ref_craft = Spacecraft(132000, 0.1 * AU, M_S)
+    ref_craft.long_burn(100000, 10, 200000)
+    ref_craft.coast_distance(20000, 550)
+    ref_t = ref_craft.get_elapse_t()
+
+    for rtol in [1e-3, 1e-4]:
+        study = converge_steps(132000, 0.1, 100000, 10, M_S, 550, rtol)
+        print("rtol: ", rtol, " study: ", study, "\n")
+        assert(math.isclose(study["flight_time"], ref_t, rel_tol = rtol))
+        assert(study["burn_error"] + study["coast_error"] <= rtol * ref_t)
+        # the burn is first order
+        assert(abs(study["burn_order"] - 1) < 0.1)
+
+    # "auto" step counts run the study inside flight_time
+    metrics = {}
+    post_burn, ship, comp_time = flight_time(132000, 0.1, 100000, 10, "auto",
+                                             "auto", M_S, 550, auto_rtol = 1e-3,
+                                             metrics = metrics)
+    assert(math.isclose(ship.get_elapse_t(), ref_t, rel_tol = 1e-3))
+    # the calculation time includes the study
+    assert(comp_time >= metrics["convergence_time_s"])
+
+    return
+
+
+
+# **** TEST STATE.PY *** #
+
+def test_state_steps():
+    '''advances an array of states and Spacecraft objects through the same
+    burn and checks they agree; checks records and clones round trip'''
+
+    v0 = [132000, 100000, 150000]
+    states = state.new_states(v0, 0.1 * AU, M_S)
+    ships = [Spacecraft(v, 0.1 * AU, M_S) for v in v0]
+
+    # snapshot every step into a preallocated array
+    steps = 100
+    history = np.zeros((steps, len(v0)), dtype = state.STATE_DTYPE)
+    for step in range(steps):
+        state.burn(states, 1000)
+        state.coast_time(states, 8640)
+        for ship in ships:
+            ship.burn(1000)
+            ship.coast_time(8640)
+        history[step] = states
+
+    for i, ship in enumerate(ships):
+        print(ship)
+        assert(math.isclose(states["v"][i], ship.v, rel_tol = 1e-12))
+        assert(math.isclose(states["dis_travel"][i], ship.dis_travel, rel_tol = 1e-12))
+        # records round trip through the structured array
+        copy = Spacecraft.from_record(history[-1, i])
+        assert(copy.record() == tuple(float(x) for x in states[i]))
+
+    # inactive states are left alone
+    before = states.copy()
+    state.coast_time(states, 8640, active = np.array([True, False, True]))
+    assert(states[1] == before[1])
+    assert(states["elapse_t"][0] == before["elapse_t"][0] + 8640)
+
+    # slotted spacecraft have no __dict__ and clones are independent
+    clone = ships[0].clone()
+    clone.burn(1)
+    assert(not hasattr(ships[0], "__dict__"))
+    assert(clone.v == ships[0].v + 1)
+
+    return
+
+
+# **** TEST PROPAGATOR.PY *** #
+
+def test_propagate():
+    '''propagates the einstein_550 profile with the planar engine and
+    checks convergence, conservation while coasting, the dense output,
+    instantaneous burns and agreement with the straight line model'''
+
+    # the Dormand-Prince tableau leaves the speed of light alone
+    assert(propagator.C == 299792458)
+    fine = propagator.propagate(132000, 0.1, 100000, 10, 550, rtol = 1e-12)
+    for rtol in [1e-6, 1e-9]:
+        traj = propagator.propagate(132000, 0.1, 100000, 10, 550, rtol = rtol)
+        print("rtol: ", rtol, " flight time: ", traj.t_event / SEC_PER_YEAR,
+              " years, evaluations: ", traj.nfev)
+        assert(math.isclose(traj.t_event, fine.t_event, rel_tol = 10 * rtol))
+        # far fewer evaluations than a 1000 step long_burn and coast
+        assert(traj.nfev < 1000)
+
+    # energy and angular momentum are constant after the burn
+    t = np.linspace(fine.t_burn, fine.t_event, 11)
+    s = fine.state_at(t)
+    r = np.hypot(s[:, 0], s[:, 1])
+    energy = 0.5 * (s[:, 2] ** 2 + s[:, 3] ** 2) - G * M_S / r
+    momentum = s[:, 0] * s[:, 3] - s[:, 1] * s[:, 2]
+    assert(np.allclose(energy, energy[0], rtol = 1e-9))
+    assert(np.allclose(momentum, momentum[0], rtol = 1e-9))
+    # the propagation ends at the final distance
+    assert(math.isclose(fine.radius_at(fine.t_event), math.hypot(550, 0.1) * AU,
+                        rel_tol = 1e-12))
+
+    # the planar engine behind flight_time; the path is curved so it only
+    # agrees roughly with the straight line model
+    with instrument.quiet():
+        post_burn, ship, comp_time = flight_time(132000, 0.1, 100000, 10, 1000, 1000,
+                                                 M_S, 550, engine = "planar")
+        straight = flight_time(132000, 0.1, 100000, 10, 1000, 1000, M_S, 550)[1]
+    assert(math.isclose(post_burn.get_elapse_t(), 10 * SEC_PER_DAY))
+    assert(math.isclose(ship.get_elapse_t(), straight.get_elapse_t(), rel_tol = 0.01))
+
+    # a burn of no length is an impulse at periapsis in both engines
+    impulse = propagator.propagate(132000, 0.1, 100000, 0, 550)
+    assert(impulse.t_event == propagator.propagate(232000, 0.1, 0, 0, 550).t_event)
+    with instrument.quiet():
+        straight = flight_time(132000, 0.1, 100000, 0, 1000, 1000, M_S, 550)[1]
+    assert(math.isclose(impulse.t_event, straight.get_elapse_t(), rel_tol = 0.01))
+
+    return
+
+
+def test_coast_checkpoints():
+    '''checks the times at several checkpoints from one coast against
+    separate coasts to each distance'''
+
+    post_burn = Spacecraft(132000, 0.1 * AU, M_S)
+    post_burn.long_burn(100000, 10, 1000)
+    checkpoints = [120, 550, 600, 1000]
+
+    ship = post_burn.clone()
+    table = ship.coast_checkpoints(4000, checkpoints)
+    print(table[["x_final", "elapse_t", "error"]])
+    assert(ship.get_dis_travel(units = "AU") == 1000)
+    assert(np.all(np.diff(table["error"]) >= 0))
+    kepler_table = post_burn.clone().coast_checkpoints(None, checkpoints, method = "kepler")
+    for row, kepler_row, x_final in zip(table, kepler_table, checkpoints):
+        single = post_burn.clone()
+        single.coast_distance(10 ** 5, x_final)
+        assert(math.isclose(row["elapse_t"], single.get_elapse_t(), rel_tol = 1e-7))
+        assert(math.isclose(row["v"], single.get_v(), rel_tol = 1e-12))
+        exact = post_burn.clone()
+        exact.coast_distance(None, x_final, method = "kepler")
+        assert(math.isclose(kepler_row["elapse_t"], exact.get_elapse_t(), rel_tol = 1e-12))
+
+    # one checkpoint is the same as coast_distance
+    single, one = post_burn.clone(), post_burn.clone()
+    single.coast_distance(1000, 550)
+    assert(one.coast_checkpoints(1000, [550])["elapse_t"][0] == single.get_elapse_t())
+
+    # the batch engine records the same table for every profile
+    ships = SpacecraftBatch([132000, 132000], 0.1 * AU, M_S)
+    ships.long_burn(100000, 10, 1000)
+    batch_kepler = ships.clone().coast_checkpoints(None, checkpoints, method = "kepler")
+    batch_table = ships.coast_checkpoints(4000, checkpoints)
+    assert(batch_table.shape == (2, 4))
+    assert(np.allclose(batch_table["elapse_t"][1], table["elapse_t"], rtol = BATCH_RTOL))
+    assert(np.allclose(batch_kepler["elapse_t"][0], kepler_table["elapse_t"], rtol = 1e-12))
+
+    try:
+        post_burn.clone().coast_checkpoints(1000, [550, 120])
+        assert(False)
+    except ValueError:
+        pass
+
+    return
+
+
+# **** TEST KEPLER.PY *** #
+
+def test_kepler_coast():
+    '''checks the closed form coast against the planar propagator, checks
+    that radius_after inverts time_of_flight and that the scalar and batch
+    "kepler" coasts agree'''
+
+    # coast of the planar propagator is on a true conic
+    traj = propagator.propagate(132000, 0.1, 100000, 10, 550, rtol = 1e-12)
+    x, y, vx, vy = traj.state_at(traj.t_burn)
+    r, v, h = math.hypot(x, y), math.hypot(vx, vy), x * vy - y * vx
+    r_event = math.hypot(550, 0.1) * AU
+    coast = kepler.time_of_flight(v, r, h, r, r_event)
+    print("Kepler coast: ", coast, " s, planar coast: ", traj.t_event - traj.t_burn, " s")
+    assert(math.isclose(coast, traj.t_event - traj.t_burn, rel_tol = 1e-9))
+
+    # radius after a time inverts the time of flight
+    radii = np.array([1.01 * r, 10 * AU, r_event])
+    times = kepler.time_of_flight(v, r, h, r, radii)
+    assert(np.allclose(kepler.radius_after(v, r, h, r, times), radii, rtol = 1e-12))
+    assert(np.allclose(kepler.radius_after(v, r, h, r, times[:2]),
+                       traj.radius_at(traj.t_burn + times[:2]), rtol = 1e-9))
+
+    # bound orbits have no hyperbolic solution
+    assert(math.isnan(kepler.time_of_flight(1000, AU, 1000 * AU, AU, 2 * AU)))
+
+    # scalar and batch coasts agree, and stay close to Simpson's rule
+    post_burn = Spacecraft(132000, 0.1 * AU, M_S)
+    post_burn.long_burn(100000, 10, 1000)
+    ship = post_burn.clone()
+    assert(ship.coast_distance(None, 550, method = "kepler") == 0)
+    simpson = post_burn.clone()
+    simpson.coast_distance(100000, 550)
+    res = flight_time_batch(132000, 0.1, 100000, 10, 1000, 1000, M_S, 550, "kepler")
+    assert(math.isclose(res["final_elapse_t"][0], ship.get_elapse_t(), rel_tol = BATCH_RTOL))
+    assert(math.isclose(ship.get_elapse_t(), simpson.get_elapse_t(), rel_tol = 1e-5))
+
+    # coasting for the Kepler time lands on the final distance
+    back = post_burn.clone()
+    back.coast_time(ship.get_elapse_t() - post_burn.get_elapse_t(), method = "kepler")
+    assert(math.isclose(back.get_dis_travel(units = "AU"), 550, rel_tol = 1e-12))
+
+    return
+
+
+# **** TEST FOCAL.PY *** #
+
+def test_calc_impact():
+    '''checks the array focal distance against the scalar formula, the
+    inverse lookup against calc_foci and where the chart is saved'''
+
+    r = np.linspace(1, 100, 1001)
+    f_d = focal.calc_foci(r * R_S)
+    for i in [0, 500, 1000]:
+        theta = 4 * G * M_S / C ** 2 / (r[i] * R_S)
+        assert(math.isclose(f_d[i], r[i] * R_S * math.tan(math.pi/2 - theta) / AU,
+                            rel_tol = 1e-12))
+    assert(isinstance(focal.calc_foci(R_S), float))
+
+    # the inverse recovers the impact parameter
+    r_back = focal.calc_impact(f_d)
+    print("Largest relative error: ", np.max(np.abs(r_back / r - 1)))
+    assert(np.allclose(r_back, r, rtol = 1e-8))
+    assert(math.isclose(focal.calc_impact(focal.calc_foci(1.5 * R_S)), 1.5, rel_tol = 1e-8))
+    # closer than the grazing ray's focus there is no solution
+    assert(math.isnan(focal.calc_impact(500)))
+
+    # charts go to the requested folder without changing directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        path = focal.plot_foci(5, dpi = 50, fmt = "svg", out_dir = directory)
+        assert(os.path.dirname(path) == directory and path.endswith(".svg"))
+        assert(os.path.getsize(path) > 0 and os.getcwd() == cwd)
+
+    # the focal math does not load the plotting settings of oberth.py
+    loaded = subprocess.run([sys.executable, "-c",
+                             "import focal, sys; print('oberth' in sys.modules)"],
+                            cwd = os.path.dirname(os.path.abspath(__file__)),
+                            capture_output = True, text = True, check = True).stdout
+    assert(loaded.strip() == "False")
+
+    return
+
+
+# **** TEST BODIES.PY *** #
+
+def test_departure_chain():
+    '''checks the parent body registry and a Jupiter escape chain against
+    the two burn calculation of oberth.py'''
+
+    assert(bodies.parent_mass("Jupiter") == M_J)
+    try:
+        bodies.parent_mass("Pluto")
+        assert(False)
+    except ValueError as err:
+        print(err)
+    assert(profile_io.validate_row({"v0": 1, "r0": 1, "dv": 1, "parent": "Jupiter",
+        "r_final": 1, "burn_time": 1, "burn_steps": 1, "coast_steps": 1})["parent_m"] == M_J)
+
+    # grid of escape and Oberth burns from an orbit reaching out to Callisto
+    dv_escape = np.linspace(0, 10000, 21)
+    dv_oberth = np.linspace(0, 30000, 7)
+    chain = bodies.departure_chain("Jupiter", dv_escape[:, None], dv_oberth,
+                                   7.56e7, v_park = evaluate.calc1())
+    assert(chain.shape == (21, 7))
+
+    for row in chain.ravel():
+        if np.isnan(row["planet_vi"]):
+            # did not escape Jupiter
+            c3 = (evaluate.calc1() + row["dv_escape"]) ** 2 - 2 * G * M_J / 7.56e7
+            assert(c3 < 0)
+        elif row["planet_vi"] < 2 * JUPITER_V:
+            # leaving against Jupiter's motion is the first burn of two_burns;
+            # past Jupiter's speed the orbit reverses with the same shape
+            dv1 = abs(JUPITER_V - row["planet_vi"]) - JUPITER_V
+            v_inf = oberth.calc_vi(dv1, row["dv_oberth"], JUPITER_R, JUPITER_V)
+            if v_inf == -1:
+                assert(np.isnan(row["v_infinity"]))
+            else:
+                assert(math.isclose(row["v_infinity"], v_inf, rel_tol = 1e-12))
+            assert(row["safe"] == (row["perihelion"] >= oberth.MIN_R))
+        else:
+            # faster than Jupiter; the second burn is at Jupiter's orbit
+            assert(row["perihelion"] == JUPITER_R)
+
+    print(chain[::5, -1])
+    assert(np.nanmax(chain["v_infinity"]) > 0)
+
+    return
+
+
+# **** TEST MONTECARLO.PY *** #
+
+def test_monte_carlo():
+    '''checks the streaming statistics against numpy on stored values,
+    that a seed reproduces a run, that undispersed samples give the
+    nominal flight time and that failed samples are counted as nan'''
+
+    # statistics merged over uneven chunks match the whole array
+    values = np.random.default_rng(3).lognormal(0, 0.5, 100000)
+    stats = montecarlo.StreamingStats()
+    for chunk in np.array_split(values, 7):
+        stats.update(chunk)
+    stats.update([np.nan])
+    assert(stats.count == values.size and stats.nan_count == 1)
+    assert(math.isclose(stats.mean, values.mean(), rel_tol = 1e-12))
+    assert(math.isclose(stats.var(), values.var(ddof = 1), rel_tol = 1e-10))
+    q = [0, 0.01, 0.5, 0.99, 1]
+    error = np.abs(stats.quantile(q) - np.quantile(values, q))
+    print("Quantile errors: ", error)
+    assert(np.all(error < 1e-3 * values.std()))
+
+    # the same seed gives the same run
+    sigma = {"v0": 0.01, "dv": 0.02, "burn_time": 0.05}
+    run = lambda seed: montecarlo.monte_carlo(132000, 0.1, 100000, 10, 550, 5000, sigma,
+                                              seed = seed, chunk = 2000, burn_steps = 50,
+                                              coast_method = "kepler")
+    first, second, other = run(7), run(7), run(8)
+    print(first["arrival_years"].summary())
+    assert(first["arrival_years"].summary() == second["arrival_years"].summary())
+    assert(first["arrival_years"].mean != other["arrival_years"].mean)
+    assert(first["arrival_years"].count == 5000)
+
+    # without dispersions every sample is the nominal flight_time() profile
+    with instrument.quiet():
+        nominal = flight_time(132000, 0.1, 100000, 10, 1000, 1000, M_S, 550)[1]
+    flat = montecarlo.monte_carlo(132000, 0.1, 100000, 10, 550, 10, {})
+    years = nominal.get_elapse_t(units = "years")
+    assert(math.isclose(flat["arrival_years"].quantile(0.5), years, rel_tol = BATCH_RTOL))
+    assert(flat["arrival_years"].std() < 1e-12 * years)
+
+    # wide dispersions give negative starting velocities and bound orbits;
+    # those samples fail as nan instead of stopping the run
+    wide = montecarlo.monte_carlo(132000, 0.1, 100000, 10, 550, 5000, {"v0": 0.5},
+                                  seed = 1, burn_steps = 50, coast_method = "kepler")
+    print(wide["arrival_years"].summary())
+    assert(wide["arrival_years"].nan_count > 0 and wide["arrival_years"].count > 0)
+    assert(wide["arrival_years"].count + wide["arrival_years"].nan_count == 5000)
+
+    return
+
+
+# **** TEST RESULT_STORE.PY *** #
+
+def test_result_store():
+    '''appends a batch of results and a profile run to a store, reopens
+    it and checks the chunked queries against the stored values and that
+    a crashed lock holder does not block appends'''
+
+    res = flight_time_batch(np.linspace(120000, 140000, 1000), 0.1, 100000, 10,
+                            100, 1000, M_S, 550, "kepler")
+    with tempfile.TemporaryDirectory() as directory:
+        store = result_store.ResultStore(directory)
+        assert(store.append(res) == 0)
+        # bytes of an append that never reached the manifest are dropped
+        with open(store.path("v0"), "ab") as f:
+            f.write(b"\0" * 24)
+
+        with instrument.quiet():
+            post_burn, ship, calc_time, out_file = open_flight_profile(
+                "einstein_550.xlsx", store = store)
+        assert(out_file is None)
+
+        # a new reader sees every committed row
+        store = result_store.ResultStore(directory)
+        assert(len(store) == 1001 and store.column("v0").shape == (1001,))
+        assert(np.array_equal(store.column("final_elapse_t")[:1000], res["final_elapse_t"]))
+        row = store.select(lambda c: c["profile"] == b"einstein_550")
+        print(row[["profile", "burn_steps", "final_elapse_t", "calc_time"]])
+        assert(row.size == 1 and row["final_elapse_t"][0] == ship.get_elapse_t())
+        assert(row["burn_v"][0] == post_burn.get_v() and row["burn_time_s"][0] > 0)
+
+        # filters and aggregates run chunk by chunk
+        fast = store.select(lambda c: c["v0"] > 130000, ["v0", "final_elapse_t"], chunk = 64)
+        assert(np.array_equal(fast["v0"][:-1], res["v0"][res["v0"] > 130000]))
+        stats = store.aggregate("final_elapse_t", lambda c: c["burn_steps"] == 100, chunk = 64)
+        assert(stats.count == 1000)
+        assert(math.isclose(stats.mean, res["final_elapse_t"].mean(), rel_tol = 1e-12))
+
+        # a process holding the lock blocks appends until it crashes
+        holder = subprocess.Popen([sys.executable, "-c",
+                                   "import result_store, sys, time\n"
+                                   "result_store.ResultStore(sys.argv[1])._lock()\n"
+                                   "print('locked', flush = True)\n"
+                                   "time.sleep(60)", directory],
+                                  stdout = subprocess.PIPE, text = True)
+        saved_timeout = result_store.LOCK_TIMEOUT
+        try:
+            assert(holder.stdout.readline().strip() == "locked")
+            result_store.LOCK_TIMEOUT = 0.05
+            store.append(res[:10])
+            assert(False)
+        except TimeoutError:
+            pass
+        finally:
+            result_store.LOCK_TIMEOUT = saved_timeout
+            holder.kill()
+            holder.wait()
+            holder.stdout.close()
+        assert(store.append(res[:10]) == 1001)
+        assert(len(result_store.ResultStore(directory)) == 1011)
+
+    return
+
+
+# **** TEST SURROGATE.PY *** #
+
+def test_flight_table():
+    '''checks interpolated flight times against the batch engine, that the
+    error estimate holds, that nodes are exact, that queries outside the
+    grid or next to a nan node fall back to the engine and that a saved
+    table loads back'''
+
+    table = surrogate.build_table(np.linspace(110000, 150000, 11), np.linspace(0.08, 0.12, 9),
+                                  np.linspace(80000, 120000, 11), [8, 10, 12],
+                                  np.geomspace(120, 1000, 6), burn_steps = 50,
+                                  coast_method = "kepler")
+    print(table)
+    rng = np.random.default_rng(5)
+    n = 5000
+    inputs = [rng.uniform(110000, 150000, n), rng.uniform(0.08, 0.12, n),
+              rng.uniform(80000, 120000, n), rng.uniform(8, 12, n),
+              rng.uniform(120, 1000, n)]
+    t, bound = table.query(*inputs)
+    exact = flight_time_batch(*inputs[:4], 50, 1000, M_S, inputs[4], "kepler")["final_elapse_t"]
+    print("Largest relative error: ", np.max(np.abs(t - exact) / exact))
+    assert(np.all(np.abs(t - exact) <= bound))
+    assert(np.median(bound / exact) < 1e-2)
+
+    # grid nodes are exact and outside queries run the engine
+    r_node = table.axes[4][3]
+    node = flight_time_batch(130000, 0.1, 100000, 10, 50, 1000, M_S, r_node, "kepler")
+    outside = flight_time_batch(160000, 0.1, 100000, 10, 50, 1000, M_S, 550, "kepler")
+    t, bound = table.query([130000, 160000], 0.1, 100000, 10, [r_node, 550])
+    assert(math.isclose(t[0], node["final_elapse_t"][0], rel_tol = 1e-9))
+    assert(t[1] == outside["final_elapse_t"][0] and bound[1] == 0)
+    assert(np.isnan(table.query(160000, 0.1, 100000, 10, 550, fallback = False)[0]))
+
+    # a failed (nan) node sends the queries of its cells to the engine
+    values = table.values.copy()
+    values[5, 4, 5, 1, 3] = np.nan
+    holed = surrogate.FlightTable(dict(zip(surrogate.AXES, table.axes)), values,
+                                  table.settings)
+    t, bound = holed.query([130000, 131000], 0.1, [100000, 101000], 10, r_node)
+    node = flight_time_batch([130000, 131000], 0.1, [100000, 101000], 10, 50, 1000,
+                             M_S, r_node, "kepler")
+    assert(np.array_equal(t, node["final_elapse_t"]) and np.all(bound == 0))
+    assert(np.all(np.isnan(holed.query(131000, 0.1, 101000, 10, r_node,
+                                       fallback = False))))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "table.npz")
+        table.save(path)
+        loaded = surrogate.load_table(path)
+    assert(np.array_equal(loaded.query(*inputs)[0], table.query(*inputs)[0]))
+    assert(loaded.settings == table.settings)
+
+    # by default a table models flight_time() at the profiles' settings
+    default = surrogate.build_table(130000, 0.1, 100000, 10, 550)
+    with instrument.quiet():
+        ship = flight_time(130000, 0.1, 100000, 10, 1000, 1000, M_S, 550)[1]
+    assert(math.isclose(default.query(130000, 0.1, 100000, 10, 550)[0], ship.get_elapse_t(),
+                        rel_tol = BATCH_RTOL))
+
+    return
+
+
+# **** TEST THRUST.PY *** #
+
+def test_execute_schedule():
+    '''checks a thrust schedule against long_burn when the mass barely
+    changes, the rocket equation over several segments, running out of
+    propellant and the cost of a schedule with many segments'''
+
+    # an almost massless exhaust flow is the constant acceleration burn
+    ship = Spacecraft(132000, 0.1 * AU, M_S)
+    ship.long_burn(100000, 10, 1000)
+    scheduled = Spacecraft(132000, 0.1 * AU, M_S)
+    report = thrust.execute_schedule(scheduled, [(0, 10, 1000 * 100000 / (10 * SEC_PER_DAY), 1e15)],
+                                     1000, steps = 1000)
+    assert(math.isclose(report["dv"][0], 100000, rel_tol = 1e-9))
+    assert(math.isclose(scheduled.get_v(), ship.get_v(), rel_tol = 1e-9))
+    assert(math.isclose(scheduled.get_dis_travel(), ship.get_dis_travel(), rel_tol = 1e-9))
+
+    # D-He3 burns with a coast between them follow the rocket equation
+    ve = calc_exhaust_velocity(MASS_HE4, 3.6)
+    schedule = thrust.make_schedule([(0, 5, 200, ve), (10, 5, 200, ve)])
+    post_burn, ship, report = thrust.flight_time_schedule(132000, 0.1, schedule, 1000, 400,
+                                                          1000, 1000, M_S, 550)
+    print(report)
+    used = 200 / ve * 10 * SEC_PER_DAY
+    assert(math.isclose(report["mass"][-1], 1000 - used, rel_tol = 1e-12))
+    assert(math.isclose(report["dv"].sum(), ve * math.log(1000 / (1000 - used)), rel_tol = 1e-12))
+    assert(math.isclose(post_burn.get_elapse_t(), 15 * SEC_PER_DAY, rel_tol = 1e-12))
+    assert(ship.get_dis_travel(units = "AU") == 550)
+
+    # thrust stops at the dry mass and the rest of the segment is a coast
+    report = thrust.execute_schedule(Spacecraft(132000, 0.1 * AU, M_S), [(0, 10, 2e5, 1e6)], 1000, 900)
+    assert(report["mass"][0] == 900 and report["duration"][0] < 10)
+    assert(math.isclose(report["dv"][0], 1e6 * math.log(1000 / 900), rel_tol = 1e-12))
+
+    # many segments share the steps of one burn
+    many = thrust.make_schedule([(0.2 * i, 0.1, 200, ve) for i in range(100)])
+    report = thrust.execute_schedule(Spacecraft(132000, 0.1 * AU, M_S), many, 1000, 400, 1000)
+    assert(report["steps"].sum() <= 1000)
+
+    try:
+        thrust.make_schedule([(0, 5, 200, ve), (4, 5, 200, ve)])
+        assert(False)
+    except ValueError:
+        pass
+
+    return
+
+
+# **** TEST INSTRUMENT.PY *** #
+
+def test_flight_time_metrics():
+    '''runs flight_time() with a metrics dictionary and a callback and
+    checks the counts, also from several threads at once; checks that
+    quiet() silences the messages'''
+
+    args = [132000, 0.1, 100000, 10, 100, 1000, M_S, 550]
+
+    out = io.StringIO()
+    metrics = {}
+    with contextlib.redirect_stdout(out), instrument.quiet():
+        flight_time(*args, metrics = metrics)
+    print(metrics)
+    assert(out.getvalue() == "")
+
+    # each instantaneous burn calls calc_v_2 twice
+    assert(metrics["burn_steps"] == 100)
+    assert(metrics["burn_calc_v_2"] == 2 * 100)
+    assert(metrics["calc_v_2"] == metrics["burn_calc_v_2"] + metrics["coast_calc_v_2"])
+    assert(metrics["coast_calc_v_2"] > 1000)
+    for phase in ["burn", "coast", "logging"]:
+        assert(metrics[phase + "_time_s"] >= 0)
+    # the wrapper is removed afterwards
+    assert(spacecraft.calc_v_2 is calc_v_2)
+
+    # messages are shown by default and callbacks get the same metrics
+    out = io.StringIO()
+    received = []
+    with contextlib.redirect_stdout(out):
+        flight_time(*args, metrics = received.append)
+    assert("Flight time:" in out.getvalue())
+    assert(received[0]["calc_v_2"] == metrics["calc_v_2"])
+
+    # runs in several threads count only their own calls
+    def run(i):
+        counts = {}
+        with instrument.quiet():
+            flight_time(*args, metrics = counts)
+        return counts["calc_v_2"]
+    with concurrent.futures.ThreadPoolExecutor(4) as pool:
+        counts = list(pool.map(run, range(8)))
+    assert(counts == [metrics["calc_v_2"]] * 8)
+    assert(spacecraft.calc_v_2 is calc_v_2)
+
+    return
+
+
+# **** TEST BATCH.PY *** #
+
+def test_flight_time_batch():
+    '''runs several flight profiles, one around Jupiter, through
+    flight_time() and flight_time_batch() and checks the results agree
+    to BATCH_RTOL'''
+
+    # each case holds the arguments passed to flight_time
+    test_cases = [[132000, 0.1, 100000, 10, 1000, 1000, M_S, 550],
+                  [100000, 0.5, 10000, 20, 100, 101, M_S, 50],
+                  [150000, 0.1, 20000, 1, 10, 50, M_S, 10],
+                  [50000, 1, 10000, 10, 100, 1000, M_J, 5]]
+
+    # run every case at once through the batch engine
+    results = flight_time_batch(*[list(x) for x in zip(*test_cases)])
+
+    for case, row in zip(test_cases, results):
+        post_burn, ship, comp_time = flight_time(*case)
+        print("Scalar flight time: ", ship.get_elapse_t(units = "years"), " years")
+        print("Batch flight time:  ", row["final_elapse_t"]/SEC_PER_YEAR, " years\n")
+        assert(math.isclose(post_burn.get_v(), row["burn_v"], rel_tol = BATCH_RTOL))
+        assert(math.isclose(ship.get_v(), row["final_v"], rel_tol = BATCH_RTOL))
+        assert(math.isclose(ship.get_elapse_t(), row["final_elapse_t"],
+                            rel_tol = BATCH_RTOL))
+
+    return
+
+
+# **** TEST RUN_PROFILES.PY *** #
+
+def test_find_profiles():
+    '''checks that profile patterns are looked up in the config folder
+    and that the template is skipped'''
+
+    paths = run_profiles.find_profiles("einstein_*.xlsx")
+    print(paths)
+    assert([os.path.basename(p) for p in paths] ==
+           ["einstein_550.xlsx", "einstein_600.xlsx"])
+    # a directory expands to every profile except the template
+    paths = run_profiles.find_profiles(CONFIG_DIR)
+    assert(len(paths) == 4)
+
+    # the paths still open from another folder
+    cwd = os.getcwd()
+    try:
+        os.chdir("..")
+        paths = run_profiles.find_profiles("config")
+        assert(len(paths) == 4 and all(os.path.isabs(p) for p in paths))
+        assert(read_flight_profile(paths[0])["r_final"] > 0)
+        relative = read_flight_profile(os.path.join("config", "einstein_550.xlsx"))
+        assert(relative == read_flight_profile(os.path.abspath("config/einstein_550.xlsx")))
+    finally:
+        os.chdir(cwd)
+
+    # summaries saved in the same second do not overwrite each other
+    profile_path = run_profiles.find_profiles("einstein_550.xlsx")[0]
+    rows = [dict.fromkeys(run_profiles.SUMMARY_FIELDS, 1)]
+    logs = sys.modules[write_log.__module__]      # module holding OUTPUT_DIR
+    saved_dir = logs.OUTPUT_DIR
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            logs.OUTPUT_DIR = directory
+            paths = {run_profiles.save_summary(rows) for i in range(3)}
+            # the log column holds the text log of a profile when one is saved
+            with instrument.quiet():
+                row = run_profiles.run_profile(profile_path, text_log = True)
+                plain = run_profiles.run_profile(profile_path)
+        finally:
+            logs.OUTPUT_DIR = saved_dir
+        assert(len(paths) == 3 and all(p.endswith(".csv") for p in paths))
+        with open(sorted(paths)[0]) as f:
+            assert(f.readline().startswith("profile,v0"))
+        assert(row["error"] == "" and os.path.dirname(row["log"]) == directory)
+        assert(plain["log"] == "")
+
+    return
+
+
+# **** TEST FLIGHT_CACHE.PY *** #
+
+def test_flight_cache():
+    '''runs the same profile twice through a FlightCache and checks the
+    second call is a hit that matches the first, including from a new
+    cache object reading the same folder, that keys do not depend on how
+    arguments are passed, that metrics are replayed on a hit and that
+    eviction keeps the disk cache small without scanning it every time'''
+
+    case = [100000, 0.5, 10000, 20, 100, 100, M_S, 50]
+    with tempfile.TemporaryDirectory() as directory:
+        cache = flight_cache.FlightCache(directory)
+        post_burn, ship, comp_time = cache.flight_time(*case)
+        post_burn_2, ship_2, comp_time_2 = cache.flight_time(*case)
+        print(cache.stats())
+        assert(cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1)
+        assert(ship.get_elapse_t() == ship_2.get_elapse_t())
+
+        # a fresh cache reads the result back from disk
+        cache = flight_cache.FlightCache(directory)
+        post_burn_3, ship_3, comp_time_3 = cache.flight_time(*case)
+        assert(cache.stats()["hits"] == 1)
+        assert(ship.get_elapse_t() == ship_3.get_elapse_t())
+
+        # a different model version misses
+        cache = flight_cache.FlightCache(directory, version = "test")
+        cache.flight_time(*case)
+        assert(cache.stats()["misses"] == 1)
+
+        # keyword calls and explicit defaults share the key of a positional call
+        names = ["v0", "r0", "dv", "burn_time", "burn_steps", "coast_steps",
+                 "parent_m", "r_final"]
+        assert(cache.key(*case) == cache.key(**dict(zip(names, case))))
+        assert(cache.key(*case) == cache.key(*case, coast_method = "simpson"))
+
+        # metrics are not part of the key and are replayed on a hit
+        cache = flight_cache.FlightCache(directory)
+        metrics, replayed = {}, []
+        cache.flight_time(*case, metrics = metrics)
+        assert(cache.stats()["misses"] == 1 and metrics["coast_steps"] == 100)
+        cache.flight_time(*case, metrics = replayed.append)
+        cache.flight_time(*case, metrics = replayed.append)
+        assert(cache.stats()["hits"] == 2 and replayed == [metrics, metrics])
+
+        # the disk cache is kept under max_bytes without scanning the
+        # folder on every put
+        ship = Spacecraft(132000, 0.1 * AU, M_S)
+        cache.clear()
+        cache.put("size", (ship, ship, 0.0, None))
+        cache.max_bytes = 20 * cache.stats()["bytes"]
+        scans = []
+        evict = cache.evict
+        cache.evict = lambda: scans.append(1) or evict()
+        for i in range(200):
+            cache.put("%d" %i, (ship, ship, float(i), None))
+        assert(cache.bytes == cache.stats()["bytes"] <= cache.max_bytes)
+        assert(0 < len(scans) <= 200 // 2)
+
+    return
+
+
+# **** TEST PROFILE_IO.PY *** #
+
+def test_read_profiles():
+    '''writes the same two profiles as csv, json lines and a multi row
+    workbook and checks every format loads to the same columns. Also reads
+    the one profile layout of einstein_550.xlsx'''
+
+    import openpyxl
+    header = ["name", "v0", "r0", "dv", "parent", "r_final",
+              "burn_time", "burn_steps", "coast_steps"]
+    rows = [["a", 132000, 0.1, 100000, "Sun", 550, 10, 1000, 1000],
+            ["b", 100000, 0.5, 10000, "Sun", 50, 20, 100, 100]]
+
+    with tempfile.TemporaryDirectory() as directory:
+        f_csv = os.path.join(directory, "profiles.csv")
+        with open(f_csv, "w") as f:
+            f.write("\n".join(",".join(str(x) for x in row)
+                              for row in [header] + rows))
+        f_jsonl = os.path.join(directory, "profiles.jsonl")
+        with open(f_jsonl, "w") as f:
+            f.write("\n".join(json.dumps(dict(zip(header, row))) for row in rows))
+        f_xlsx = os.path.join(directory, "profiles.xlsx")
+        book = openpyxl.Workbook()
+        for row in [header] + rows:
+            book.active.append(row)
+        book.save(f_xlsx)
+
+        for path in [f_csv, f_jsonl, f_xlsx]:
+            chunks = list(profile_io.read_profiles(path, chunk_rows = 1))
+            print(path, len(chunks), " chunks")
+            assert(len(chunks) == 2)
+            assert(list(chunks[1]["name"]) == ["b"])
+            assert(chunks[0]["dv"][0] == 100000 and chunks[1]["coast_steps"][0] == 100)
+
+    chunk = next(profile_io.read_profiles(os.path.join(CONFIG_DIR, "einstein_550.xlsx")))
+    assert(chunk["v0"][0] == 132000 and chunk["parent_m"][0] == M_S)
+
+    # rows that break the schema are rejected
+    try:
+        profile_io.validate_row(dict(zip(header, rows[0][:-1])), 1)
+        assert(False)
+    except ValueError as e:
+        print(e)
+
+    return
+
+
+# **** TEST BENCHMARK.PY *** #
+
+def test_benchmark_compare():
+    '''runs one cheap benchmark, saves and reloads it as a baseline and
+    checks compare only flags benchmarks slower than the threshold'''
+
+    results = benchmark.run_benchmarks(repeat = 1, name_filter = "long_burn")
+    assert(list(results) == ["long_burn_100", "long_burn_1000", "long_burn_10000"])
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "baseline.json")
+        benchmark.save_baseline(results, path)
+        baseline = benchmark.load_baseline(path)
+    assert(baseline == results)
+
+    slower = {"long_burn_100": 1.5 * baseline["long_burn_100"],
+              "long_burn_1000": 1.1 * baseline["long_burn_1000"],
+              "long_burn_10000": 0.5 * baseline["long_burn_10000"],
+              "new_benchmark": 1.0}
+    regressions = benchmark.compare(slower, baseline, threshold = 0.25)
+    print(regressions)
+    assert([r[0] for r in regressions] == ["long_burn_100"])
+
+    return
+
+
+# **** TEST TRAJECTORY.PY *** #
+
+def test_flight_trajectory():
+    '''streams a flight to an array sink and a csv sink and checks the
+    final record matches flight_time() and that decimation thins the
+    records while keeping the end points'''
+
+    case = [100000, 0.5, 10000, 20, 100, 1000, M_S, 50]
+    post_burn, ship, comp_time = flight_time(*case)
+
+    sink = trajectory.ArraySink(capacity = 4)
+    count = trajectory.record_trajectory(trajectory.flight_trajectory(*case), sink)
+    records = sink.array()
+    print(count, " records; final: ", records[-1])
+    # one record per burn step and per pair of coast segments plus the start
+    assert(count == 1 + 100 + 1000 // 2)
+    assert(records[100]["phase"] == "burn" and records[101]["phase"] == "coast")
+    assert(math.isclose(records[100]["v"], post_burn.get_v(), rel_tol = 1e-12))
+    assert(math.isclose(records[-1]["elapse_t"], ship.get_elapse_t(), rel_tol = 1e-12))
+    assert(records[-1]["dis_travel"] == ship.get_dis_travel())
+    # an empty buffer grows too
+    empty = trajectory.ArraySink(capacity = 0)
+    trajectory.record_trajectory(trajectory.flight_trajectory(*case), empty)
+    assert(np.array_equal(empty.array(), records))
+
+    with tempfile.TemporaryDirectory() as directory:
+        f_csv = os.path.join(directory, "trajectory.csv")
+        with trajectory.CsvSink(f_csv) as csv_sink:
+            count = trajectory.record_trajectory(trajectory.flight_trajectory(*case),
+                                                 csv_sink, every_x = 5 * AU)
+        with open(f_csv) as f:
+            lines = f.read().splitlines()
+        print(count, " decimated records")
+        assert(len(lines) == count + 1)
+        assert(11 <= count <= 13)
+        assert(float(lines[-1].split(",")[2]) == ship.get_dis_travel())
+
+    return
+
+
+# **** TEST INVERSE.PY *** #
+
+def test_solve_flight():
+    '''runs forward flights for several delta-v values, then solves for
+    delta-v from their arrival times and checks the original values are
+    recovered. A target outside the bracket, or a bracket with an end that
+    does not escape, must come back unsolved'''
+
+    dv_values = [60000, 80000, 100000]
+    forward = flight_time_batch(132000, 0.1, dv_values, 10, 100, 100, M_S, 550)
+    targets = list(forward["final_elapse_t"] / SEC_PER_YEAR) + [1]
+
+    solution = inverse.solve_flight(targets, 550, "dv", (50000, 300000), v0 = 132000,
+                                    r0 = 0.1, burn_time = 10, burn_steps = 100,
+                                    coast_steps = 100, rtol = 1e-9)
+    print(solution)
+    for dv, row in zip(dv_values, solution):
+        assert(row["converged"])
+        assert(math.isclose(row["value"], dv, rel_tol = 1e-6))
+    assert(not solution[-1]["converged"] and np.isnan(solution[-1]["value"]))
+
+    # a bracket end that does not escape is reported unbracketed at once
+    solution = inverse.solve_flight(15, 550, "dv", (0, 300000), v0 = 100000, r0 = 0.1,
+                                    burn_time = 10, burn_steps = 100, coast_steps = 100)
+    assert(not solution["converged"][0] and np.isnan(solution["value"][0]))
+    assert(solution["iterations"][0] == 0)
+
+    return
+
+
+# **** TEST FLYBYS.PY *** #
+
+def test_cold_start():
+    '''runs each command line command in a fresh interpreter and checks it
+    finishes within its cold start budget without loading plotting or
+    spreadsheet libraries'''
+
+    commands = {"flight-time": ["132000", "0.1", "100000", "10", "550"],
+                "vinf": ["--", "-5000", "20000"],
+                "focal": ["1.5"]}
+    source = os.path.dirname(os.path.abspath(__file__))
+
+    for command, args in commands.items():
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, "flybys.py", "--timing", command] + args,
+                                cwd = source, capture_output = True, text = True,
+                                check = True).stdout
+        wall = time.perf_counter() - start
+        print(command, ": %.3f s" %wall)
+        assert(wall < flybys.COLD_START_BUDGET[command])
+        assert("heavy libraries loaded: none" in output)
+
+    return
+
+
+def test_flybys_commands():
+    '''runs the vinf command with an escaping first burn and the
+    flight-time command with a parent body other than the sun'''
+
+    def run(argv):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out), instrument.quiet():
+            flybys.main(argv)
+        return out.getvalue()
+
+    # the first burn alone escapes, so there is no perihelion
+    output = run(["vinf", "--", "100000", "1000"])
+    print(output)
+    assert("First burn escapes" in output)
+    assert(run(["vinf", "--", "-5000", "0"]) == "Does not escape the sun\n")
+
+    # --parent uses the mass of the body from the registry
+    args = [13000, 0.005, 10000, 1, 100, 1000]
+    output = run(["flight-time"] + [str(a) for a in args[:4]] + ["5", "--burn-steps", "100",
+                  "--parent", "Jupiter"])
+    with instrument.quiet():
+        post_burn, ship, comp_time = flight_time(*args, M_J, 5)
+    assert(output == str(ship) + "\n")
+    try:
+        flybys.main(["flight-time", "1", "1", "1", "1", "1", "--parent", "Pluto"])
+        assert(False)
+    except SystemExit as err:
+        assert("Pluto" in str(err))
+
+    return
+
+
+# **** TEST OBERTH.PY *** #
+
+def test_calc_vi_grid():
+    '''checks calc_vi_grid against the scalar calc_vi for every cell of
+    a coarse two burn grid'''
+
+    v1_values = np.arange(0.0, -12000, -1000)
+    v2_values = np.arange(0.0, 25000, 1000)
+    v_infinities = oberth.calc_vi_grid(v1_values, v2_values, JUPITER_R, JUPITER_V)
+    print("Escaping combos: ", v_infinities.count(), " of ", v_infinities.size)
+
+    for i in range(len(v1_values)):
+        for j in range(len(v2_values)):
+            v_inf = oberth.calc_vi(v1_values[i], v2_values[j], JUPITER_R, JUPITER_V)
+            if v_inf == -1:
+                # trapped combos are masked
+                assert(v_infinities.mask[i, j])
+            else:
+                assert(math.isclose(v_inf, v_infinities[i, j], rel_tol = 1e-12))
+
+    return
+
+def test_best_split():
+    '''checks best_split against every split of each budget in 1 m/s steps'''
+
+    budgets = np.arange(5000, 100001, 2500)
+    split = oberth.best_split(budgets)
+    max_dv1 = calc_dv(oberth.MIN_R, JUPITER_R, JUPITER_V)
+
+    for row in split:
+        # every split allowed by MIN_R
+        dv1 = np.arange(0.0, max(max_dv1, -row["budget"]), -1)
+        v_inf = oberth.calc_vi_array(dv1, row["budget"] - np.abs(dv1), JUPITER_R, JUPITER_V)
+        if v_inf.count() == 0:
+            assert(np.isnan(row["v_infinity"]))
+            continue
+        print(row)
+        assert(row["v_infinity"] >= v_inf.max() - 1e-6)
+        assert(row["dv1"] >= max_dv1 and row["dv2"] >= 0)
+        assert(math.isclose(abs(row["dv1"]) + row["dv2"], row["budget"]))
+        one_burn = oberth.calc_vi(0, row["budget"], JUPITER_R, JUPITER_V)
+        assert(math.isclose(row["gain"], row["v_infinity"] - max(one_burn, 0), abs_tol = 1e-6))
+        # a few dozen evaluations instead of one per split
+        assert(row["evaluations"] < 40)
+
+    return
+
+def test_plot_vi():
+    '''renders a 1000 x 1000 grid and a budget comparison without a
+    display and checks they finish quickly'''
+
+    v1_values = np.arange(0.0, -50000, -50)
+    v2_values = np.arange(0.0, 50000, 50)
+    v_infinities = oberth.calc_vi_grid(v1_values, v2_values, JUPITER_R, JUPITER_V)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        path = oberth.plot_vi(v1_values, v2_values, v_infinities, [10, 20],
+                              dpi = 100, out_dir = out_dir)
+        elapsed = time.perf_counter() - start
+        print("Rendered ", v_infinities.size, " cells in ", elapsed, " s")
+        assert(os.path.getsize(path) > 0)
+        assert(elapsed < 10)
+
+        rows = np.array([[dv1, 20000 + dv1, oberth.calc_vi(dv1, 20000 + dv1, JUPITER_R, JUPITER_V)]
+                         for dv1 in np.arange(0.0, -10000, -500)])
+        path = oberth.plot_single_dv(rows, oberth.calc_vi(0, 20000, JUPITER_R, JUPITER_V),
+                                     20000, fmt = "pdf", out_dir = out_dir)
+        assert(path.endswith(".pdf") and os.path.getsize(path) > 0)
+
+    import matplotlib
+    assert(matplotlib.get_backend().lower() == "agg")
+
+    return
@@ -0,0 +1,154 @@
+# instrument.py
+#
+# instrumentation for the flight calculations - phase timers, function
+# call counters and the "flybys" loggers that replace prints. Messages
+# go to stdout by default so interactive use looks the same as before;
+# quiet() or set_verbose(False) silences them, and a silenced message
+# costs one level check
+#
+# Table of contents
+# get_logger - logger for a module under the "flybys" logger
+# set_verbose - turns the informational messages on or off
+# quiet - context manager that silences the messages
+# Instrument - phase timers and counters for one calculation
+#
+# Example
+# >>> import instrument, flight_time
+# >>> metrics = {}
+# >>> with instrument.quiet():
+# ...     flight_time.flight_time(132000, 0.1, 100000, 10, 1000, 1000,
+# ...                             flight_time.M_S, 550, metrics = metrics)
+# >>> metrics["coast_time_s"], metrics["calc_v_2"]
+
+import contextlib                 # context managers
+import logging                    # messages
+import sys
+import threading                  # call counters shared between threads
+import time                       # perf_counter timers
+
+
+LOGGER_NAME = "flybys"            # parent of every module logger
+
+# counting wrappers installed by Instrument.count_calls, shared by every
+# thread: (module, function name) -> [original function, users]
+_wrapped = {}
+_wrap_lock = threading.Lock()
+# Instruments counting calls in the current thread, with the function name
+_counting = threading.local()
+
+
+class StdoutHandler(logging.StreamHandler):
+    '''stream handler that writes to whatever sys.stdout is when a message
+    is emitted, so redirected or captured stdout also gets the messages'''
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        # always follow sys.stdout
+        pass
+
+
+# plain messages on stdout, as the prints they replace
+_logger = logging.getLogger(LOGGER_NAME)
+if not _logger.handlers:
+    _handler = StdoutHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(_handler)
+    _logger.setLevel(logging.INFO)
+    _logger.propagate = False
+
+
+def get_logger(name):
+    '''returns the logger of a module, under the "flybys" logger'''
+    return logging.getLogger(LOGGER_NAME + "." + name)
+
+
+def set_verbose(verbose = True):
+    '''turns the informational messages of every module on or off.
+    Warnings are always shown.'''
+    _logger.setLevel(logging.INFO if verbose else logging.WARNING)
+
+
+@contextlib.contextmanager
+def quiet():
+    '''silences the informational messages inside a with block'''
+    level = _logger.level
+    _logger.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        _logger.setLevel(level)
+
+
+class Instrument():
+    '''phase timers and call counters for one calculation. Phases are
+    timed with perf_counter and may be entered more than once; their
+    times add up. Counts are kept by name.'''
+    def __init__(self):
+        self.timers = {}              # seconds spent in each phase
+        self.counts = {}              # counters by name
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        '''times the body of a with block as part of phase name'''
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0.0) + time.perf_counter() - start
+
+    def add(self, name, n = 1):
+        '''adds n to the counter name'''
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    @contextlib.contextmanager
+    def count_calls(self, func_name, modules):
+        '''counts the calls of a module level function inside a with
+        block. The function is replaced by a counting wrapper in every
+        module of modules (the modules that call it by name) until the
+        last block using it exits. Only calls made by the thread that
+        entered the block are counted, so calculations may run in several
+        threads at once. A call returning an array counts one evaluation
+        per element.'''
+        self.counts.setdefault(func_name, 0)
+        with _wrap_lock:
+            for m in modules:
+                entry = _wrapped.get((m, func_name))
+                if entry is None:
+                    entry = _wrapped[(m, func_name)] = [getattr(m, func_name), 0]
+                    setattr(m, func_name, _counter(func_name, entry[0]))
+                entry[1] += 1
+        active = _counting.__dict__.setdefault("active", [])
+        active.append((func_name, self))
+        try:
+            yield
+        finally:
+            active.remove((func_name, self))
+            with _wrap_lock:
+                for m in modules:
+                    entry = _wrapped[(m, func_name)]
+                    entry[1] -= 1
+                    if entry[1] == 0:
+                        setattr(m, func_name, entry[0])
+                        del _wrapped[(m, func_name)]
+
+    def metrics(self):
+        '''flat dictionary of the phase times (<phase>_time_s) and counts'''
+        metrics = {name + "_time_s": t for name, t in self.timers.items()}
+        metrics.update(self.counts)
+        return metrics
+
+
+def _counter(func_name, func):
+    '''wrapper of func that adds its calls to the Instruments counting
+    func_name in the calling thread'''
+    def counted(*args, **kwargs):
+        result = func(*args, **kwargs)
+        for name, inst in getattr(_counting, "active", ()):
+            if name == func_name:
+                inst.counts[func_name] += getattr(result, "size", 1)
+        return result
+
+    return counted
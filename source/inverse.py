@@ -0,0 +1,142 @@
+# inverse.py
+#
+# inverse flight time calculations - finds the delta-v, burn time or
+# starting velocity that reaches r_final in a target time. Every target
+# in an array is solved at once with the batch engine
+#
+# Table of contents
+# solve_flight - solves for one flight_time() argument given target
+#                arrival times
+#
+# Example - delta-v needed to reach 550 AU in 15, 17.5 and 20 years
+# >>> import inverse
+# >>> res = inverse.solve_flight([15, 17.5, 20], 550, "dv", (50000, 200000),
+# ...                            v0 = 132000, r0 = 0.1, burn_time = 10)
+# >>> res["value"]
+
+import numpy as np                # arrays of targets
+
+from astro_constants import *     # astronomical constants
+from batch import *               # vectorized flight time engine
+
+
+# flight_time_batch arguments that can be solved for
+SOLVE_FOR = ("dv", "burn_time", "v0")
+
+# structured array returned by solve_flight
+SOLUTION_DTYPE = np.dtype([
+    ("target", "f8"),             # target arrival time (years)
+    ("value", "f8"),              # solved argument; nan if not bracketed
+    ("flight_time", "f8"),        # arrival time at value (years)
+    ("iterations", "i8"),         # iterations used
+    ("converged", "?"),           # True if the tolerance was met
+])
+
+
+def solve_flight(target_years, r_final, solve_for, bracket, v0 = None, r0 = None,
+                 dv = None, burn_time = None, burn_steps = 1000, coast_steps = 1000,
+                 parent_m = M_S, rtol = 1e-6, max_iter = 60):
+    '''solves for one flight_time() argument so that the craft reaches
+    r_final at the target time. Uses the Illinois variant of false position
+    on every target at once; each iteration is one flight_time_batch call
+    over the targets that have not converged.
+
+    inputs: target_years - target arrival time(s) at r_final (years)
+            r_final - final distance from periapsis (AU); may be an array
+            solve_for - "dv", "burn_time" or "v0"
+            bracket - (low, high) values of the solved argument; the
+                      arrival time must cross the target inside it and
+                      the craft must escape at both ends. Either end may
+                      be an array with one value per target
+            v0, r0, dv, burn_time - the other flight_time() arguments in
+                      the same units; the solved one is left as None
+            burn_steps, coast_steps, parent_m - see flight_time()
+            rtol - tolerance relative to the target time and to the
+                   width of the bracket
+            max_iter - maximum number of iterations
+    outputs: solution - structured array of SOLUTION_DTYPE, one row per
+                        target; targets not bracketed, or with an end
+                        that does not escape, have value nan'''
+
+    if solve_for not in SOLVE_FOR:
+        raise ValueError("solve_flight: can only solve for %s" %", ".join(SOLVE_FOR))
+    args = {"v0": v0, "r0": r0, "dv": dv, "burn_time": burn_time}
+    missing = [k for k, v in args.items() if v is None and k != solve_for]
+    if missing:
+        raise ValueError("solve_flight: missing %s" %", ".join(missing))
+
+    target, r_final, lo, hi = np.broadcast_arrays(
+        np.asarray(target_years, dtype = float) * SEC_PER_YEAR, r_final,
+        np.asarray(bracket[0], dtype = float), np.asarray(bracket[1], dtype = float))
+    target, r_final = target.ravel(), r_final.ravel()
+    lo, hi = lo.ravel().copy(), hi.ravel().copy()
+    width = np.abs(hi - lo)                     # starting bracket widths
+    # other arguments broadcast against the targets
+    fixed = {k: np.broadcast_to(v, target.shape) for k, v in args.items()
+             if k != solve_for}
+
+    def arrival(values, index):
+        '''flight time (s) at r_final for the targets in index'''
+        call = {k: v[index] for k, v in fixed.items()}
+        call[solve_for] = values
+        # crafts that do not escape give nan, handled by the caller
+        with np.errstate(invalid = "ignore"):
+            res = flight_time_batch(call["v0"], call["r0"], call["dv"], call["burn_time"],
+                                    burn_steps, coast_steps, parent_m, r_final[index])
+        return res["final_elapse_t"]
+
+    everything = np.arange(target.size)
+    f_lo = arrival(lo, everything) - target
+    f_hi = arrival(hi, everything) - target
+
+    solution = np.zeros(target.size, dtype = SOLUTION_DTYPE)
+    solution["target"] = target / SEC_PER_YEAR
+    solution["value"] = np.nan
+    solution["flight_time"] = np.nan
+
+    # targets whose bracket does not change sign, or whose craft does not
+    # escape (nan) at an end, cannot be solved
+    active = (np.sign(f_lo) != np.sign(f_hi)) & np.isfinite(f_lo) & np.isfinite(f_hi)
+    # ends that already hit the target
+    for end, f_end in ((lo, f_lo), (hi, f_hi)):
+        hit = f_end == 0
+        solution["value"][hit] = end[hit]
+        solution["flight_time"][hit] = solution["target"][hit]
+        solution["converged"][hit] = True
+        active &= ~hit
+    side = np.zeros(target.size, dtype = int)   # end kept last iteration
+
+    for iteration in range(1, max_iter + 1):
+        index = np.flatnonzero(active)
+        if index.size == 0:
+            break
+        # false position estimate
+        x = hi[index] - f_hi[index] * (hi[index] - lo[index]) / (f_hi[index] - f_lo[index])
+        f_x = arrival(x, index) - target[index]
+        solution["iterations"][index] = iteration
+        solution["value"][index] = x
+        solution["flight_time"][index] = (f_x + target[index]) / SEC_PER_YEAR
+
+        # replace the end with the same sign; halve the kept end's value
+        # when the same end is kept twice (Illinois)
+        same_lo = np.sign(f_x) == np.sign(f_lo[index])
+        keep_hi = index[same_lo]
+        keep_lo = index[~same_lo]
+        lo[keep_hi], f_lo[keep_hi] = x[same_lo], f_x[same_lo]
+        hi[keep_lo], f_hi[keep_lo] = x[~same_lo], f_x[~same_lo]
+        f_hi[keep_hi[side[keep_hi] == 1]] /= 2
+        f_lo[keep_lo[side[keep_lo] == -1]] /= 2
+        side[keep_hi] = 1
+        side[keep_lo] = -1
+
+        # converged when the arrival time or the bracket is tight enough
+        done = (np.abs(f_x) <= rtol * target[index]) | \
+               (np.abs(hi[index] - lo[index]) <= rtol * width[index])
+        solution["converged"][index[done]] = True
+        active[index[done]] = False
+        # a craft that does not escape inside the bracket ends the search
+        failed = ~np.isfinite(f_x)
+        solution["value"][index[failed]] = np.nan
+        active[index[failed]] = False
+
+    return solution
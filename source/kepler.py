@@ -0,0 +1,105 @@
+# kepler.py
+#
+# closed form coast on a hyperbolic orbit. After the burn the spacecraft
+# coasts on a fixed conic, so the time between two distances follows from
+# the hyperbolic Kepler equation in a few operations whatever the
+# distance, and the distance after a given time follows from a few Newton
+# iterations. Every function accepts numpy arrays
+#
+# Table of contents
+# hyperbolic_elements - semi-major axis and eccentricity from a state
+# time_of_flight - time to coast outbound between two distances
+# radius_after - distance after coasting outbound for a given time
+#
+# The orbit is defined by its specific orbital energy (from the velocity
+# and distance) and its specific angular momentum h. The Spacecraft and
+# SpacecraftBatch "kepler" coasts take the velocity as pointing along the
+# straight line of the model, so h = r0 * v at the start of the coast.
+# Bound orbits have no hyperbolic solution and give nan. All units MKS.
+#
+# Example - coast time from the einstein_550 post burn state to 550 AU
+# >>> import kepler
+# >>> kepler.time_of_flight(v, r, r0 * v, r, 550 * AU) / SEC_PER_YEAR
+
+import numpy as np                # arrays of profiles
+
+from astro_constants import *     # astronomical constants
+
+
+NEWTON_TOL = 1e-14                # relative tolerance of radius_after
+NEWTON_ITER = 50                  # maximum Newton iterations
+
+
+def hyperbolic_elements(v, r, h, m = M_S):
+    '''semi-major axis and eccentricity of the hyperbola through a state.
+    The semi-major axis is returned positive; r = a (e cosh F - 1).
+    inputs: v - velocity (m/s)
+            r - distance from the parent body (m)
+            h - specific angular momentum (m^2/s)
+            m - mass of the parent body (kg)
+    outputs: a - semi-major axis (m); nan for bound orbits
+             e - eccentricity; nan for bound orbits'''
+
+    mu = G * m
+    soe = 0.5 * np.asarray(v, dtype = float) ** 2 - mu / r   # specific orbital energy
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        a = np.where(soe > 0, mu / (2 * soe), np.nan)
+        e = np.sqrt(1 + 2 * soe * np.asarray(h, dtype = float) ** 2 / mu ** 2)
+    e = np.where(soe > 0, e, np.nan)
+
+    return a, e
+
+
+def _anomaly(r, a, e):
+    '''outbound hyperbolic anomaly F >= 0 at distance r'''
+    # distances inside periapsis (rounding) are put at periapsis
+    return np.arccosh(np.maximum((r / a + 1) / e, 1.0))
+
+
+def time_of_flight(v, r, h, r1, r2, m = M_S):
+    '''time to coast outbound from distance r1 to distance r2 on the
+    hyperbola through the state (v, r) with angular momentum h
+    inputs: v, r, h - velocity (m/s), distance (m) and specific angular
+                      momentum (m^2/s) at any point of the orbit
+            r1, r2 - starting and final distances (m); r2 >= r1
+            m - mass of the parent body (kg)
+    outputs: t - coast time (s); nan for bound orbits'''
+
+    a, e = hyperbolic_elements(v, r, h, m)
+    n = np.sqrt(G * m / a ** 3)                   # hyperbolic mean motion
+    F1 = _anomaly(r1, a, e)
+    F2 = _anomaly(r2, a, e)
+    # hyperbolic Kepler equation M = e sinh F - F
+    t = ((e * np.sinh(F2) - F2) - (e * np.sinh(F1) - F1)) / n
+
+    return t if np.ndim(t) else float(t)
+
+
+def radius_after(v, r, h, r1, t, m = M_S):
+    '''distance after coasting outbound for time t from distance r1 on the
+    hyperbola through the state (v, r) with angular momentum h. Solves the
+    hyperbolic Kepler equation with Newton's method on every element.
+    inputs: v, r, h - velocity (m/s), distance (m) and specific angular
+                      momentum (m^2/s) at any point of the orbit
+            r1 - starting distance (m), outbound
+            t - coast time (s)
+            m - mass of the parent body (kg)
+    outputs: r2 - distance after the coast (m); nan for bound orbits'''
+
+    a, e = hyperbolic_elements(v, r, h, m)
+    n = np.sqrt(G * m / a ** 3)
+    F1 = _anomaly(r1, a, e)
+    M = e * np.sinh(F1) - F1 + n * np.asarray(t, dtype = float)
+
+    # starting guess good for small and large mean anomalies
+    F = np.arcsinh(M / e)
+    F = np.where(M / e > 1, np.log(2 * M / e + 1e-300), F)
+    F = np.maximum(F, F1)
+    for i in range(NEWTON_ITER):
+        step = (e * np.sinh(F) - F - M) / (e * np.cosh(F) - 1)
+        F = F - step
+        if not np.any(np.abs(step) > NEWTON_TOL * np.maximum(np.abs(F), 1)):
+            break
+    r2 = a * (e * np.cosh(F) - 1)
+
+    return r2 if np.ndim(r2) else float(r2)
@@ -0,0 +1,181 @@
+# montecarlo.py
+#
+# Monte Carlo dispersion analysis of flight_time(). Samples errors in the
+# starting velocity, periapsis, delta-v and burn time, runs the samples
+# through the batch engine one chunk at a time and keeps running
+# statistics of the results, so memory use does not depend on the number
+# of samples
+#
+# Table of contents
+# StreamingStats - running count, mean, variance, extremes and histogram
+#                  quantiles of a stream of values
+# monte_carlo - samples dispersions around a nominal profile and returns
+#               the statistics of the arrival time and final velocity
+#
+# Example - 1 000 000 samples with 1% errors in thrust and burn time
+# >>> import montecarlo
+# >>> stats = montecarlo.monte_carlo(132000, 0.1, 100000, 10, 550, 10 ** 6,
+# ...                                {"dv": 0.01, "burn_time": 0.01}, seed = 1)
+# >>> stats["arrival_years"].summary()
+
+import numpy as np                # samples and statistics
+
+from astro_constants import *     # astronomical constants
+from batch import *               # vectorized flight time engine
+
+
+MC_CHUNK = 100000                 # default samples per chunk
+HIST_BINS = 2 ** 16               # bins of the quantile histogram
+HIST_MARGIN = 10                  # histogram range beyond the first chunk,
+                                  # in multiples of that chunk's spread
+QUANTILES = (0.01, 0.05, 0.5, 0.95, 0.99)   # quantiles in summary()
+
+
+class StreamingStats():
+    '''running statistics of a stream of values added in chunks. The mean
+    and variance are merged chunk by chunk (Chan et al.), so they are
+    exact up to rounding. Quantiles come from a fixed histogram whose
+    range is set by the first chunk and widened by HIST_MARGIN times its
+    spread; values outside it are counted at the ends, and the extremes
+    are tracked exactly. nan values are counted separately.'''
+    def __init__(self, bins = HIST_BINS):
+        self.count = 0                # number of finite values
+        self.nan_count = 0            # number of nan values
+        self.mean = 0.0               # running mean
+        self.m2 = 0.0                 # running sum of squared deviations
+        self.min = np.inf             # smallest value
+        self.max = -np.inf            # largest value
+        self.bins = bins              # histogram bins
+        self.edges = None             # histogram bin edges
+        self.hist = None              # counts; first and last bins are
+                                      # below and above the edges
+
+    def update(self, values):
+        '''adds a chunk of values'''
+
+        values = np.ravel(values)
+        finite = ~np.isnan(values)
+        self.nan_count += int(values.size - finite.sum())
+        values = values[finite]
+        n = values.size
+        if n == 0:
+            return
+
+        # merge the chunk's mean and squared deviations into the totals
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        if self.edges is None:
+            # histogram range from the first chunk
+            spread = max(values.max() - values.min(), abs(mean) * 1e-9, 1e-300)
+            self.edges = np.linspace(values.min() - HIST_MARGIN * spread,
+                                     values.max() + HIST_MARGIN * spread, self.bins + 1)
+            self.hist = np.zeros(self.bins + 2, dtype = np.int64)
+        index = np.searchsorted(self.edges, values, side = "right")
+        self.hist += np.bincount(index, minlength = self.bins + 2)
+
+        return
+
+    def var(self, ddof = 1):
+        '''variance of the values'''
+        return self.m2 / (self.count - ddof) if self.count > ddof else np.nan
+
+    def std(self, ddof = 1):
+        '''standard deviation of the values'''
+        return np.sqrt(self.var(ddof))
+
+    def quantile(self, q):
+        '''quantile(s) q of the values, interpolated linearly inside a
+        histogram bin; exact at 0 and 1'''
+
+        q = np.asarray(q, dtype = float)
+        if self.count == 0:
+            return np.full(q.shape, np.nan)
+        cumulative = np.cumsum(self.hist)
+        target = q * self.count
+        # bin holding each quantile
+        i = np.clip(np.searchsorted(cumulative, target, side = "left"), 0, self.bins + 1)
+        below = np.where(i > 0, cumulative[i - 1], 0)
+        fraction = np.clip((target - below) / np.maximum(self.hist[i], 1), 0, 1)
+        # bins past the edges are bounded by the extremes
+        lo = np.concatenate([[self.min], self.edges])[i]
+        hi = np.concatenate([self.edges, [self.max]])[i]
+        value = np.clip(lo + fraction * (hi - lo), self.min, self.max)
+
+        return value if value.ndim else float(value)
+
+    def summary(self, quantiles = QUANTILES):
+        '''dictionary of the statistics'''
+        summary = {"count": self.count, "nan_count": self.nan_count,
+                   "mean": self.mean, "std": self.std(),
+                   "min": self.min, "max": self.max}
+        for q, value in zip(quantiles, np.atleast_1d(self.quantile(quantiles))):
+            summary["q%g" %(100 * q)] = float(value)
+
+        return summary
+
+
+def monte_carlo(v0, r0, dv, burn_time, r_final, samples, sigma, seed = None,
+                chunk = MC_CHUNK, burn_steps = 1000, coast_steps = 1000,
+                parent_m = M_S, coast_method = "simpson"):
+    '''runs a flight profile with random errors in its inputs. Errors are
+    normally distributed and relative to the nominal value: sigma
+    {"dv": 0.01} gives the delta-v a 1% standard deviation. Samples are
+    drawn and run through flight_time_batch one chunk at a time and only
+    running statistics are kept.
+    inputs: v0, r0, dv, burn_time, r_final - nominal profile, in the units
+                   of flight_time()
+            samples - number of samples
+            sigma - dictionary of relative standard deviations for any of
+                    v0, r0, dv and burn_time
+            seed - seed of the random generator; the same seed and chunk
+                   give the same samples
+            chunk - samples run at once; bounds memory use
+            burn_steps, coast_steps, parent_m - see flight_time(); the
+                   defaults are the step counts of the flight profiles
+            coast_method - "simpson" (default, as flight_time()) or
+                           "kepler"; see flight_time_batch. Other settings
+                           resolve the flight differently, so compare
+                           the statistics with flight_time() runs at the
+                           same settings
+    outputs: stats - dictionary of StreamingStats for "arrival_years"
+                     (flight time to r_final) and "final_v" (m/s);
+                     samples that do not escape, or that start with a
+                     negative velocity, count as nan'''
+
+    unknown = set(sigma) - {"v0", "r0", "dv", "burn_time"}
+    if unknown:
+        raise ValueError("monte_carlo: cannot disperse %s" %", ".join(sorted(unknown)))
+
+    rng = np.random.default_rng(seed)
+    nominal = {"v0": v0, "r0": r0, "dv": dv, "burn_time": burn_time}
+    stats = {"arrival_years": StreamingStats(), "final_v": StreamingStats()}
+
+    for start in range(0, samples, chunk):
+        n = min(chunk, samples - start)
+        # draw every dispersed input for the chunk, in a fixed order
+        values = {}
+        for name in ("v0", "r0", "dv", "burn_time"):
+            if sigma.get(name):
+                values[name] = nominal[name] * (1 + sigma[name] * rng.standard_normal(n))
+            else:
+                values[name] = np.full(n, float(nominal[name]))
+        # periapsis and burn time must stay positive
+        values["r0"] = np.maximum(values["r0"], 1e-6)
+        values["burn_time"] = np.maximum(values["burn_time"], 1e-9)
+
+        with np.errstate(invalid = "ignore"):
+            result = flight_time_batch(values["v0"], values["r0"], values["dv"],
+                                       values["burn_time"], burn_steps, coast_steps,
+                                       parent_m, r_final, coast_method)
+        stats["arrival_years"].update(result["final_elapse_t"] / SEC_PER_YEAR)
+        stats["final_v"].update(result["final_v"])
+
+    return stats
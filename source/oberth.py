@@ -16,15 +16,19 @@
 # one_burn - main function to calculate v_infinity from one burn
 # two_burns - main function to calculate v_infinity from two burns
 # calc_vi - calculates v_infinity for a two burn manuever
+# calc_orbital_height_array - array version of orbit.calc_orbital_height
+# calc_vi_array - array version of calc_vi; trapped combos are masked
+# calc_vi_grid - calc_vi_array over every (dv1, dv2) combination
+# calc_c3_array - C3 after two burns; smooth objective for best_split
+# best_split - best split of delta_v budgets between the two burns
+# load_pyplot - imports pyplot with a non-interactive backend
 # plot_vi - plots v_infinities for a two burn manuever
+# plot_single_dv - plots one and two burn v_infinity for one budget
 
 
 # import libraries
 import math
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.colors as colors
-import pandas as pd
 import datetime as dt
 import os
 
@@ -39,12 +43,28 @@ HOME = os.getcwd()
 MIN_R = 0.1 * AU                      # closest approach to sun allowed
                                       # Parker Solar Probe MIN_R ~0.05 AU
 DV_STEP = 50                          # delta_v increment between calculated combinations in m/s
-
-
-def compare(max_dv, r0 = JUPITER_R, v0 = JUPITER_V):
+PLOT_DPI = 200                        # resolution of saved charts
+PLOT_FORMAT = "png"                   # file format of saved charts
+GRAPH_DIR = os.path.join(HOME, "..", "graphs")  # folder charts are saved to
+SPLIT_TOL = 1.0                       # first burn tolerance of best_split (m/s)
+
+# structured array returned by best_split
+SPLIT_DTYPE = np.dtype([
+    ("budget", "f8"),                 # delta_v budget (m/s)
+    ("dv1", "f8"),                    # best first (retrograde) burn (m/s)
+    ("dv2", "f8"),                    # escape burn (m/s)
+    ("v_infinity", "f8"),             # v_infinity of the split; nan if trapped
+    ("one_burn_vi", "f8"),            # v_infinity of one burn; nan if trapped
+    ("gain", "f8"),                   # v_infinity gained over one burn (m/s)
+    ("evaluations", "i8"),            # C3 evaluations per budget
+])
+
+
+def compare(max_dv, r0 = JUPITER_R, v0 = JUPITER_V, dpi = PLOT_DPI, fmt = PLOT_FORMAT):
     '''calculates v_infinity from a single burn and from two burns.
        plots chart comparing v_infinities
-       inputs: max_dv - maximum delta_v available'''
+       inputs: max_dv - maximum delta_v available
+               dpi, fmt - resolution and file format of the chart'''
 
     # calculates vi from a single burn; perihelion drop first burn
     # is set to 0
@@ -63,30 +83,39 @@ def compare(max_dv, r0 = JUPITER_R, v0 = JUPITER_V):
     # print number of delta v combinations to calculate
     print("Number of delta_v combinations: ", len(v_infinities))
 
-    # compute v_infinity for each combination of burns; note that every combination
-    # has the same total delta_v
-    for dv_i in range(len(v_infinities)):
-        # fill in v1 values
-        v_infinities[dv_i][0] = v1_values[dv_i]
-        # fill in v2_values
-        v_infinities[dv_i][1] = v2_values[dv_i]
-        # call function to calculate v_infinity
-        v_infinities[dv_i][2] = calc_vi(v1_values[dv_i], v2_values[dv_i], r0, v0)
+    # compute v_infinity for every combination at once; note that every
+    # combination has the same total delta_v
+    v_infinities[:, 0] = v1_values
+    v_infinities[:, 1] = v2_values
+    # combos that do not escape are stored as -1 like calc_vi
+    v_infinities[:, 2] = calc_vi_array(v1_values, v2_values, r0, v0).filled(-1)
+
+    # best split found by the optimizer
+    split = best_split(max_dv, r0, v0)[0]
+    print("Best split: dv1 = %.1f m/s, dv2 = %.1f m/s, v_infinity = %.2f km/s"
+          %(split["dv1"], split["dv2"], split["v_infinity"]/1000))
 
     # call function to plot v_infinity from the two options
-    plot_single_dv(v_infinities, one_burn_vi, max_dv)
+    plot_single_dv(v_infinities, one_burn_vi, max_dv, dpi, fmt)
 
 
     return
 
 
 
-def two_burns(max_dv2, r0 = JUPITER_R, v0 = JUPITER_V):
+def two_burns(max_dv2, r0 = JUPITER_R, v0 = JUPITER_V, plot = True,
+              dpi = PLOT_DPI, fmt = PLOT_FORMAT):
     '''main function that calls other functions to calculate and plot the
     hyperbolic escape velocity
     inputs: maximum delta_v of second burn
             r0 - starting orbital distance
-            v0 - starting orbital velocity'''
+            v0 - starting orbital velocity
+            plot - plot the results when True
+            dpi, fmt - resolution and file format of the chart
+    outputs: v1_values - array of first burn delta_v (m/s)
+             v2_values - array of second burn delta_v (m/s)
+             v_infinities - masked array of v_infinity (m/s) for every
+                            (dv1, dv2); combos that do not escape are masked'''
 
     # display parameters
     print("Begin two burn calculation")
@@ -104,31 +133,20 @@ def two_burns(max_dv2, r0 = JUPITER_R, v0 = JUPITER_V):
     v1_values = np.arange(0.0, max_dv1, step = -1 * DV_STEP)
     # array of possible DV2 values
     v2_values = np.arange(0.0, max_dv2, step = DV_STEP)
-    # array of (dv1, dv2, v_infinity)
-    v_infinities = np.zeros(((len(v1_values) * len(v2_values)), 3))
     # print number of delta v combinations to calculate
-    print("Number of delta_v combinations: ", len(v_infinities))
+    print("Number of delta_v combinations: ", len(v1_values) * len(v2_values))
 
-    # calculate v_infinity for every combination of dv_1 and dv_2
-    for dv_i in range(len(v_infinities)):
-        # look up delta_v of first burn
-        dv1 = v1_values[int(math.floor(dv_i/len(v2_values)))]
-        # look up delta_v of second burn
-        dv2 = v2_values[dv_i % len(v2_values)]
-        # fill in v1 values
-        v_infinities[dv_i][0] = dv1
-        # fill in v2_values
-        v_infinities[dv_i][1] = dv2
-        # call function to calculate v_infinity
-        v_infinities[dv_i][2] = calc_vi(dv1, dv2, r0, v0)
+    # calculate v_infinity for every combination of dv_1 and dv_2 at once
+    v_infinities = calc_vi_grid(v1_values, v2_values, r0, v0)
 
     print("Delta_v calculations complete!")
 
-    # plot plotting function 
-    dv_budgets = [10, 20, 40, 80]   # delta_v budgets (km/s) lines to plot
-    plot_vi(v_infinities, dv_budgets)   # call function to plot vi combos
-    
-    return
+    if plot:
+        # plot plotting function
+        dv_budgets = [10, 20, 40, 80]   # delta_v budgets (km/s) lines to plot
+        plot_vi(v1_values, v2_values, v_infinities, dv_budgets, dpi, fmt)
+
+    return v1_values, v2_values, v_infinities
 
 def calc_vi(dv1, dv2, r0, v0):
     '''calculates v_infinity based on the delta v
@@ -154,118 +172,254 @@ def calc_vi(dv1, dv2, r0, v0):
     return v_infinity
 
 
-def plot_vi(data, dv_budgets):
-    '''plots v_infinity as a function of dv1 and dv2
-    inputs: data - data to plot. List of lists with each
-                   sublist made of triples (dv1, dv2, v_infinity)
-                   Each sublist has the same total delta v
-            dv_budgets - list of delta_v budget lines to plot (km/s)'''
+def calc_orbital_height_array(dv1, r0, v0, M = M_S):
+    '''array version of orbit.calc_orbital_height. Calculates the opposite
+    apsis height and velocity for every burn in dv1. Burns that escape
+    return zero for both, as in calc_orbital_height, without printing.
+    inputs: dv1 - array of burns; positive is prograde
+            r0 - starting distance from the parent body
+            v0 - starting velocity
+            M - parent body mass; default to the sun
+    outputs: r_op, v_op - arrays of opposite apsis height and velocity'''
+
+    dv1 = np.asarray(dv1, dtype = float)
+    escaped = dv1 + v0 > math.sqrt(2 * M * G / r0)
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        a = 1 / (2/r0 - ((v0 + dv1) ** 2)/G/M)   # semi-major axis
+        r_op = 2*a - r0                            # opposite apsis distance
+        v_op = r0 * (v0 + dv1)/r_op                # velocity at opposite apsis
+
+    return np.where(escaped, 0.0, r_op), np.where(escaped, 0.0, v_op)
+
+
+def calc_vi_array(dv1, dv2, r0, v0):
+    '''array version of calc_vi. dv1 and dv2 are broadcast against each
+    other. Combinations that do not reach escape velocity are masked
+    instead of being set to -1.
+    inputs: dv1 - change in velocity of retrograde burn
+            dv2 - change in velocity of escape burn
+            r0 - starting distance from sun
+            v0 - starting velocity
+    outputs: v_infinity - masked array of hyperbolic excess velocity'''
+
+    # calculate perihelion and velocity at perihelion
+    rp, vp = calc_orbital_height_array(dv1, r0, v0)
+
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        # specific kinetic energy left over after escaping (times two)
+        c3 = (vp + dv2)**2 - 2*M_S*G/rp
+    # first burn escaped (rp = 0) or second burn did not reach escape
+    trapped = (rp <= 0) | ~(c3 >= 0)
+
+    return np.ma.masked_array(np.sqrt(np.where(trapped, 0.0, c3)), mask = trapped)
+
+
+def calc_vi_grid(v1_values, v2_values, r0, v0):
+    '''calculates v_infinity for every combination of the first and second
+    burn in one pass
+    inputs: v1_values - array of retrograde burns
+            v2_values - array of escape burns
+            r0 - starting distance from sun
+            v0 - starting velocity
+    outputs: v_infinity - masked array with shape (len(v1_values),
+                          len(v2_values)); trapped combos are masked'''
+
+    dv1, dv2 = np.meshgrid(v1_values, v2_values, indexing = "ij")
+
+    return calc_vi_array(dv1, dv2, r0, v0)
+
+
+def calc_c3_array(dv1, dv2, r0, v0):
+    '''twice the specific orbital energy after the two burns (C3, m^2/s^2).
+    Unlike v_infinity it is smooth and defined for trapped combos (C3 < 0)
+    so it can be maximized directly.
+    inputs: dv1, dv2, r0, v0 - see calc_vi_array
+    outputs: c3 - array of C3; -inf where the first burn escapes'''
+
+    rp, vp = calc_orbital_height_array(dv1, r0, v0)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        c3 = (vp + dv2)**2 - 2*M_S*G/rp
+
+    return np.where(rp > 0, c3, -np.inf)
+
+
+def best_split(budgets, r0 = JUPITER_R, v0 = JUPITER_V, tol = SPLIT_TOL,
+               max_iter = 100):
+    '''finds the split of each delta_v budget between a retrograde first
+    burn and an escape burn that maximizes v_infinity. The first burn is
+    limited so the perihelion is no closer than MIN_R. Golden-section
+    search runs on every budget at once, maximizing C3; the ends of the
+    interval (a single burn, or the deepest allowed perihelion) are also
+    checked.
+    inputs: budgets - delta_v budget(s) (m/s)
+            r0 - starting distance from the sun (m)
+            v0 - starting velocity (m/s)
+            tol - width (m/s) of the final interval of the first burn
+            max_iter - maximum golden-section iterations
+    outputs: split - structured array of SPLIT_DTYPE, one row per budget;
+                     v_infinity and one_burn_vi are nan if trapped'''
+
+    budgets = np.atleast_1d(np.asarray(budgets, dtype = float))
+    # deepest first burn allowed by MIN_R (negative) and by the budget
+    max_dv1 = calc_dv(MIN_R, r0, v0)
+    lo = np.maximum(max_dv1, -budgets)
+    hi = np.zeros(budgets.shape)
+
+    def c3(dv1):
+        '''C3 of the split with first burn dv1'''
+        return calc_c3_array(dv1, budgets - np.abs(dv1), r0, v0)
+
+    # golden-section search for the maximum
+    ratio = (math.sqrt(5) - 1) / 2
+    a, b = lo.copy(), hi.copy()
+    x1, x2 = b - ratio * (b - a), a + ratio * (b - a)
+    f1, f2 = c3(x1), c3(x2)
+    evaluations = 2
+    for iteration in range(max_iter):
+        if np.all(b - a <= tol):
+            break
+        # keep the side with the larger value
+        left = f1 > f2
+        b = np.where(left, x2, b)
+        a = np.where(left, a, x1)
+        # one point carries over; only the other is evaluated
+        x_new = np.where(left, b - ratio * (b - a), a + ratio * (b - a))
+        f_new = c3(x_new)
+        evaluations += 1
+        x1, x2, f1, f2 = (np.where(left, x_new, x2), np.where(left, x1, x_new),
+                          np.where(left, f_new, f2), np.where(left, f1, f_new))
+
+    # best of the interior point and the two ends
+    candidates = np.stack([np.where(f1 > f2, x1, x2), lo, hi])
+    values = np.stack([np.maximum(f1, f2), c3(lo), c3(hi)])
+    evaluations += 2
+    best = np.argmax(values, axis = 0)
+    dv1 = np.take_along_axis(candidates, best[None], 0)[0]
+    best_c3 = np.take_along_axis(values, best[None], 0)[0]
+    one_burn_c3 = values[2]
+
+    split = np.zeros(budgets.size, dtype = SPLIT_DTYPE)
+    split["budget"] = budgets
+    split["dv1"] = dv1
+    split["dv2"] = budgets - np.abs(dv1)
+    split["v_infinity"] = np.where(best_c3 >= 0, np.sqrt(np.maximum(best_c3, 0)), np.nan)
+    split["one_burn_vi"] = np.where(one_burn_c3 >= 0, np.sqrt(np.maximum(one_burn_c3, 0)), np.nan)
+    # gain over one burn; trapped counts as zero v_infinity
+    split["gain"] = np.nan_to_num(split["v_infinity"]) - np.nan_to_num(split["one_burn_vi"])
+    split["evaluations"] = evaluations
+
+    return split
+
+
+def load_pyplot():
+    '''imports pyplot with the non-interactive Agg backend so charts can be
+    rendered without a display (servers, cron, worker processes)
+    outputs: plt - matplotlib.pyplot'''
+    # matplotlib is only imported when something is plotted
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def plot_vi(v1_values, v2_values, v_infinities, dv_budgets, dpi = PLOT_DPI,
+            fmt = PLOT_FORMAT, out_dir = GRAPH_DIR):
+    '''plots v_infinity as a function of dv1 and dv2. The grid is drawn as
+    a raster with one cell per combination; combos that do not escape the
+    sun are drawn in gray
+    inputs: v1_values - array of first burn delta_v (m/s)
+            v2_values - array of second burn delta_v (m/s)
+            v_infinities - masked array of v_infinity (m/s) from
+                           calc_vi_grid; trapped combos are masked
+            dv_budgets - list of delta_v budget lines to plot (km/s)
+            dpi - resolution of the saved chart
+            fmt - file format of the saved chart ("png", "pdf", "svg", ...)
+            out_dir - folder the chart is saved to
+    outputs: path - path of the saved chart'''
+    plt = load_pyplot()
+
     print("\nBeginning to plot...")
 
-    data = data/1000 # convert m/s to km/s
-
-    # array for burn combinations resulting in escape
-    dv_1 = []
-    dv_2 = []
-    v_in = []
-
-    # array for burn combinations that do not escape the sun
-    dv_1_trapped = []
-    dv_2_trapped = []
-    v_in_trapped = []
-
-    for i in range(len(data)):
-        # fill in each variable from the data array
-        if data[i][2] > 0:
-            # fill in array for combos that escape the sun
-            dv_1.append(data[i][0])
-            dv_2.append(data[i][1])
-            v_in.append(data[i][2])
-        else:
-            # fill in array for combos that do not escape the sun
-            dv_1_trapped.append(data[i][0])
-            dv_2_trapped.append(data[i][1])
-            v_in_trapped.append(data[i][2])
-
-    # get absolute value of the burns
-    dv_1 = [abs(dv) for dv in dv_1]
-    dv_1_trapped = [abs(dv) for dv in dv_1_trapped]
-    
-    # set up the graph
-    plt.xlim(0, max(dv_1))                          # set limit of x axis
-    plt.ylim(0, max(dv_2))                          # set limit of y axis
-    cm = plt.cm.get_cmap('Blues')                   # color scale for v_infinity
-    plt.xlabel("Delta_v first burn (km/s)")         # xlabel
-    plt.ylabel("Delta_v second burn(km/s)")         # ylabel
-    plt.title("V infinity from burn combos (km/s)") # plot title
-    plt.grid(True)                                  # draw gridlines
-
-    # plot the combos that escape with different colors
-    sc = plt.scatter(dv_1, dv_2, c=v_in, vmin=0, 
-        vmax=(math.ceil(max(v_in)/100)) * 100, cmap=cm)
-    # plot the combos that do not escape, all in gray
-    plt.scatter(dv_1_trapped, dv_2_trapped, c = "dimgray")
-    # plot the color bar
-    colorbar = plt.colorbar(sc)
+    # burn magnitudes (km/s) and v_infinity (km/s) with trapped combos masked
+    dv_1 = np.abs(v1_values)/1000
+    dv_2 = np.asarray(v2_values)/1000
+    v_in = np.ma.masked_invalid(v_infinities)/1000
+
+    fig, ax = plt.subplots()
+    ax.set_xlim(0, dv_1.max())                      # set limit of x axis
+    ax.set_ylim(0, dv_2.max())                      # set limit of y axis
+    ax.set_xlabel("Delta_v first burn (km/s)")      # xlabel
+    ax.set_ylabel("Delta_v second burn(km/s)")      # ylabel
+    ax.set_title("V infinity from burn combos (km/s)") # plot title
+
+    # color scale for v_infinity; trapped (masked) combos in gray
+    cm = plt.get_cmap('Blues').with_extremes(bad = "dimgray")
+    vmax = math.ceil(v_in.max()/100) * 100 if v_in.count() else 1
+    # one raster cell per combination; rows of the image are dv2
+    mesh = ax.pcolormesh(dv_1, dv_2, v_in.T, vmin = 0, vmax = vmax, cmap = cm,
+                         shading = "nearest", rasterized = True)
+    ax.grid(True)                                   # draw gridlines
+    colorbar = fig.colorbar(mesh)
     colorbar.set_label("v_infinity (km/s)")
 
     # draw lines for each delta_v budget
     for dv_b in dv_budgets:
         # plot a line representing a possible delta-v budget
-        plt.plot([0, dv_b], [dv_b, 0])
+        ax.plot([0, dv_b], [dv_b, 0])
         # label the line
-        plt.text(max(dv_1)/40, dv_b + max(dv_2)/40, 
+        ax.text(dv_1.max()/40, dv_b + dv_2.max()/40,
             "Delta_v = %d km/s" %(dv_b))
 
     # format plot save name
     currentDT = dt.datetime.now()
     timestamp = currentDT.strftime("%Y-%m-%d %H_%M_%S")
 
-    # go to graph directory and save
-    os.chdir(HOME + "/../graphs")
-    plt.savefig("v_infinity_" + timestamp + "_.png", format="png", dpi = 800)
-    os.chdir(HOME)
-
-    plt.close()
+    path = os.path.join(out_dir, "v_infinity_" + timestamp + "_." + fmt)
+    fig.savefig(path, format = fmt, dpi = dpi)
+    plt.close(fig)
 
-    return
+    return path
 
-def plot_single_dv(v_infinities, one_burn_vi, max_dv):
+def plot_single_dv(v_infinities, one_burn_vi, max_dv, dpi = PLOT_DPI,
+                   fmt = PLOT_FORMAT, out_dir = GRAPH_DIR):
     '''plots v_infinity for a single constant dv
-    inputs: data - array with all v_i data given all dv combinations'''
-
-    # create list of just dv1 (km/s)
-    dv_1 = [-1 * x[0]/1000 for x in list(v_infinities)]
-    # create list of just dv2 (km/s)          
-    dv_2 = [x[1]/1000 for x in list(v_infinities)]
-    # create list of just v_infinities (km/s)       
-    v_in = [max(x[2], 0)/1000 for x in list(v_infinities)]    
-
-    # set up the graph
-    plt.xlim(0, max(dv_1))                             # set limit of x axis
-    plt.ylim(0, math.ceil(max(max(v_in), one_burn_vi/1000) + 1))            # set limit of y axis            
-    plt.xlabel("Delta_v first burn (km/s)")            # x label
-    plt.ylabel("v-infinity (km/s)")                    # y label
-    plt.title("v-infinity for %d km/s delta-v budget"
+    inputs: v_infinities - array of [dv1, dv2, v_infinity] rows (m/s) for
+                           every split of the budget; trapped combos are -1
+            one_burn_vi - v_infinity of a single burn (m/s)
+            max_dv - delta_v budget (m/s)
+            dpi - resolution of the saved chart
+            fmt - file format of the saved chart
+            out_dir - folder the chart is saved to
+    outputs: path - path of the saved chart'''
+    plt = load_pyplot()
+
+    v_infinities = np.asarray(v_infinities)
+    # first burn magnitude (km/s)
+    dv_1 = -v_infinities[:, 0]/1000
+    # v_infinity (km/s); trapped combos are plotted as zero
+    v_in = np.maximum(v_infinities[:, 2], 0)/1000
+    one_burn = max(0, one_burn_vi/1000)
+
+    fig, ax = plt.subplots()
+    ax.set_xlim(0, dv_1.max())                         # set limit of x axis
+    ax.set_ylim(0, math.ceil(max(v_in.max(), one_burn) + 1))  # set limit of y axis
+    ax.set_xlabel("Delta_v first burn (km/s)")         # x label
+    ax.set_ylabel("v-infinity (km/s)")                 # y label
+    ax.set_title("v-infinity for %d km/s delta-v budget"
      %(max_dv/1000))                                   # plot title
-    plt.grid(True)
-
+    ax.grid(True)
 
-    # plot the v-infinity combinations
     # plot v_infinity for two burns
-    plt.plot(dv_1, v_in, label = "Two burns")                                 
+    ax.plot(dv_1, v_in, label = "Two burns")
     # plot v_infinity for one burn - if the burn is insufficent for escape
     # plot a zero
-    plt.plot([0, max(dv_1)], [max(0, one_burn_vi/1000), max(0, one_burn_vi/1000)], label = "Single burn")  
-    # save figure
-    plt.legend()
+    ax.plot([0, dv_1.max()], [one_burn, one_burn], label = "Single burn")
+    ax.legend()
 
-    # go to graph directory and save
-    os.chdir(HOME + "/../graphs")
-    plt.savefig("compare_%d_kms.png" %(max_dv/1000), format="png", dpi = 800)
-    os.chdir(HOME)
+    path = os.path.join(out_dir, "compare_%d_kms.%s" %(max_dv/1000, fmt))
+    fig.savefig(path, format = fmt, dpi = dpi)
+    plt.close(fig)
 
-    plt.close()
-
-
-    return
+    return path
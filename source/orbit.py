@@ -6,6 +6,7 @@
 # calc_exhaust_velocity - calculates the exhausts velocity from a particle's
 #                         energy and mass
 # calc_flight_time - calculates the flight time of Einstein
+# calc_radial_time - closed form time of flight along a radial path
 #
 # Revision history
 # 04/??/19    Tim Liu    copied equations from oberth.py
@@ -17,8 +18,11 @@
 # 08/10/19    Tim Liu    updated calc_v_2 to handle any parent body mass and tested
 
 from astro_constants import *
+from instrument import get_logger # module logger
 import math
 
+log = get_logger("orbit")         # messages of this module
+
 
 def calc_orbital_height(dv1, r0, v0, M  = M_S):
     '''Calcuates the opposite apsis height and velocity following
@@ -41,7 +45,8 @@ def calc_orbital_height(dv1, r0, v0, M  = M_S):
     if dv1 + v0 > math.sqrt(2 * M * G / r0):  # body exceeds escape velocity
         v_op = 0
         r_op = 0
-        print("calc_orbital_height: object escaped")
+        # debug level; this is called in tight loops
+        log.debug("calc_orbital_height: object escaped")
 
 
     return r_op, v_op                         # return perihelion and velocity
@@ -63,11 +68,11 @@ def calc_dv(rf, r0, v0, m = M_S):
     # calculate dv; rearrangement of vis-viva equation
     dv = math.sqrt(-1* (1/a - 2/r0) * G * m) - v0
 
-    print("a:", a)
-    print("rf:", rf)
-    print("r0:", r0)
-    print("v0:", v0)
-    print("dv:", dv)
+    log.debug("a: %s", a)
+    log.debug("rf: %s", rf)
+    log.debug("r0: %s", r0)
+    log.debug("v0: %s", v0)
+    log.debug("dv: %s", dv)
 
     return dv
 
@@ -125,6 +130,34 @@ def calc_v_2(v0, r0, rf, m = M_S):
     vf = (2 * (C3 + m * G /rf)) ** 0.5
     return vf
 
+def calc_radial_time(x, soe, m = M_S):
+    '''antiderivative of 1/v for an object moving radially away from the
+    parent body, i.e. the time taken to coast from the center of the
+    parent body out to distance x. Time between two distances is the
+    difference of two calls. Inputs must be in MKS units.
+    inputs: x - distance from the parent body (m)
+            soe - specific orbital energy (J/kg); may be negative as long
+                  as x is inside the apoapsis
+            m - mass of parent body
+    outputs: t - time of flight (s)'''
+
+    k = 2 * soe                   # twice the specific orbital energy
+    mu2 = 2 * G * m               # twice the gravitational parameter
+
+    if k > 0:
+        # hyperbolic trajectory
+        t = math.sqrt(x * (k * x + mu2)) / k - \
+            mu2 / k ** 1.5 * math.log(math.sqrt(k * x) + math.sqrt(k * x + mu2))
+    elif k < 0:
+        # elliptical trajectory
+        t = -math.sqrt(x * (mu2 + k * x)) / -k + \
+            mu2 / (-k) ** 1.5 * math.asin(math.sqrt(-k * x / mu2))
+    else:
+        # parabolic trajectory
+        t = 2 / 3 * x ** 1.5 / math.sqrt(mu2)
+
+    return t
+
 def calc_exhaust_velocity(mass, energy_ev):
     '''calculates the exhaust velocity of a particle
     inputs: mass - mass of the particle
@@ -0,0 +1,164 @@
+# profile_io.py
+#
+# loads tables of many flight profiles without pandas. Every row of a
+# table is one flight profile with the fields of
+# flight_profile_template.xlsx. Tables are read in chunks, validated and
+# handed to the batch engine as numpy columns
+#
+# Table of contents
+# iter_rows - streams the rows of a csv, json lines or xlsx table as
+#             dictionaries
+# validate_row - checks a row against PROFILE_SCHEMA and converts it to
+#                flight_time() arguments
+# read_profiles - reads a table in chunks of validated numpy columns
+# run_profile_table - runs every profile in a table through
+#                     flight_time_batch one chunk at a time
+#
+# Tables have a header row naming the columns, either by field name
+# (v0, r0, dv, parent, r_final, burn_time, burn_steps, coast_steps) or by
+# the template labels ("Initial velocity", "Periapsis", ...). An optional
+# "name" column labels each profile. A workbook in the one profile layout
+# of flight_profile_template.xlsx (Input, Value, Units) is read as a
+# single row.
+
+import csv                        # csv tables
+import json                       # json lines tables
+import os
+import numpy as np                # columns handed to the batch engine
+
+from astro_constants import *     # astronomical constants
+from bodies import BODIES         # registry of parent bodies
+
+
+# fields of flight_profile_template.xlsx in row order -
+# (field name, template label, units, type)
+PROFILE_SCHEMA = [("v0", "Initial velocity", "m/s", float),
+                  ("r0", "Periapsis", "AU", float),
+                  ("dv", "Delta-v", "m/s", float),
+                  ("parent", "Parent", "Name", str),
+                  ("r_final", "Flight distance", "AU", float),
+                  ("burn_time", "Burn time", "days", float),
+                  ("burn_steps", "Burn steps", "n", int),
+                  ("coast_steps", "Coast steps", "n", int)]
+
+# parent bodies that may be named in a profile
+PARENT_MASSES = {name: body.mass for name, body in BODIES.items()}
+
+CHUNK_ROWS = 10000                # default rows per chunk
+
+
+def iter_rows(path):
+    '''streams the rows of a table of flight profiles. The format is
+    chosen from the extension: .csv, .jsonl (or .ndjson) or .xlsx
+    inputs: path - path of the table
+    outputs: generator of dictionaries keyed by column name'''
+
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext == ".csv":
+        with open(path, newline = "") as f:
+            for row in csv.DictReader(f):
+                yield row
+    elif ext in (".jsonl", ".ndjson"):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif ext == ".xlsx":
+        # only load the spreadsheet library when a workbook is opened
+        import openpyxl
+        book = openpyxl.load_workbook(path, read_only = True, data_only = True)
+        try:
+            rows = book.active.iter_rows(values_only = True)
+            header = [str(x).strip() if x is not None else "" for x in next(rows)]
+            if header[:2] == ["Input", "Value"]:
+                # one profile per workbook; values are in the second column
+                values = [row[1] for row in rows]
+                yield dict(zip([field[0] for field in PROFILE_SCHEMA], values))
+            else:
+                for row in rows:
+                    if any(x is not None for x in row):
+                        yield dict(zip(header, row))
+        finally:
+            book.close()
+    else:
+        raise ValueError("iter_rows: unsupported table format %s" %ext)
+
+
+def validate_row(row, line = None):
+    '''checks a row against PROFILE_SCHEMA and converts it to the units
+    and types flight_time() expects
+    inputs: row - dictionary keyed by field name or template label
+            line - row number used in error messages
+    outputs: profile - dictionary keyed by field name with parent_m in
+                       place of parent'''
+
+    where = "" if line is None else " (row %d)" %line
+    profile = {"name": row.get("name", "")}
+    for field, label, units, kind in PROFILE_SCHEMA:
+        value = row.get(field, row.get(label))
+        if value is None or value == "":
+            raise ValueError("missing %s (%s)%s" %(field, label, where))
+        try:
+            if kind is int:
+                # accept 1000.0 but not 1000.5
+                number = float(value)
+                if number != int(number):
+                    raise ValueError
+                value = int(number)
+            else:
+                value = kind(value)
+        except (TypeError, ValueError):
+            raise ValueError("%s must be %s, got %r%s"
+                             %(field, kind.__name__, value, where)) from None
+        profile[field] = value
+
+    # parent body
+    if profile["parent"] not in PARENT_MASSES:
+        raise ValueError("unknown parent %r%s" %(profile["parent"], where))
+    profile["parent_m"] = PARENT_MASSES[profile.pop("parent")]
+
+    # values that would stall or break the simulation
+    for field in ("r0", "burn_time", "burn_steps", "coast_steps", "r_final"):
+        if profile[field] <= 0:
+            raise ValueError("%s must be positive%s" %(field, where))
+
+    return profile
+
+
+def read_profiles(path, chunk_rows = CHUNK_ROWS):
+    '''reads a table of flight profiles in chunks. Each chunk is a
+    dictionary of numpy columns named after the flight_time() arguments
+    plus "name", ready to be passed to flight_time_batch.
+    inputs: path - path of the table
+            chunk_rows - number of rows per chunk
+    outputs: generator of dictionaries of columns'''
+
+    columns = ["name", "v0", "r0", "dv", "parent_m", "r_final",
+               "burn_time", "burn_steps", "coast_steps"]
+    chunk = []
+    for line, row in enumerate(iter_rows(path), start = 1):
+        chunk.append(validate_row(row, line))
+        if len(chunk) == chunk_rows:
+            yield {c: np.array([p[c] for p in chunk]) for c in columns}
+            chunk = []
+    if chunk:
+        yield {c: np.array([p[c] for p in chunk]) for c in columns}
+
+
+def run_profile_table(path, chunk_rows = CHUNK_ROWS):
+    '''runs every flight profile in a table through flight_time_batch one
+    chunk at a time
+    inputs: path - path of the table
+            chunk_rows - number of profiles simulated at once
+    outputs: generator of (names, results) where results is a structured
+             array of batch.RESULT_DTYPE'''
+
+    from batch import flight_time_batch
+
+    for chunk in read_profiles(path, chunk_rows):
+        results = flight_time_batch(chunk["v0"], chunk["r0"], chunk["dv"],
+                                    chunk["burn_time"], chunk["burn_steps"],
+                                    chunk["coast_steps"], chunk["parent_m"],
+                                    chunk["r_final"])
+        yield chunk["name"], results
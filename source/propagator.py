@@ -0,0 +1,248 @@
+# propagator.py
+#
+# planar two body propagator. Integrates the equations of motion of the
+# spacecraft in the orbital plane, with thrust along the velocity during
+# the periapsis burn, using the Dormand-Prince 5(4) embedded Runge-Kutta
+# method with adaptive steps. Every accepted step keeps the coefficients
+# of its 4th order continuous extension, so the state can be looked up
+# at any time after the run without integrating again
+#
+# Table of contents
+# PlanarTrajectory - dense output of a propagation; state at any time
+# propagate - propagates from periapsis through the burn to a radius
+# spacecraft_at - Spacecraft with the planar state at a time
+#
+# Unlike the Spacecraft class the path is not approximated as a straight
+# line; the spacecraft starts at periapsis (r0, 0) moving along +y and
+# the propagation ends when its distance from the parent body reaches
+# sqrt(r_final**2 + r0**2), the distance at which the straight line model
+# has travelled r_final. All units are MKS internally.
+#
+# Example
+# >>> import propagator
+# >>> traj = propagator.propagate(132000, 0.1, 100000, 10, 550)
+# >>> traj.t_event / propagator.SEC_PER_YEAR, traj.nfev
+# >>> traj.state_at([1e6, 1e7])              # x, y, vx, vy rows
+
+import math                       # math library
+import numpy as np                # states and dense output
+
+from astro_constants import *     # astronomical constants
+from spacecraft import *          # spacecraft class
+
+
+PLANAR_RTOL = 1e-9                # default relative tolerance
+MAX_STEPS = 10 ** 6               # steps before propagate gives up
+
+# Dormand-Prince 5(4) tableau
+DP_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+DP_A = [np.array([]),
+        np.array([1/5]),
+        np.array([3/40, 9/40]),
+        np.array([44/45, -56/15, 32/9]),
+        np.array([19372/6561, -25360/2187, 64448/6561, -212/729]),
+        np.array([9017/3168, -355/33, 46732/5247, 49/176, -5103/18656])]
+DP_B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])
+# difference between the 5th and 4th order solutions (7 stages, FSAL)
+DP_E = np.array([71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40])
+# continuous extension: y(t + theta h) = y + h K.T @ DP_P @ [theta, ..., theta**4]
+DP_P = np.array([
+    [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+    [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+    [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+    [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+    [0, 40617522/29380423, -110615467/29380423, 69997945/29380423]])
+
+
+class PlanarTrajectory():
+    '''dense output of a planar propagation. Holds the start time, length,
+    starting state and continuous extension coefficients of every
+    accepted step; state_at() evaluates them at any times.'''
+    def __init__(self):
+        self.t = []                   # start time of each step (s)
+        self.h = []                   # length of each step (s)
+        self.y = []                   # state at the start of each step
+        self.q = []                   # continuous extension coefficients
+        self.t_burn = 0               # end of the burn (s)
+        self.t_event = None           # time the final radius is reached (s)
+        self.nfev = 0                 # evaluations of the equations of motion
+        self.steps = 0                # accepted steps
+        self.rejected = 0             # rejected steps
+
+    def add_step(self, t, h, y, K):
+        '''records an accepted step from its stage derivatives K'''
+        self.t.append(t)
+        self.h.append(h)
+        self.y.append(y)
+        self.q.append(K.T @ DP_P)
+        self.steps += 1
+
+    def finish(self):
+        '''converts the recorded steps to arrays'''
+        self.t = np.array(self.t)
+        self.h = np.array(self.h)
+        self.y = np.array(self.y)
+        self.q = np.array(self.q)
+
+    def state_at(self, t):
+        '''state (x, y, vx, vy) in m and m/s at time(s) t; times outside
+        the propagation are clamped to its ends
+        outputs: state - array of shape t.shape + (4,)'''
+
+        t = np.clip(np.asarray(t, dtype = float), self.t[0], self.t_event)
+        # step containing each time
+        i = np.clip(np.searchsorted(self.t, t, side = "right") - 1, 0, self.t.size - 1)
+        h = self.h[i]
+        theta = (t - self.t[i]) / h
+        powers = np.stack([theta, theta ** 2, theta ** 3, theta ** 4], axis = -1)
+
+        return self.y[i] + h[..., None] * np.einsum("...ij,...j->...i", self.q[i], powers)
+
+    def radius_at(self, t):
+        '''distance from the parent body (m) at time(s) t'''
+        s = self.state_at(t)
+        return np.hypot(s[..., 0], s[..., 1])
+
+    def speed_at(self, t):
+        '''speed (m/s) at time(s) t'''
+        s = self.state_at(t)
+        return np.hypot(s[..., 2], s[..., 3])
+
+
+def _step(fun, t, y, f, h):
+    '''one Dormand-Prince step
+    outputs: y_new, f_new, error estimate, stage derivatives K'''
+    K = np.empty((7, y.size))
+    K[0] = f
+    for s in range(1, 6):
+        K[s] = fun(t + DP_C[s] * h, y + h * (DP_A[s] @ K[:s]))
+    y_new = y + h * (DP_B @ K[:6])
+    K[6] = fun(t + h, y_new)
+
+    return y_new, K[6], h * (DP_E @ K), K
+
+
+def _integrate(fun, traj, t, y, h, t_end, rtol, atol, r_event = None):
+    '''integrates from t until t_end, or until the radius reaches r_event,
+    recording every accepted step in traj
+    outputs: t, y - time and state at the end
+             h - suggested next step'''
+
+    f = fun(t, y)
+    traj.nfev += 1
+    while True:
+        if traj.steps + traj.rejected > MAX_STEPS:
+            raise RuntimeError("propagate: rtol %g not met in %d steps" %(rtol, MAX_STEPS))
+        h_step = min(h, t_end - t)
+        y_new, f_new, err, K = _step(fun, t, y, f, h_step)
+        traj.nfev += 6
+        scale = atol + rtol * np.maximum(np.abs(y), np.abs(y_new))
+        e = math.sqrt(np.mean((err / scale) ** 2))
+
+        if e <= 1:
+            traj.add_step(t, h_step, y, K)
+            if r_event is not None and math.hypot(y_new[0], y_new[1]) >= r_event:
+                # locate the crossing on the continuous extension
+                q = K.T @ DP_P
+                def radius(theta):
+                    s = y + h_step * (q @ [theta, theta ** 2, theta ** 3, theta ** 4])
+                    return math.hypot(s[0], s[1]) - r_event, s
+                lo, hi = 0.0, 1.0
+                g_lo, g_hi = radius(lo)[0], radius(hi)[0]
+                for i in range(100):
+                    # false position, halving a stuck end (Illinois)
+                    theta = hi - g_hi * (hi - lo) / (g_hi - g_lo)
+                    g, s = radius(theta)
+                    if abs(g) <= 1e-15 * r_event or hi - lo < 1e-15:
+                        break
+                    if g > 0:
+                        hi, g_hi = theta, g
+                        g_lo /= 2
+                    else:
+                        lo, g_lo = theta, g
+                        g_hi /= 2
+                return t + theta * h_step, s, h
+            t, y, f = t + h_step, y_new, f_new
+            if t >= t_end:
+                return t, y, h
+        else:
+            traj.rejected += 1
+
+        # local error of the 4th order solution scales with h**5
+        h *= min(5, max(0.2, 0.9 * e ** -0.2)) if e > 0 else 5
+
+
+def propagate(v0, r0, dv, burn_time, r_final, parent_m = M_S, rtol = PLANAR_RTOL):
+    '''propagates a spacecraft from periapsis through a burn along its
+    velocity and then coasts until it reaches the final distance. Inputs
+    use the same units as flight_time().
+    inputs: v0 - starting velocity at periapsis (m/s)
+            r0 - periapsis (AU)
+            dv - delta-v of the burn (m/s); applied at a constant rate
+            burn_time - length of the burn (days); 0 applies dv at once
+                        at periapsis, like the straight line model
+            r_final - final distance from periapsis of the straight line
+                      model (AU); the propagation ends at a distance of
+                      sqrt(r_final**2 + r0**2) from the parent body
+            parent_m - mass of the parent body (kg)
+            rtol - relative tolerance of every step
+    outputs: traj - PlanarTrajectory; t_burn and t_event are the end of
+                    the burn and the flight time (s)'''
+
+    mu = G * parent_m
+    r0 = r0 * AU
+    burn_t = burn_time * SEC_PER_DAY
+    accel = dv / burn_t if burn_t > 0 else 0.0
+    if burn_t <= 0:
+        # an instantaneous burn at periapsis
+        v0 = v0 + dv
+    r_event = math.hypot(r_final * AU, r0)
+
+    def gravity(t, s):
+        '''equations of motion while coasting'''
+        x, y, vx, vy = s
+        k = -mu / (x * x + y * y) ** 1.5
+        return np.array([vx, vy, k * x, k * y])
+
+    def thrust(t, s):
+        '''equations of motion while burning along the velocity'''
+        x, y, vx, vy = s
+        k = -mu / (x * x + y * y) ** 1.5
+        a = accel / math.hypot(vx, vy)
+        return np.array([vx, vy, k * x + a * vx, k * y + a * vy])
+
+    # absolute tolerances on the scale of the starting position and velocity
+    atol = rtol * np.array([r0, r0, v0, v0])
+
+    traj = PlanarTrajectory()
+    t, y = 0.0, np.array([r0, 0.0, 0.0, float(v0)])
+    h = 1e-3 * r0 / v0
+    if burn_t > 0:
+        t, y, h = _integrate(thrust, traj, t, y, h, burn_t, rtol, atol)
+    traj.t_burn = t
+    traj.t_event, y_event, h = _integrate(gravity, traj, t, y, h, math.inf,
+                                          rtol, atol, r_event)
+    traj.finish()
+
+    return traj
+
+
+def spacecraft_at(traj, t, r0, parent_m = M_S):
+    '''Spacecraft holding the planar state at time t, so planar results
+    can be printed and logged like the straight line model's. The
+    distance traveled is that of the straight line model at the same
+    distance from the parent body.
+    inputs: traj - PlanarTrajectory
+            t - time (s)
+            r0 - periapsis (AU)
+            parent_m - mass of the parent body (kg)'''
+
+    x, y, vx, vy = traj.state_at(t)
+    ship = Spacecraft(math.hypot(vx, vy), r0 * AU, parent_m)
+    ship.r = math.hypot(x, y)
+    ship.elapse_t = float(t)
+    ship.dis_travel = math.sqrt(max(ship.r ** 2 - ship.r0 ** 2, 0))
+
+    return ship
@@ -0,0 +1,198 @@
+# quadrature.py
+#
+# numerical integration routines used to calculate coast times. Every
+# routine takes a vectorized integrand f (accepts and returns numpy
+# arrays), evaluates it in chunks of at most CHUNK_SIZE points so memory
+# use does not grow with the number of points, and returns the value
+# together with an estimate of the error achieved
+#
+# Table of contents
+# simpson - composite Simpson's rule with a fixed number of segments
+# adaptive_simpson - adaptive Simpson's rule to a requested tolerance
+# gauss_legendre - composite Gauss-Legendre rule refined until the
+#                  requested tolerance is met
+# integrate - calls one of the above by name
+
+import numpy as np                # arrays for evaluating the integrand
+
+
+CHUNK_SIZE = 2 ** 16              # max points evaluated at once
+MAX_EVALS = 10 ** 8               # max integrand evaluations before giving up
+GAUSS_ORDER = 8                   # nodes per Gauss-Legendre panel
+QUAD_RTOL = 1e-10                 # default relative tolerance
+METHODS = ("simpson", "adaptive", "gauss")
+
+
+def simpson(f, a, b, n):
+    '''composite Simpson's rule with n segments. n is rounded up to be
+    even (minimum 6), as Spacecraft.coast_distance always has. The coarse
+    rule on every other point gives a Richardson error estimate at no
+    extra cost; when n / 2 is odd its last three coarse segments use
+    Simpson's 3/8 rule.
+
+    inputs: f - vectorized integrand
+            a, b - limits of integration
+            n - number of segments
+    outputs: value - approximation of the integral
+             error - estimated absolute error
+             evals - number of integrand evaluations'''
+
+    n = max(int(n) + int(n) % 2, 6)
+    h = (b - a) / n
+    m = n // 2                    # coarse segments
+    # coarse points under Simpson's rule; the rest take the 3/8 rule
+    last = m if m % 2 == 0 else m - 3
+
+    fine = 0.0                    # weighted sum for n segments
+    coarse = 0.0                  # weighted sum for n/2 segments
+    for k0 in range(0, n + 1, CHUNK_SIZE):
+        k = np.arange(k0, min(k0 + CHUNK_SIZE, n + 1))
+        f_values = f(a + k * h)
+        # Simpson's coefficients on the fine and coarse grid
+        fine_c = np.where(k % 2 == 0, 2.0, 4.0)
+        fine_c[(k == 0) | (k == n)] = 1
+        j = k // 2
+        coarse_c = np.where(j % 2 == 0, 2.0, 4.0)
+        coarse_c[(j == 0) | (j == last)] = 1
+        coarse_c[(j > last) | (last == 0)] = 0
+        # 3/8 rule, in units of Simpson's weight 2h/3
+        coarse_c += np.select([j == last, j == m, j > last], [9 / 8, 9 / 8, 27 / 8], 0) \
+                    * (last < m)
+        coarse_c *= (k % 2 == 0)
+        fine += np.dot(fine_c, f_values)
+        coarse += np.dot(coarse_c, f_values)
+
+    fine *= h / 3
+    coarse *= 2 * h / 3
+
+    return float(fine), float(abs(fine - coarse) / 15), n + 1
+
+
+def adaptive_simpson(f, a, b, rtol = 1e-10, atol = 0.0):
+    '''adaptive Simpson's rule. Intervals are refined a level at a time
+    and every level is evaluated in chunks. An interval is accepted once
+    its share of the tolerance is met.
+
+    inputs: f - vectorized integrand
+            a, b - limits of integration
+            rtol - requested tolerance relative to the integral
+            atol - requested absolute tolerance
+    outputs: value - approximation of the integral
+             error - estimated absolute error
+             evals - number of integrand evaluations'''
+
+    if a == b:
+        return 0.0, 0.0, 0
+
+    # start from a coarse Simpson's rule to set the absolute tolerance
+    estimate, error, evals = simpson(f, a, b, 8)
+    tol = max(rtol * abs(estimate), atol)
+
+    # intervals still being refined - left end, width, f at left, middle
+    # and right, and the Simpson's estimate over the interval
+    left = a + (b - a) / 8 * np.arange(8)
+    width = np.full(8, (b - a) / 8)
+    fl, fm, fr = f(left), f(left + width / 2), f(left + width)
+    whole = width / 6 * (fl + 4 * fm + fr)
+    evals += 24
+
+    value = 0.0
+    error = 0.0
+    while left.size:
+        if evals > MAX_EVALS:
+            raise RuntimeError("adaptive_simpson: tolerance not met after %d "
+                               "evaluations" %evals)
+        next_level = []
+        for i0 in range(0, left.size, CHUNK_SIZE):
+            s = slice(i0, i0 + CHUNK_SIZE)
+            l, w = left[s], width[s]
+            # evaluate the quarter points of each interval
+            flm, frm = f(l + w / 4), f(l + 3 * w / 4)
+            evals += 2 * l.size
+            halves_l = w / 12 * (fl[s] + 4 * flm + fm[s])
+            halves_r = w / 12 * (fm[s] + 4 * frm + fr[s])
+            diff = halves_l + halves_r - whole[s]
+            # accept intervals whose share of the tolerance is met
+            done = np.abs(diff) <= 15 * tol * w / abs(b - a)
+            value += np.sum((halves_l + halves_r + diff / 15)[done])
+            error += np.sum(np.abs(diff[done])) / 15
+            # split the rest in two
+            todo = ~done
+            next_level.append((np.concatenate((l[todo], l[todo] + w[todo] / 2)),
+                               np.concatenate((w[todo] / 2, w[todo] / 2)),
+                               np.concatenate((fl[s][todo], fm[s][todo])),
+                               np.concatenate((flm[todo], frm[todo])),
+                               np.concatenate((fm[s][todo], fr[s][todo])),
+                               np.concatenate((halves_l[todo], halves_r[todo]))))
+        left, width, fl, fm, fr, whole = [np.concatenate(x) for x in zip(*next_level)]
+
+    return float(value), float(error), evals
+
+
+def gauss_legendre(f, a, b, rtol = 1e-10, atol = 0.0, panels = 4):
+    '''composite Gauss-Legendre rule with GAUSS_ORDER nodes per panel. The
+    number of panels doubles until two successive estimates agree.
+
+    inputs: f - vectorized integrand
+            a, b - limits of integration
+            rtol - requested tolerance relative to the integral
+            atol - requested absolute tolerance
+            panels - starting number of panels
+    outputs: value - approximation of the integral
+             error - estimated absolute error
+             evals - number of integrand evaluations'''
+
+    nodes, weights = np.polynomial.legendre.leggauss(GAUSS_ORDER)
+    # number of panels evaluated per chunk
+    chunk = max(1, CHUNK_SIZE // GAUSS_ORDER)
+
+    def composite(panels):
+        '''Gauss-Legendre rule over the given number of equal panels'''
+        h = (b - a) / panels
+        total = 0.0
+        for p0 in range(0, panels, chunk):
+            mid = a + h * (np.arange(p0, min(p0 + chunk, panels)) + 0.5)
+            x = mid[:, None] + h / 2 * nodes
+            total += np.sum(f(x) @ weights)
+        return total * h / 2
+
+    evals = GAUSS_ORDER * panels
+    previous = composite(panels)
+    while True:
+        panels *= 2
+        evals += GAUSS_ORDER * panels
+        value = composite(panels)
+        error = abs(value - previous)
+        if error <= max(rtol * abs(value), atol):
+            return float(value), float(error), evals
+        if evals > MAX_EVALS:
+            raise RuntimeError("gauss_legendre: tolerance not met after %d "
+                               "evaluations" %evals)
+        previous = value
+
+
+def integrate(f, a, b, method = "simpson", n = None, rtol = None, atol = 0.0):
+    '''integrate f from a to b with the named method. "simpson" uses n
+    segments unless a tolerance is given, in which case the adaptive rule
+    is used instead.
+
+    inputs: f - vectorized integrand
+            a, b - limits of integration
+            method - "simpson", "adaptive" or "gauss"
+            n - number of segments for the fixed Simpson's rule
+            rtol - requested relative tolerance; defaults to QUAD_RTOL
+            atol - requested absolute tolerance
+    outputs: value, error, evals - see the individual methods'''
+
+    if method == "simpson" and rtol is None:
+        return simpson(f, a, b, n)
+
+    if rtol is None:
+        rtol = QUAD_RTOL
+    if method in ("simpson", "adaptive"):
+        return adaptive_simpson(f, a, b, rtol, atol)
+    if method == "gauss":
+        return gauss_legendre(f, a, b, rtol, atol)
+
+    raise ValueError("integrate: unknown method %s; expected one of %s"
+                     %(method, ", ".join(METHODS)))
@@ -0,0 +1,246 @@
+# result_store.py
+#
+# append-only columnar store of flight_time() results. Every field of
+# STORE_DTYPE is kept in its own raw binary file and read back with
+# np.memmap, and a small JSON manifest records the dtype and the number of
+# committed rows. Queries walk the columns in chunks, so millions of
+# stored runs are filtered and aggregated without loading them into RAM
+#
+# Table of contents
+# STORE_DTYPE - fields of a stored run
+# ResultStore - appends runs and answers chunked queries
+# flight_row - store row from the results of one flight_time() run
+#
+# Rows are appended under a lock file and only count once the manifest
+# is rewritten, so a crash mid append leaves the committed rows intact and
+# parallel runners (see run_profiles.py) can share one store. The lock is
+# an operating system file lock, released when its holder exits, so a
+# crashed runner never leaves the store locked.
+#
+# Example - mean flight time of the stored runs with 1000 burn steps
+# >>> import result_store
+# >>> store = result_store.ResultStore()
+# >>> stats = store.aggregate("final_elapse_t",
+# ...                         where = lambda c: c["burn_steps"] == 1000)
+# >>> stats.mean / result_store.SEC_PER_YEAR
+
+import json                       # manifest
+import os
+import time                       # lock timeout and row time stamps
+try:
+    import fcntl                  # append lock
+except ImportError:
+    # Windows locks files with msvcrt instead
+    fcntl = None
+    import msvcrt
+import numpy as np                # columns
+
+from astro_constants import *     # astronomical constants
+from batch import RESULT_DTYPE    # inputs and states of a flight profile
+from montecarlo import StreamingStats   # chunked statistics
+
+
+STORE_DIR = "../output/results"   # default folder of the result store
+STORE_CHUNK = 2 ** 20             # rows read at once by queries
+STORE_VERSION = 1                 # layout version in the manifest
+LOCK_TIMEOUT = 60                 # seconds to wait for the append lock
+MANIFEST = "manifest.json"        # manifest file name
+
+# a stored run - the batch result fields, then the run's metadata
+STORE_DTYPE = np.dtype(RESULT_DTYPE.descr + [
+    ("profile", "S64"),           # name of the flight profile, if any
+    ("calc_time", "f8"),          # total computation time (s)
+    ("burn_time_s", "f8"),        # time spent on the burn (s)
+    ("coast_time_s", "f8"),       # time spent on the coast (s)
+    ("created", "f8"),            # time the row was stored (unix s)
+])
+
+
+class ResultStore():
+    '''append-only columnar store of flight results in a folder. Column
+    name.f8 (or .i8, .S64) holds field name of every row back to back;
+    manifest.json holds the dtype and the committed row count. Columns are
+    opened read-only with np.memmap on demand.'''
+    def __init__(self, directory = STORE_DIR, dtype = STORE_DTYPE):
+        self.directory = directory    # folder holding the store
+        self.dtype = dtype            # dtype of a row
+        self.rows = 0                 # committed rows
+        os.makedirs(directory, exist_ok = True)
+        self.manifest = os.path.join(directory, MANIFEST)
+        if os.path.exists(self.manifest):
+            self.refresh()
+        else:
+            self._write_manifest()
+
+    def __len__(self):
+        return self.rows
+
+    def path(self, name):
+        '''file holding a column'''
+        return os.path.join(self.directory, "%s.%s" %(name, self.dtype[name].str[1:]))
+
+    def refresh(self):
+        '''rereads the manifest, picking up rows appended by other
+        processes'''
+        with open(self.manifest) as f:
+            manifest = json.load(f)
+        stored = np.dtype([tuple(field) for field in manifest["dtype"]])
+        if stored != self.dtype:
+            raise ValueError("result store %s holds %s rows, expected %s"
+                             %(self.directory, stored, self.dtype))
+        self.rows = manifest["rows"]
+
+    def _write_manifest(self):
+        '''replaces the manifest in one step so readers never see half of it'''
+        manifest = {"version": STORE_VERSION, "rows": self.rows,
+                    "dtype": [list(field) for field in self.dtype.descr],
+                    "columns": {name: os.path.basename(self.path(name))
+                                for name in self.dtype.names}}
+        tmp = self.manifest + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent = 1)
+        os.replace(tmp, self.manifest)
+
+    def _lock(self):
+        '''takes an exclusive lock on the store's lock file, waiting while
+        another process holds it. The operating system releases the lock
+        when its holder exits, so a crash never leaves the store locked.
+        outputs: fd - open lock file; closing it releases the lock'''
+        fd = os.open(os.path.join(self.directory, "append.lock"), os.O_CREAT | os.O_RDWR)
+        start = time.monotonic()
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return fd
+            except OSError:
+                if time.monotonic() - start > LOCK_TIMEOUT:
+                    os.close(fd)
+                    raise TimeoutError("result store %s is locked by another process"
+                                       %self.directory)
+                time.sleep(0.01)
+
+    def _unlock(self, fd):
+        '''releases a lock taken by _lock'''
+        if fcntl is None:
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        os.close(fd)
+
+    def append(self, rows):
+        '''appends rows to the store. Fields of STORE_DTYPE missing from
+        rows are stored as zero (empty for the profile name).
+        inputs: rows - structured array (or one record) with any of the
+                       fields of STORE_DTYPE, e.g. a flight_time_batch result
+        outputs: start - index of the first appended row'''
+
+        rows = np.atleast_1d(rows)
+        lock = self._lock()
+        try:
+            self.refresh()
+            start = self.rows
+            for name in self.dtype.names:
+                column = np.zeros(rows.size, dtype = self.dtype[name])
+                if name in rows.dtype.names:
+                    column[:] = rows[name]
+                # columns past the committed rows belong to a failed append
+                with open(self.path(name), "ab") as f:
+                    f.truncate(start * self.dtype[name].itemsize)
+                    f.write(column.tobytes())
+            self.rows = start + rows.size
+            self._write_manifest()
+        finally:
+            self._unlock(lock)
+
+        return start
+
+    def column(self, name):
+        '''read-only memmap of every committed value of a column'''
+        if self.rows == 0:
+            return np.zeros(0, dtype = self.dtype[name])
+        return np.memmap(self.path(name), dtype = self.dtype[name], mode = "r",
+                         shape = (self.rows,))
+
+    def chunks(self, columns = None, chunk = STORE_CHUNK):
+        '''iterates over the store chunk by chunk
+        inputs: columns - names of the columns to read; defaults to all
+                chunk - rows per chunk
+        outputs: yields (start, arrays) - index of the chunk's first row
+                                          and a dictionary of column slices'''
+        columns = self.dtype.names if columns is None else columns
+        maps = {name: self.column(name) for name in columns}
+        for start in range(0, self.rows, chunk):
+            yield start, {name: m[start:start + chunk] for name, m in maps.items()}
+
+    def select(self, where = None, columns = None, chunk = STORE_CHUNK):
+        '''rows matching a filter
+        inputs: where - function of a chunk's column dictionary returning a
+                        boolean mask; None selects every row
+                columns - columns to return (and pass to where); defaults
+                          to all
+                chunk - rows read at once
+        outputs: rows - structured array of the matching rows'''
+
+        columns = list(self.dtype.names if columns is None else columns)
+        dtype = np.dtype([(name, self.dtype[name]) for name in columns])
+        parts = []
+        for start, arrays in self.chunks(columns, chunk):
+            mask = slice(None) if where is None else np.asarray(where(arrays), dtype = bool)
+            part = np.zeros(len(next(iter(arrays.values()))[mask]), dtype = dtype)
+            for name in columns:
+                part[name] = arrays[name][mask]
+            parts.append(part)
+
+        return np.concatenate(parts) if parts else np.zeros(0, dtype = dtype)
+
+    def aggregate(self, column, where = None, chunk = STORE_CHUNK):
+        '''statistics of a numeric column over the rows matching a filter
+        inputs: column - name of the column
+                where - function of a chunk's column dictionary returning a
+                        boolean mask; it sees every column
+                chunk - rows read at once
+        outputs: stats - StreamingStats (count, mean, std, quantiles)'''
+
+        stats = StreamingStats()
+        for start, arrays in self.chunks(None if where else [column], chunk):
+            values = arrays[column]
+            if where is not None:
+                values = values[np.asarray(where(arrays), dtype = bool)]
+            stats.update(values.astype(float))
+
+        return stats
+
+
+def flight_row(profile, post_burn, ship, calc_time, metrics = None, name = ""):
+    '''store row from one flight_time() run
+    inputs: profile - dictionary of the flight_time() arguments
+            post_burn, ship - Spacecraft after the burn and at r_final
+            calc_time - computation time (s)
+            metrics - metrics dictionary filled by flight_time(), if any
+            name - name of the flight profile
+    outputs: row - record of STORE_DTYPE'''
+
+    row = np.zeros((), dtype = STORE_DTYPE)
+    for field in ("v0", "r0", "dv", "burn_time", "parent_m", "r_final"):
+        row[field] = profile[field]
+    metrics = metrics or {}
+    # step counts actually used; "auto" and adaptive counts are resolved in
+    # the metrics, counts that are still unknown are stored as 0
+    for field in ("burn_steps", "coast_steps"):
+        try:
+            row[field] = int(metrics.get(field, profile[field]))
+        except (TypeError, ValueError):
+            row[field] = 0
+    for prefix, craft in (("burn", post_burn), ("final", ship)):
+        row[prefix + "_v"] = craft.v
+        row[prefix + "_r"] = craft.r
+        row[prefix + "_dis_travel"] = craft.dis_travel
+        row[prefix + "_elapse_t"] = craft.elapse_t
+    row["profile"] = name.encode()[:64]
+    row["calc_time"] = calc_time
+    row["burn_time_s"] = metrics.get("burn_time_s", np.nan)
+    row["coast_time_s"] = metrics.get("coast_time_s", np.nan)
+    row["created"] = time.time()
+
+    return row
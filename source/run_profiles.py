@@ -0,0 +1,132 @@
+# run_profiles.py
+#
+# runs many flight profiles in parallel and gathers the results into
+# a single summary table
+#
+# Table of contents
+# find_profiles - expands a directory or glob into a list of profiles
+# run_profile - runs one profile; called in a worker process
+# run_profiles - runs every profile on a process pool and saves a
+#                summary table
+# save_summary - saves summary rows without overwriting older tables
+#
+# Example - regenerate every einstein profile on four processes
+# >>> import run_profiles
+# >>> rows = run_profiles.run_profiles("einstein*.xlsx", workers = 4)
+
+import concurrent.futures         # process pool
+import csv                        # summary table
+import datetime as dt             # datetime library
+import glob                       # expanding profile patterns
+import io                         # building the summary table
+import os
+
+from flight_time import *         # flight time program
+
+
+# columns of the summary table
+SUMMARY_FIELDS = ["profile", "v0", "r0", "dv", "parent_m", "r_final",
+                  "burn_time", "burn_steps", "coast_steps",
+                  "burn_v", "burn_r", "burn_dis_travel", "burn_elapse_t",
+                  "final_v", "final_r", "final_dis_travel", "final_elapse_t",
+                  "calc_time", "log", "error"]
+
+
+def find_profiles(profiles):
+    '''expands a directory or glob pattern into a sorted list of flight
+    profile paths. Relative patterns that match nothing from the current
+    folder are looked up in the config folder. Templates are skipped.
+    inputs: profiles - directory, glob pattern or list of either
+    outputs: paths - sorted list of absolute .xlsx paths, so they can be
+                     opened from any folder'''
+
+    if isinstance(profiles, (list, tuple)):
+        paths = []
+        for pattern in profiles:
+            paths += find_profiles(pattern)
+        return sorted(set(paths))
+
+    if os.path.isdir(profiles):
+        # every workbook in the directory
+        profiles = os.path.join(profiles, "*.xlsx")
+    paths = glob.glob(profiles)
+    if not paths and not os.path.isabs(profiles):
+        # fall back to the config folder
+        return find_profiles(os.path.join(CONFIG_DIR, profiles))
+
+    return sorted(os.path.abspath(p) for p in paths
+                  if "template" not in os.path.basename(p))
+
+
+def run_profile(path, text_log = False):
+    '''runs one flight profile and returns a summary row. Errors are
+    recorded in the row instead of being raised so one bad profile does
+    not stop the rest of the batch.
+    inputs: path - path of the flight profile
+            text_log - also save a text flight log; its path goes in the
+                       "log" column
+    outputs: row - dictionary keyed by SUMMARY_FIELDS'''
+
+    row = dict.fromkeys(SUMMARY_FIELDS, "")
+    row["profile"] = os.path.basename(path)
+    try:
+        row.update(read_flight_profile(path))
+        post_burn, post_cruise, calc_time, out_file = open_flight_profile(path, text_log = text_log)
+    except Exception as e:
+        row["error"] = "%s: %s" %(type(e).__name__, e)
+        return row
+
+    # post burn and final states in MKS
+    for prefix, ship in (("burn", post_burn), ("final", post_cruise)):
+        row[prefix + "_v"] = ship.get_v()
+        row[prefix + "_r"] = ship.get_r()
+        row[prefix + "_dis_travel"] = ship.get_dis_travel()
+        row[prefix + "_elapse_t"] = ship.get_elapse_t()
+    row["calc_time"] = calc_time
+    row["log"] = out_file or ""
+
+    return row
+
+
+def run_profiles(profiles, workers = None, summary = True, text_log = False):
+    '''runs every flight profile matching profiles on a process pool and
+    gathers the post burn and post cruise states into one table
+    inputs: profiles - directory, glob pattern or list of either
+            workers - number of worker processes; defaults to the number
+                      of CPUs
+            summary - save the table as a csv in the output folder
+            text_log - also save a text flight log of every profile
+    outputs: rows - list of summary rows (dictionaries) sorted by profile'''
+
+    paths = find_profiles(profiles)
+    print("Running %d flight profiles..." %len(paths))
+
+    rows = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as pool:
+        for row in pool.map(run_profile, paths, [text_log] * len(paths)):
+            if row["error"]:
+                print("%s failed: %s" %(row["profile"], row["error"]))
+            rows.append(row)
+
+    if summary and rows:
+        out_file = save_summary(rows)
+        print("Summary saved to %s" %out_file)
+
+    return rows
+
+
+def save_summary(rows):
+    '''saves summary rows as a csv in the output folder. Like the flight
+    logs the file is created exclusively, so runs finishing in the same
+    second get numbered suffixes instead of overwriting each other.
+    inputs: rows - list of summary rows (dictionaries)
+    outputs: out_file - path of the saved table'''
+
+    table = io.StringIO()
+    writer = csv.DictWriter(table, fieldnames = SUMMARY_FIELDS, lineterminator = "\n")
+    writer.writeheader()
+    writer.writerows(rows)
+    currentDT = dt.datetime.now()
+
+    return write_log("summary_%s" %currentDT.strftime("%m-%d_%H-%M-%S"),
+                     table.getvalue(), ext = ".csv")
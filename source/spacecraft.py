@@ -4,7 +4,8 @@
 # escape orbit
 #
 # Table of contents
-#
+# Spacecraft - spacecraft in an approximated hyperbolic escape orbit
+# CHECKPOINT_DTYPE - state at each distance of coast_checkpoints
 #
 # Revision history
 # 03/19/19    Tim Liu    created file and wrote calc_exhaust_velocity 
@@ -24,7 +25,23 @@
 
 from astro_constants import *     # astronomical constants
 from orbit import *               # helper functions for orbital calculations
+from quadrature import *          # numerical integration for coast_distance
+from state import STATE_FIELDS    # fields of a compact spacecraft state
+import kepler                     # closed form hyperbolic coast
 import math                       # math library
+import numpy as np                # checkpoint tables
+
+MODEL_VERSION = "4"               # bump whenever results of the model change;
+                                  # used to invalidate cached results
+
+# state at each checkpoint of coast_checkpoints
+CHECKPOINT_DTYPE = np.dtype([
+    ("x_final", "f8"),            # checkpoint distance traveled (AU)
+    ("elapse_t", "f8"),           # time elapsed at the checkpoint (s)
+    ("v", "f8"),                  # velocity at the checkpoint (m/s)
+    ("r", "f8"),                  # distance from parent body (m)
+    ("error", "f8"),              # estimated error of elapse_t (s)
+])
 
 
 class Spacecraft():
@@ -33,7 +50,10 @@ class Spacecraft():
     line perpendicular to and offset from the mass being orbited. Class
     contains methods for updating the position of the spacecraft
     and calculating the time elapsed. Internally all units are handled
-    in MKS.'''
+    in MKS. The state is kept in __slots__ (the fields of
+    state.STATE_FIELDS) so spacecraft are small and cheap to copy.'''
+    __slots__ = STATE_FIELDS
+
     def __init__(self, v0, r0, parent_m):
         self.v = v0               # spacecraft velocity (m/s)
         self.r = r0               # spacecraft distance from parent body (m)
@@ -45,10 +65,31 @@ class Spacecraft():
     def clone(self):
         '''clone parameters to another Spacecraft class
         outputs: new - new spacecraft class w/ identical attributes'''
-        new = Spacecraft(self.get_v(), self.get_r0(), self.parent_m)
-        new.r = self.get_r()
-        new.elapse_t = self.get_elapse_t()
-        new.dis_travel = self.get_dis_travel()
+        # copy the slots directly; skips __init__ and the accessors
+        new = Spacecraft.__new__(Spacecraft)
+        new.v = self.v
+        new.r = self.r
+        new.r0 = self.r0
+        new.parent_m = self.parent_m
+        new.elapse_t = self.elapse_t
+        new.dis_travel = self.dis_travel
+
+        return new
+
+    def record(self):
+        '''returns the state as a tuple in state.STATE_DTYPE order; assign
+        it to an element of an array of states to snapshot the spacecraft'''
+        return (self.v, self.r, self.r0, self.parent_m, self.elapse_t,
+                self.dis_travel)
+
+    @classmethod
+    def from_record(cls, record):
+        '''creates a spacecraft from a record of state.STATE_DTYPE (or a
+        tuple returned by record())
+        outputs: new - new spacecraft with the recorded state'''
+        new = cls.__new__(cls)
+        (new.v, new.r, new.r0, new.parent_m, new.elapse_t,
+         new.dis_travel) = (float(x) for x in record)
 
         return new
 
@@ -118,6 +159,83 @@ class Spacecraft():
 
         return
 
+    def long_burn_adaptive(self, dv, time, rtol = 1e-6, max_steps = 10 ** 6):
+        '''execute the same burn as long_burn but choose the spacing of the
+        instantaneous burns automatically. Each step is compared against two
+        half steps; the difference estimates the local error and the step is
+        grown where the velocity slope is flat and shrunk where it changes
+        quickly. Accepted steps are Richardson extrapolated from the full
+        and half steps, which cancels the leading error term of long_burn.
+        inputs: dv - total delta-v (m/s) of the burn
+                time - length of time (days) of the burn
+                rtol - tolerance relative to the final velocity (v + dv)
+                       and to the distance covered at that velocity
+                max_steps - maximum number of burns tried, accepted or
+                            not, before giving up
+        outputs: steps - number of instantaneous burns in the accepted
+                         steps (two per accepted step); a burn of no
+                         length is one instantaneous burn'''
+
+        burn_t = time * SEC_PER_DAY             # length of burn in seconds
+        if burn_t <= 0:
+            # all of the delta-v at once, as long_burn does
+            self.burn(dv)
+            return 1
+        accel = dv / burn_t                     # delta-v per second
+        # absolute tolerances on the final velocity and distance traveled
+        v_tol = rtol * (abs(self.v) + abs(dv))
+        x_tol = v_tol * burn_t
+
+        h = burn_t / 16                         # first step length (s)
+        t = 0                                   # burn time completed (s)
+        steps = 0                               # instantaneous burns accepted
+        tried = 0                               # instantaneous burns tried
+        while burn_t - t > 1e-12 * burn_t:
+            if tried > max_steps:
+                raise RuntimeError("long_burn_adaptive: rtol %g not met in %d steps"
+                                   %(rtol, max_steps))
+            h = min(h, burn_t - t)
+
+            # one full step
+            full = self.clone()
+            full.burn(accel * h)
+            full.coast_time(h)
+            # two half steps
+            half = self.clone()
+            for i in range(2):
+                half.burn(accel * h / 2)
+                half.coast_time(h / 2)
+            tried += 3
+
+            # estimated error of the full step relative to the tolerance
+            err = max(abs(half.v - full.v) / v_tol,
+                      abs(half.dis_travel - full.dis_travel) / x_tol)
+
+            if err <= 1:
+                # accept the half steps and extrapolate
+                self.set_state(half)
+                self.v = 2 * half.v - full.v
+                self.dis_travel = 2 * half.dis_travel - full.dis_travel
+                self.r = math.sqrt(self.dis_travel ** 2 + self.r0 ** 2)
+                t += h
+                steps += 2
+
+            # local error grows with h squared
+            h *= min(5, max(0.2, 0.9 / math.sqrt(err))) if err > 0 else 5
+
+        return steps
+
+    def set_state(self, other):
+        '''copy the state of another spacecraft into this one'''
+        self.v = other.v
+        self.r = other.r
+        self.r0 = other.r0
+        self.parent_m = other.parent_m
+        self.elapse_t = other.elapse_t
+        self.dis_travel = other.dis_travel
+
+        return
+
     def burn(self, dv):
         '''execute an instantaneous burn. Burn modifies only the
         current velocity'''
@@ -126,20 +244,35 @@ class Spacecraft():
         return
 
     # *** helper methods for when spacecraft is coasting *** #
-    def coast_time(self, coast_period, delta = 1e8):
+    def coast_time(self, coast_period, delta = 1e8, method = "linear"):
         '''coast for a period of time. Computes a linear
         approximation of the velocity and updates orbital parameters.
 
         inputs: coast_period - desired time to coast for (s)
                 delta - coast distance used as delta; default to 10 000 kmeters
+                method - "linear" - linear approximation of the velocity
+                         "kepler" - exact distance on the hyperbola through
+                                    the current state (see kepler.py)
         updates: self.v
                  self.elapse_t
                  self.dis_travel
                  self.r'''
+        if method == "kepler":
+            # distance after the coast from the hyperbolic Kepler equation
+            new_r = kepler.radius_after(self.v, self.r, self.r0 * self.v, self.r,
+                                        coast_period, self.parent_m)
+            if math.isnan(new_r):
+                raise ValueError("coast_time: kepler coast needs a hyperbolic orbit")
+            self.v = calc_v_2(self.v, self.r, new_r, self.parent_m)
+            self.elapse_t += coast_period
+            self.dis_travel = math.sqrt(new_r ** 2 - self.r0 ** 2)
+            self.r = new_r
+            return
+
         # compute r after spacecraft coasts for delta
         r_plus_delta = math.sqrt((self.dis_travel + delta) ** 2 + self.r0 ** 2)
         # compute slope of velocity as function of self.dis_travel
-        m = (calc_v_2(self.v, self.r, r_plus_delta) - self.v) / delta
+        m = (calc_v_2(self.v, self.r, r_plus_delta, self.parent_m) - self.v) / delta
         # check that slope is always negative
         assert(m <= 0)
         # solve expression for new distance traveled (xf)
@@ -149,7 +282,7 @@ class Spacecraft():
         # calculate new distance from parent mass
         new_r = (self.r0**2 + xf**2) ** 0.5 
         # update velocity  
-        self.v = calc_v_2(self.v, self.r, new_r)
+        self.v = calc_v_2(self.v, self.r, new_r, self.parent_m)
         # update elapsed time
         self.elapse_t += coast_period
         # update distance traveled 
@@ -159,57 +292,205 @@ class Spacecraft():
 
         return
 
-    def coast_distance(self, n, x_final):
+    def coast_distance(self, n, x_final, method = "simpson", rtol = None):
         '''calculate the amount of time needed to a coast to a final position
-        (self.dis_travel) from the current position. Uses Simpson's rule to
-        numerically approximate flight time
+        (self.dis_travel) from the current position by numerically integrating
+        1/v over the distance traveled. The integrand is evaluated in chunks
+        so memory use does not depend on n or rtol.
 
-        inputs:  n       - number of segments to use for Simpson's approximation     
+        inputs:  n       - number of segments to use for Simpson's approximation
+                           (ignored unless method is "simpson" and rtol is None)
                  x_final - final distance to coast to (max self.dis_travel) (AU)
+                 method  - "simpson" - Simpson's rule with n segments, or
+                                       adaptive Simpson's rule if rtol is given
+                           "adaptive" - adaptive Simpson's rule
+                           "gauss"    - composite Gauss-Legendre rule
+                           "analytic" - closed form time for a radial path plus
+                                        an adaptive correction for the offset r0
+                           "kepler"   - closed form time on the hyperbola
+                                        through the current state, with the
+                                        velocity along the line (h = r0 v);
+                                        not the straight line model
+                 rtol    - requested tolerance relative to the coast time
+        outputs: error   - estimated error of the coast time (s)
                  
         updates: self.dis_travel
                  self.r
                  self.v
                  self.elapse_t'''
 
-        # adjust n to be appropriate for Simpson's rule
-        if n % 2 != 0:
-            # n must be even for Simpson's rule
-            n += 1
-        n = max(n, 6) # set minimum value for aproximation
+        # current state fixes the orbital energy for the whole coast
+        v, r, r0, m = self.v, self.r, self.r0, self.parent_m
+        x_start = self.dis_travel
+        x_end = x_final * AU
+
+        def inv_v(x):
+            '''1/v as a function of distance traveled (x)'''
+            return 1/calc_v_2(v, r, (x ** 2 + r0 ** 2) ** 0.5, m)
+
+        if method == "analytic":
+            # time for a radial path from x_start to x_end
+            soe = 0.5 * v ** 2 - m * G / r
+            radial_time = calc_radial_time(x_end, soe, m) - \
+                          calc_radial_time(x_start, soe, m)
+
+            def offset(x):
+                '''difference between 1/v on the offset line and 1/v on
+                a radial path'''
+                return inv_v(x) - x ** 0.5 / (2 * soe * x + 2 * m * G) ** 0.5
+
+            # integrate the correction to the same absolute tolerance
+            if rtol is None:
+                rtol = QUAD_RTOL
+            correction, error, evals = integrate(offset, x_start, x_end,
+                "adaptive", atol = rtol * abs(radial_time))
+            coast_time = radial_time + correction
+        elif method == "kepler":
+            # hyperbolic Kepler equation; exact up to rounding
+            coast_time = kepler.time_of_flight(v, r, r0 * v, r,
+                                               math.sqrt(x_end ** 2 + r0 ** 2), m)
+            if math.isnan(coast_time):
+                raise ValueError("coast_distance: kepler coast needs a hyperbolic orbit")
+            error = 0.0
+        else:
+            coast_time, error, evals = integrate(inv_v, x_start, x_end,
+                                                 method, n, rtol)
 
-        # calculate step size in meters between points used in approximation
-        step_size = (x_final * AU - self.dis_travel)/n
-        
-        # list of coefficients to multiply f(x_n) by - last coefficient
-        # corresponds to (n) and coefficients are 0 indexed
-        coefs = [2 if x%2 == 0 else 4 for x in range(n + 1)]
-        coefs[0]  = 1
-        coefs[-1] = 1
-
-        # list of x_values (dis_travel) to use - values extend from
-        # current self.dis_travel to r_final
-        x_values = [self.dis_travel + x * step_size for x in range(n + 1)]
-
-        # list of r values (distance from parent mass) to evaluate
-        # function being approximated at
-        r_values = [math.sqrt(x_values[x] ** 2 + self.r0 ** 2) for x in range(n + 1)]
-
-        # list of evaluated values of the function being approximated (1/v(r))
-        f_values = [1/calc_v_2(self.v, self.r, r_values[x]) 
-                   for x in range(n + 1)]
-
-        # calculate time to coast to x_final
-        coast_time = step_size/3 * \
-                     sum([f_values[x] * coefs[x] for x in range(n+1)])
-        
         # update elapsed time
         self.elapse_t += coast_time
         # update position and velocity
-        new_r = r_values[-1]
-        self.v = calc_v_2(self.v, self.r, new_r)
+        new_r = math.sqrt(x_end ** 2 + r0 ** 2)
+        self.v = calc_v_2(v, r, new_r, m)
         self.r = new_r
-        self.dis_travel = x_final * AU
+        self.dis_travel = x_end
+
+        return error
+
+    def coast_checkpoints(self, n, checkpoints, method = "simpson", rtol = None):
+        '''coast once to the furthest of several checkpoint distances and
+        record the state at each of them. The coast is split at the
+        checkpoints and the pieces are integrated one after another, so
+        the time at each checkpoint is the cumulative sum of the pieces
+        before it and nothing is integrated twice. Simpson's segments are
+        shared between the pieces in proportion to their length, so every
+        piece has the step size of n segments over the whole coast. The
+        "kepler" method puts every checkpoint on the hyperbola through the
+        starting state in one vectorized call.
+
+        inputs:  n           - number of Simpson's segments for the whole coast
+                 checkpoints - sorted distances to record (max self.dis_travel)
+                               (AU); the spacecraft ends at the last
+                 method, rtol - see coast_distance
+        outputs: table       - array of CHECKPOINT_DTYPE, one row per
+                               checkpoint; errors are cumulative
+
+        updates: self.dis_travel
+                 self.r
+                 self.v
+                 self.elapse_t'''
+
+        checkpoints = np.atleast_1d(np.asarray(checkpoints, dtype = float))
+        x_start = self.dis_travel / AU
+        lengths = np.diff(np.concatenate([[x_start], checkpoints]))
+        if np.any(lengths < 0):
+            raise ValueError("coast_checkpoints: checkpoints must be sorted and ahead of the spacecraft")
+
+        table = np.zeros(checkpoints.size, dtype = CHECKPOINT_DTYPE)
+        if method == "kepler":
+            # every checkpoint on the one hyperbola through the current state
+            v, r, r0, m = self.v, self.r, self.r0, self.parent_m
+            radii = np.sqrt((checkpoints * AU) ** 2 + r0 ** 2)
+            times = kepler.time_of_flight(v, r, r0 * v, r, radii, m)
+            if np.any(np.isnan(times)):
+                raise ValueError("coast_checkpoints: kepler coast needs a hyperbolic orbit")
+            table["x_final"] = checkpoints
+            table["elapse_t"] = self.elapse_t + times
+            table["v"] = calc_v_2(v, r, radii, m)
+            table["r"] = radii
+            if checkpoints.size:
+                self.elapse_t, self.v, self.r = (float(x) for x in table[-1][["elapse_t", "v", "r"]])
+                self.dis_travel = checkpoints[-1] * AU
+            return table
+
+        total = checkpoints[-1] - x_start if checkpoints.size else 0
+        error = 0.0
+        for i, (x_final, length) in enumerate(zip(checkpoints, lengths)):
+            if length > 0:
+                # segments for this piece; n is None for adaptive methods
+                n_piece = None if n is None else max(1, math.ceil(n * length / total))
+                error += self.coast_distance(n_piece, x_final, method, rtol)
+            table[i] = (x_final, self.elapse_t, self.v, self.r, error)
+
+        return table
+
+    # *** generator versions of the burn and coast methods *** #
+    def state(self, phase = ""):
+        '''returns the current state as a record
+        outputs: (phase, elapse_t (s), dis_travel (m), r (m), v (m/s))'''
+        return (phase, self.elapse_t, self.dis_travel, self.r, self.v)
+
+    def iter_long_burn(self, dv, time, steps):
+        '''same as long_burn but yields the state record after every
+        instantaneous burn and coast'''
+
+        dv_per_burn = dv / steps
+        coast_period = time * SEC_PER_DAY / steps
+
+        yield self.state("burn")
+        for step in range(steps):
+            self.burn(dv_per_burn)
+            self.coast_time(coast_period)
+            yield self.state("burn")
+
+        return
+
+    def iter_coast_time(self, coast_period, steps = 1, delta = 1e8):
+        '''same as coast_time but splits the coast into steps equal periods
+        and yields the state record after each'''
+
+        yield self.state("coast")
+        for step in range(steps):
+            self.coast_time(coast_period / steps, delta)
+            yield self.state("coast")
+
+        return
+
+    def iter_coast_distance(self, n, x_final):
+        '''same as coast_distance with Simpson's rule but accumulates the
+        coast time one pair of segments at a time and yields the state
+        record after each pair. Memory use does not depend on n.'''
+
+        # same segment count as quadrature.simpson
+        n = max(int(n) + int(n) % 2, 6)
+        v, r, r0, m = self.v, self.r, self.r0, self.parent_m
+        x_start = self.dis_travel
+        step_size = (x_final * AU - x_start) / n
+
+        def inv_v(x):
+            '''1/v as a function of distance traveled (x)'''
+            return 1/calc_v_2(v, r, math.sqrt(x ** 2 + r0 ** 2), m)
+
+        yield self.state("coast")
+        t_start = self.elapse_t
+        coast_time = 0
+        f_left = inv_v(x_start)
+        for pair in range(n // 2):
+            x_mid = x_start + (2 * pair + 1) * step_size
+            x_right = x_start + (2 * pair + 2) * step_size
+            if pair == n // 2 - 1:
+                # land exactly on the final position
+                x_right = x_final * AU
+            f_right = inv_v(x_right)
+            # Simpson's rule over the pair of segments
+            coast_time += step_size / 3 * (f_left + 4 * inv_v(x_mid) + f_right)
+            f_left = f_right
+
+            # update state to the end of the pair
+            self.elapse_t = t_start + coast_time
+            self.dis_travel = x_right
+            self.r = math.sqrt(x_right ** 2 + r0 ** 2)
+            self.v = calc_v_2(v, r, self.r, m)
+            yield self.state("coast")
 
         return
 
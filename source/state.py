@@ -0,0 +1,102 @@
+# state.py
+#
+# compact spacecraft states. A state is one record of STATE_DTYPE; arrays
+# of states hold millions of spacecraft in one block of memory, and the
+# step functions advance them in place without allocating new states.
+# Everything is MKS; units are only converted when values are shown
+#
+# Table of contents
+# STATE_FIELDS / STATE_DTYPE - fields of a spacecraft state
+# new_states - array of states from starting velocities and periapses
+# burn - instantaneous burn, in place
+# coast_time - straight line coast for a period of time, in place
+#
+# The Spacecraft class keeps the same fields in __slots__ and
+# SpacecraftBatch keeps its profiles in an array of STATE_DTYPE.
+# Spacecraft.record() and Spacecraft.from_record() convert between them.
+
+import numpy as np                # arrays of states
+
+from astro_constants import *     # astronomical constants
+from orbit import *               # helper functions for orbital calculations
+
+
+# fields of a spacecraft state, in record order
+STATE_FIELDS = ("v",              # spacecraft velocity (m/s)
+                "r",              # distance from parent body (m)
+                "r0",             # periapsis (m)
+                "parent_m",       # mass of parent body (kg)
+                "elapse_t",       # time elapsed (s)
+                "dis_travel")     # distance traveled from periapsis (m)
+
+STATE_DTYPE = np.dtype([(field, "f8") for field in STATE_FIELDS])
+
+
+def new_states(v0, r0, parent_m):
+    '''array of spacecraft states at their periapses. Arguments are
+    broadcast against each other.
+    inputs: v0 - starting velocity (m/s)
+            r0 - periapsis (m)
+            parent_m - mass of parent body (kg)
+    outputs: states - array of STATE_DTYPE'''
+
+    v0, r0, parent_m = np.broadcast_arrays(v0, r0, parent_m)
+    states = np.zeros(v0.shape, dtype = STATE_DTYPE)
+    states["v"] = v0
+    states["r"] = r0
+    states["r0"] = r0
+    states["parent_m"] = parent_m
+
+    return states
+
+
+def burn(states, dv, active = None):
+    '''instantaneous burn of every state (or of the states where active is
+    True); only the velocity changes
+    inputs: states - array of STATE_DTYPE, updated in place
+            dv - delta-v of the burn (m/s)
+            active - optional boolean mask of states to update'''
+
+    v = states["v"]
+    if active is None:
+        v += dv
+    else:
+        np.copyto(v, v + dv, where = active)
+
+    return
+
+
+def coast_time(states, coast_period, delta = 1e8, active = None):
+    '''coast every state (or the states where active is True) for a period
+    of time with the linear velocity approximation of
+    Spacecraft.coast_time
+    inputs: states - array of STATE_DTYPE, updated in place
+            coast_period - time to coast for (s)
+            delta - coast distance used as delta (m)
+            active - optional boolean mask of states to update'''
+
+    v, r, r0 = states["v"], states["r"], states["r0"]
+    m_parent, x = states["parent_m"], states["dis_travel"]
+
+    # compute r after spacecraft coasts for delta
+    r_plus_delta = np.sqrt((x + delta) ** 2 + r0 ** 2)
+    # compute slope of velocity as function of distance traveled
+    m = (calc_v_2(v, r, r_plus_delta, m_parent) - v) / delta
+    # a positive slope means a negative velocity, which cannot coast
+    # outward; those states fail and carry nan from here on
+    m = np.where(m > 0, np.nan, m)
+    # solve expression for new distance traveled (xf)
+    xf = (np.exp(m * coast_period) * (v + m * x) - v) / m
+
+    # calculate new state before anything is overwritten
+    new_r = (r0**2 + xf**2) ** 0.5
+    new_v = calc_v_2(v, r, new_r, m_parent)
+
+    # write the new state; inactive states are left untouched
+    where = True if active is None else active
+    np.copyto(v, new_v, where = where)
+    np.copyto(states["elapse_t"], states["elapse_t"] + coast_period, where = where)
+    np.copyto(x, xf, where = where)
+    np.copyto(r, new_r, where = where)
+
+    return
@@ -0,0 +1,241 @@
+# surrogate.py
+#
+# precomputed flight time tables. The batch engine fills a table of flight
+# times on a grid of (v0, r0, dv, burn_time, r_final), the table is saved
+# as a compressed .npz file, and queries interpolate it multilinearly,
+# vectorized over any number of inputs. Every query also gets an estimate
+# of its interpolation error from the second differences of the table, and
+# inputs outside the grid (or in cells with a failed node) are sent to the
+# batch engine instead
+#
+# Table of contents
+# AXES - inputs of the table, in grid order
+# FlightTable - grid of flight times with interpolated queries
+# build_table - runs the batch engine on every grid point
+# load_table - reads a table saved by FlightTable.save
+#
+# Axes may be any increasing sequences (e.g. np.geomspace), so points can
+# be packed where the flight time curves the most. An axis with a single
+# value fixes that input. The r_final axis costs one coast per profile
+# (SpacecraftBatch.coast_checkpoints), not one per distance. The error
+# estimate is not a strict bound: curvature that the second differences
+# miss between nodes can exceed it, rarely, even with BOUND_SAFETY.
+#
+# Example - a table over v0 and dv, then a million queries
+# >>> import surrogate, numpy as np
+# >>> table = surrogate.build_table(np.linspace(100000, 160000, 31), 0.1,
+# ...                               np.linspace(50000, 150000, 51), 10, [550, 1000])
+# >>> table.save("../output/einstein_table.npz")
+# >>> years, bound = table.query(np.random.uniform(100000, 160000, 10 ** 6),
+# ...                            0.1, 120000, 10, 550, units = "years")
+
+import itertools                  # corners of a grid cell
+import json                       # table settings
+import numpy as np                # grids and interpolation
+
+from astro_constants import *     # astronomical constants
+from batch import *               # vectorized flight time engine
+
+
+AXES = ("v0", "r0", "dv", "burn_time", "r_final")   # inputs, in grid order
+BUILD_CHUNK = 2 ** 14             # burns run at once while building
+AXIS_RTOL = 1e-12                 # tolerance on inputs of one value axes
+BOUND_SAFETY = 2                  # factor on the error estimate for curvature
+                                  # the second differences miss between nodes
+
+
+def _second_differences(values, axis, grid):
+    '''second derivative of the table along one axis at every node, from
+    three point differences on the (possibly uneven) grid; end nodes take
+    the value of their neighbour'''
+
+    d2 = np.zeros(values.shape)
+    if grid.size < 3:
+        return d2
+    f = np.moveaxis(values, axis, 0)
+    h = np.diff(grid).reshape((-1,) + (1,) * (values.ndim - 1))
+    slope = np.diff(f, axis = 0) / h
+    inner = 2 * np.diff(slope, axis = 0) / (h[1:] + h[:-1])
+    inner = np.abs(inner)
+    d2 = np.concatenate([inner[:1], inner, inner[-1:]])
+
+    return np.moveaxis(d2, 0, axis)
+
+
+def _cell_max(nodes):
+    '''largest value over the corners of every cell of a grid of nodes;
+    axes with a single node keep it'''
+    for axis in range(nodes.ndim):
+        if nodes.shape[axis] > 1:
+            lower = np.take(nodes, np.arange(nodes.shape[axis] - 1), axis)
+            upper = np.take(nodes, np.arange(1, nodes.shape[axis]), axis)
+            nodes = np.maximum(lower, upper)
+
+    return nodes
+
+
+class FlightTable():
+    '''flight times (s) on a tensor grid of AXES with the engine settings
+    used to fill it. query() interpolates multilinearly; bound holds the
+    estimated interpolation error of every grid cell, sum over the axes of
+    h**2 / 8 times the largest second derivative at the cell's corners,
+    times BOUND_SAFETY. It is an estimate, not a strict bound: curvature
+    between the nodes can exceed it. Nodes that failed (nan) spoil the
+    cells around them, whose queries go to the engine.'''
+    def __init__(self, axes, values, settings):
+        self.axes = [np.asarray(axes[name], dtype = float) for name in AXES]  # grid values
+        self.values = np.ascontiguousarray(values, dtype = float)  # flight times (s)
+        self.settings = dict(settings)  # burn_steps, coast_steps, parent_m,
+                                        # coast_method of the engine
+        # evenly spaced axes find their cells without a search
+        self.uniform = [grid.size > 1 and np.allclose(np.diff(grid), grid[1] - grid[0],
+                                                     rtol = 1e-12, atol = 0)
+                        for grid in self.axes]
+
+        # error estimate of every cell from the second differences
+        self.bound = np.zeros(_cell_max(self.values).shape)
+        for axis, grid in enumerate(self.axes):
+            if grid.size < 2:
+                continue
+            m = _cell_max(_second_differences(self.values, axis, grid))
+            h = np.diff(grid).reshape([-1 if i == axis else 1
+                                       for i in range(self.values.ndim)])
+            self.bound += BOUND_SAFETY * h ** 2 / 8 * m
+
+    def __str__(self):
+        '''Print a one line summary of the table'''
+        return "FlightTable of %s points over %s" %(
+            "x".join(str(grid.size) for grid in self.axes), ", ".join(AXES))
+
+    def save(self, path):
+        '''saves the table as a compressed .npz file'''
+        arrays = {name: grid for name, grid in zip(AXES, self.axes)}
+        np.savez_compressed(path, values = self.values,
+                            settings = json.dumps(self.settings), **arrays)
+
+    def contains(self, *inputs):
+        '''True where inputs (v0, r0, dv, burn_time, r_final) lie in the grid'''
+        inputs = np.broadcast_arrays(*[np.asarray(x, dtype = float) for x in inputs])
+        inside = np.ones(inputs[0].shape, dtype = bool)
+        for x, grid in zip(inputs, self.axes):
+            if grid.size == 1:
+                inside &= np.abs(x - grid[0]) <= AXIS_RTOL * max(abs(grid[0]), 1)
+            else:
+                inside &= (x >= grid[0]) & (x <= grid[-1])
+
+        return inside
+
+    def query(self, v0, r0, dv, burn_time, r_final, units = "sec", fallback = True):
+        '''interpolated flight times. Arguments are broadcast against each
+        other and use the units of flight_time().
+        inputs: v0, r0, dv, burn_time, r_final - flight profiles
+                units - "sec" or "years"
+                fallback - run the batch engine (with the table's settings)
+                           for inputs outside the grid or in cells with a
+                           nan node; otherwise they are nan
+        outputs: t - flight times
+                 bound - estimated interpolation error of each time (not
+                         a strict bound); 0 for times from the engine'''
+
+        inputs = np.broadcast_arrays(*[np.asarray(x, dtype = float)
+                                       for x in (v0, r0, dv, burn_time, r_final)])
+        shape = inputs[0].shape
+        inputs = [x.ravel() for x in inputs]
+        inside = self.contains(*inputs)
+
+        # cell and weight of every input along every axis
+        index, weight = [], []
+        for x, grid, uniform in zip(inputs, self.axes, self.uniform):
+            if grid.size == 1:
+                index.append(np.zeros(x.size, dtype = int))
+                weight.append(np.zeros(x.size))
+                continue
+            if uniform:
+                i = ((x - grid[0]) * ((grid.size - 1) / (grid[-1] - grid[0]))).astype(int)
+            else:
+                i = np.searchsorted(grid, x, side = "right") - 1
+            i = np.clip(i, 0, grid.size - 2)
+            index.append(i)
+            weight.append(np.clip((x - grid[i]) / (grid[i + 1] - grid[i]), 0, 1))
+
+        # weighted sum over the corners of each cell, indexing the flat table
+        strides = np.cumprod((self.values.shape + (1,))[:0:-1])[::-1]
+        base = sum(i * stride for i, stride in zip(index, strides))
+        flat = self.values.ravel()
+        t = np.zeros(inputs[0].size)
+        moving = [k for k, grid in enumerate(self.axes) if grid.size > 1]
+        for corner in itertools.product((0, 1), repeat = len(moving)):
+            w = 1.0
+            for c, k in zip(corner, moving):
+                w = w * (weight[k] if c else 1 - weight[k])
+            offset = sum(strides[k] for c, k in zip(corner, moving) if c)
+            t += w * flat[base + offset]
+        bound = self.bound[tuple(index)]
+
+        # inputs outside the grid, or in a cell with a nan node
+        out = ~inside | ~np.isfinite(t) | ~np.isfinite(bound)
+        t[out] = np.nan
+        bound[out] = np.nan
+        if fallback and out.any():
+            # the real solver where the table cannot answer
+            s = self.settings
+            result = flight_time_batch(*[x[out] for x in inputs[:4]], s["burn_steps"],
+                                       s["coast_steps"], s["parent_m"], inputs[4][out],
+                                       s["coast_method"])
+            t[out] = result["final_elapse_t"]
+            bound[out] = 0.0
+
+        if units == "years":
+            t, bound = t / SEC_PER_YEAR, bound / SEC_PER_YEAR
+
+        return t.reshape(shape), bound.reshape(shape)
+
+
+def build_table(v0, r0, dv, burn_time, r_final, burn_steps = 1000, coast_steps = 1000,
+                parent_m = M_S, coast_method = "simpson", chunk = BUILD_CHUNK):
+    '''fills a flight time table on the tensor grid of the given axes with
+    the batch engine. Every (v0, r0, dv, burn_time) point is burned once and
+    coasted once to the largest r_final, recording the others on the way.
+    inputs: v0, r0, dv, burn_time, r_final - increasing values (or one
+                   value) of each axis, in the units of flight_time()
+            burn_steps, coast_steps, parent_m - see flight_time(); also
+                   used by queries that fall back to the engine. The
+                   defaults are the step counts of the flight profiles
+            coast_method - "simpson" (default, as flight_time()) with
+                           coast_steps over the coast to the largest
+                           r_final, or "kepler", exact and free of
+                           quadrature noise. The table models the engine
+                           at these settings only; other settings resolve
+                           the flight differently
+            chunk - profiles burned at once; bounds memory use
+    outputs: table - FlightTable'''
+
+    axes = {name: np.atleast_1d(np.asarray(x, dtype = float))
+            for name, x in zip(AXES, (v0, r0, dv, burn_time, r_final))}
+    for name, grid in axes.items():
+        if np.any(np.diff(grid) <= 0):
+            raise ValueError("build_table: %s axis must be increasing" %name)
+
+    # every burn profile of the grid; r_final is the last axis
+    burn_axes = [axes[name] for name in AXES[:4]]
+    profiles = [x.ravel() for x in np.meshgrid(*burn_axes, indexing = "ij")]
+    times = np.zeros((profiles[0].size, axes["r_final"].size))
+    for start in range(0, profiles[0].size, chunk):
+        v0_c, r0_c, dv_c, burn_time_c = [x[start:start + chunk] for x in profiles]
+        ships = SpacecraftBatch(v0_c, r0_c * AU, parent_m)
+        ships.long_burn(dv_c, burn_time_c, burn_steps)
+        table = ships.coast_checkpoints(coast_steps, axes["r_final"], coast_method)
+        times[start:start + chunk] = table["elapse_t"]
+
+    settings = {"burn_steps": int(burn_steps), "coast_steps": int(coast_steps),
+                "parent_m": float(parent_m), "coast_method": coast_method}
+
+    return FlightTable(axes, times.reshape([grid.size for grid in axes.values()]), settings)
+
+
+def load_table(path):
+    '''reads a table saved by FlightTable.save
+    outputs: table - FlightTable'''
+    with np.load(path) as data:
+        axes = {name: data[name] for name in AXES}
+        return FlightTable(axes, data["values"], json.loads(str(data["settings"])))
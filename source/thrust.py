@@ -0,0 +1,160 @@
+# thrust.py
+#
+# thrust schedules with propellant use. A schedule is a list of segments,
+# each with a start offset, a duration, a thrust and an exhaust velocity.
+# The executor runs them on a Spacecraft with the same alternating
+# instantaneous burn and coast as Spacecraft.long_burn, but every burn is
+# the rocket equation velocity change for the propellant used during its
+# step, so the acceleration grows as the craft gets lighter
+#
+# Table of contents
+# SEGMENT_DTYPE - one segment of a thrust schedule
+# REPORT_DTYPE - what one segment achieved
+# make_schedule - structured schedule from (start, duration, thrust, ve)
+# execute_schedule - runs a schedule on a Spacecraft, tracking its mass
+# flight_time_schedule - flight_time() with a thrust schedule as the burn
+#
+# The propellant used during a step follows in closed form from the mass
+# flow thrust / ve, and the velocity change from the rocket equation
+# ve ln(m_start / m_end); the velocity changes of the steps of a segment
+# add up to the rocket equation for the whole segment. Steps are shared
+# between the segments and the coasts between them in proportion to their
+# length, so a schedule costs about as much as long_burn with the same
+# number of steps however many segments it has. Once the propellant runs
+# out the rest of the schedule is a coast.
+#
+# Example - 2 D-He3 burns, exhaust of 3.6 MeV alpha particles
+# >>> import thrust
+# >>> ve = thrust.calc_exhaust_velocity(thrust.MASS_HE4, 3.6)
+# >>> schedule = thrust.make_schedule([(0, 5, 200, ve), (10, 5, 200, ve)])
+# >>> post_burn, ship, report = thrust.flight_time_schedule(
+# ...     132000, 0.1, schedule, 1000, 400, 1000, 1000, thrust.M_S, 550)
+# >>> report["dv"], ship.get_elapse_t(units = "years")
+
+import math                       # logarithms
+import numpy as np                # schedules and reports
+
+from astro_constants import *     # astronomical constants
+from orbit import *               # helper functions for orbital calculations
+from spacecraft import *          # spacecraft class
+
+
+# one segment of a thrust schedule
+SEGMENT_DTYPE = np.dtype([
+    ("start", "f8"),              # start after the schedule begins (days)
+    ("duration", "f8"),           # length of the segment (days)
+    ("thrust", "f8"),             # thrust along the velocity (N)
+    ("ve", "f8"),                 # exhaust velocity (m/s)
+])
+
+# what one segment achieved, returned by execute_schedule
+REPORT_DTYPE = np.dtype([
+    ("duration", "f8"),           # time thrusting before propellant ran out (days)
+    ("dv", "f8"),                 # velocity change from the rocket equation (m/s)
+    ("propellant", "f8"),         # propellant used (kg)
+    ("mass", "f8"),               # mass at the end of the segment (kg)
+    ("v", "f8"),                  # velocity at the end of the segment (m/s)
+    ("elapse_t", "f8"),           # time elapsed at the end of the segment (s)
+    ("steps", "i8"),              # instantaneous burns of the segment
+])
+
+
+def make_schedule(segments):
+    '''builds a schedule and checks it
+    inputs: segments - sequence of (start, duration, thrust, ve) in days,
+                       days, N and m/s, or an array of SEGMENT_DTYPE
+    outputs: schedule - array of SEGMENT_DTYPE'''
+
+    schedule = np.array([tuple(s) for s in segments], dtype = SEGMENT_DTYPE)
+    if np.any(schedule["start"] < 0) or np.any(schedule["duration"] < 0):
+        raise ValueError("make_schedule: starts and durations must not be negative")
+    if np.any(schedule["ve"] <= 0):
+        raise ValueError("make_schedule: exhaust velocities must be positive")
+    ends = schedule["start"] + schedule["duration"]
+    if np.any(schedule["start"][1:] < ends[:-1]):
+        raise ValueError("make_schedule: segments must be in order and not overlap")
+
+    return schedule
+
+
+def execute_schedule(ship, schedule, mass, dry_mass = 0.0, steps = 1000):
+    '''runs a thrust schedule on a spacecraft, starting now. Each segment
+    is split into instantaneous burns with a coast after each, like
+    Spacecraft.long_burn; each burn is the rocket equation velocity
+    change for the propellant used during its step.
+    inputs: ship - Spacecraft, updated in place
+            schedule - array of SEGMENT_DTYPE (see make_schedule)
+            mass - starting mass of the craft (kg)
+            dry_mass - mass without propellant (kg); thrust stops there
+            steps - steps for the whole schedule, shared between segments
+                    and the coasts between them by length (at least one each)
+    outputs: report - array of REPORT_DTYPE, one row per segment'''
+
+    schedule = make_schedule(schedule)
+    if dry_mass < 0 or mass < dry_mass:
+        raise ValueError("execute_schedule: need mass >= dry_mass >= 0")
+    report = np.zeros(schedule.size, dtype = REPORT_DTYPE)
+    if schedule.size == 0:
+        return report
+
+    span = float((schedule["start"] + schedule["duration"]).max())
+    def share(length):
+        '''steps for an interval of length days'''
+        return max(1, round(steps * length / span)) if span > 0 else 1
+
+    clock = 0.0                               # days since the schedule began
+    for i, segment in enumerate(schedule):
+        # coast until the segment starts
+        gap = segment["start"] - clock
+        if gap > 0:
+            n = share(gap)
+            for step in range(n):
+                ship.coast_time(gap * SEC_PER_DAY / n)
+
+        n = share(segment["duration"]) if segment["duration"] > 0 else 0
+        h = segment["duration"] * SEC_PER_DAY / max(n, 1)   # step length (s)
+        mdot = abs(segment["thrust"]) / segment["ve"]       # mass flow (kg/s)
+        sign = math.copysign(1, segment["thrust"])
+        burning = 0.0                         # time thrusting (s)
+        dv = 0.0                              # velocity change (m/s)
+        propellant = 0.0                      # propellant used (kg)
+        for step in range(n):
+            # propellant used during the step, stopping at the dry mass
+            used = min(mdot * h, mass - dry_mass)
+            if used > 0:
+                # rocket equation; log1p keeps small burns exact
+                dv_step = -sign * segment["ve"] * math.log1p(-used / mass)
+                ship.burn(dv_step)
+                dv += dv_step
+                propellant += used
+                burning += used / mdot
+                mass -= used
+            ship.coast_time(h)
+
+        report[i] = (burning / SEC_PER_DAY, dv, propellant, mass, ship.v,
+                     ship.elapse_t, n)
+        clock = segment["start"] + segment["duration"]
+
+    return report
+
+
+def flight_time_schedule(v0, r0, schedule, mass, dry_mass, steps, coast_steps,
+                         parent_m, r_final, coast_method = "simpson"):
+    '''flight_time() with a thrust schedule in place of the constant
+    periapsis burn; the schedule starts at periapsis
+    inputs: v0 - starting velocity (m/s)
+            r0 - periapsis (AU)
+            schedule - array of SEGMENT_DTYPE (see make_schedule)
+            mass, dry_mass - starting and dry mass of the craft (kg)
+            steps - steps for the whole schedule
+            coast_steps, parent_m, r_final, coast_method - see flight_time()
+    outputs: post_burn - Spacecraft at the end of the schedule
+             ship - Spacecraft at r_final
+             report - array of REPORT_DTYPE, one row per segment'''
+
+    ship = Spacecraft(v0, r0 * AU, parent_m)
+    report = execute_schedule(ship, schedule, mass, dry_mass, steps)
+    post_burn = ship.clone()
+    ship.coast_distance(coast_steps, r_final, coast_method)
+
+    return post_burn, ship, report
@@ -0,0 +1,162 @@
+# trajectory.py
+#
+# streams the state of a spacecraft through the burn and coast phases
+# to a sink with bounded memory, so long trajectories can be plotted or
+# audited without re-running the simulation
+#
+# Table of contents
+# flight_trajectory - generator of state records for a whole flight;
+#                     the streaming version of flight_time()
+# decimate - thins a stream of records by elapsed time or distance
+# CsvSink - writes records to a csv file
+# ArraySink - collects records in a growing numpy structured array
+# CallbackSink - passes each record to a function
+# record_trajectory - drains a stream of records into a sink
+#
+# Example - every 0.1 AU of the einstein_550 flight written to a csv
+# >>> import trajectory
+# >>> records = trajectory.flight_trajectory(132000, 0.1, 100000, 10,
+# ...                          1000, 100000, trajectory.M_S, 550)
+# >>> with trajectory.CsvSink("../output/einstein_550.csv") as sink:
+# ...     trajectory.record_trajectory(records, sink, every_x = 0.1 * trajectory.AU)
+
+import csv                        # csv sink
+import numpy as np                # array sink
+
+from astro_constants import *     # astronomical constants
+from spacecraft import *          # spacecraft class
+
+
+# fields of every record, MKS units
+RECORD_FIELDS = ("phase", "elapse_t", "dis_travel", "r", "v")
+RECORD_DTYPE = np.dtype([("phase", "U5"), ("elapse_t", "f8"),
+                         ("dis_travel", "f8"), ("r", "f8"), ("v", "f8")])
+
+
+def flight_trajectory(v0, r0, dv, burn_time, burn_steps, coast_steps, parent_m, r_final):
+    '''generator version of flight_time(); yields a state record after
+    every burn step and every pair of Simpson's segments of the coast.
+    Arguments are the same as flight_time().
+    outputs: generator of (phase, elapse_t, dis_travel, r, v) records'''
+
+    ship = Spacecraft(v0, r0 * AU, parent_m)
+    yield from ship.iter_long_burn(dv, burn_time, int(burn_steps))
+    # the first coast record repeats the last burn record
+    coast = ship.iter_coast_distance(coast_steps, r_final)
+    next(coast)
+    yield from coast
+
+    return
+
+
+def decimate(records, every_t = None, every_x = None):
+    '''yields the first record, then a record whenever elapsed time has
+    advanced by every_t or distance traveled by every_x since the last
+    record yielded, and always the final record
+    inputs: records - iterable of records
+            every_t - minimum spacing in elapsed time (s)
+            every_x - minimum spacing in distance traveled (m)
+    outputs: generator of records'''
+
+    last_t = last_x = None
+    held = None                   # newest record not yet yielded
+    for record in records:
+        t, x = record[1], record[2]
+        if last_t is None or \
+           (every_t is not None and t - last_t >= every_t) or \
+           (every_x is not None and x - last_x >= every_x) or \
+           (every_t is None and every_x is None):
+            last_t, last_x = t, x
+            held = None
+            yield record
+        else:
+            held = record
+    if held is not None:
+        yield held
+
+    return
+
+
+class CsvSink():
+    '''writes records to a csv file with a header row'''
+    def __init__(self, path):
+        self.file = open(path, "w", newline = "")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(RECORD_FIELDS)
+
+    def write(self, record):
+        '''writes one record'''
+        self.writer.writerow(record)
+
+    def close(self):
+        '''closes the file'''
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ArraySink():
+    '''collects records in a numpy structured array of RECORD_DTYPE. The
+    buffer doubles when full, so use decimate to bound its size.'''
+    def __init__(self, capacity = 1024):
+        self.buffer = np.zeros(capacity, dtype = RECORD_DTYPE)
+        self.count = 0            # records written
+
+    def write(self, record):
+        '''appends one record'''
+        if self.count == len(self.buffer):
+            self.buffer = np.resize(self.buffer, max(1, 2 * len(self.buffer)))
+        self.buffer[self.count] = record
+        self.count += 1
+
+    def array(self):
+        '''returns the records written so far'''
+        return self.buffer[:self.count]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CallbackSink():
+    '''passes each record to a function'''
+    def __init__(self, callback):
+        self.callback = callback
+
+    def write(self, record):
+        '''calls the callback with one record'''
+        self.callback(record)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def record_trajectory(records, sink, every_t = None, every_x = None):
+    '''drains a stream of records into a sink, optionally decimated
+    inputs: records - iterable of records, e.g. flight_trajectory()
+            sink - object with a write(record) method
+            every_t - minimum spacing in elapsed time (s)
+            every_x - minimum spacing in distance traveled (m)
+    outputs: count - number of records written'''
+
+    count = 0
+    for record in decimate(records, every_t, every_x):
+        sink.write(record)
+        count += 1
+
+    return count